@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta, timezone
+
+from .firebase import db, ARTICLES_COLLECTION
+from .counters import increment
+
+ACTIVITY_COLLECTION = "activity"
+ACTIVITY_FIELDS = ("likes", "comments", "shares", "views")
+
+# period -> (bucket size, number of buckets)
+PERIOD_BUCKETS = {
+    "day": ("hour", 24),
+    "week": ("day", 7),
+    "month": ("day", 30),
+    "year": ("day", 365),
+}
+
+
+def _bucket_start(at: datetime, granularity: str) -> datetime:
+    at = at.astimezone(timezone.utc)
+    if granularity == "hour":
+        return at.replace(minute=0, second=0, microsecond=0)
+    return at.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _bucket_id(start: datetime, granularity: str) -> str:
+    if granularity == "hour":
+        return f"hour-{start:%Y%m%d%H}"
+    return f"day-{start:%Y%m%d}"
+
+
+def _activity_collection(article_id: str = None):
+    if article_id:
+        return db.collection(ARTICLES_COLLECTION).document(article_id).collection(ACTIVITY_COLLECTION)
+    return db.collection(ACTIVITY_COLLECTION)
+
+
+def record_activity(batch, article_id: str, at: datetime = None, **deltas):
+    """Add hourly and daily bucket increments, per article and global, to a write batch"""
+    at = at or datetime.now(timezone.utc)
+    for granularity in ("hour", "day"):
+        start = _bucket_start(at, granularity)
+        bucket_id = _bucket_id(start, granularity)
+        for collection in (_activity_collection(article_id), _activity_collection()):
+            increment(batch, collection.document(bucket_id), deltas, static={"start": start})
+
+
+def read_activity(period: str, article_id: str = None):
+    """Read the time series for a period; one document read per bucket in the window"""
+    granularity, count = PERIOD_BUCKETS[period]
+    step = timedelta(hours=1) if granularity == "hour" else timedelta(days=1)
+    newest = _bucket_start(datetime.now(timezone.utc), granularity)
+    starts = [newest - step * i for i in reversed(range(count))]
+
+    collection = _activity_collection(article_id)
+    refs = [collection.document(_bucket_id(s, granularity)) for s in starts]
+    buckets = {snap.id: snap.to_dict() for snap in db.get_all(refs) if snap.exists}
+
+    labels = []
+    values = []
+    for start, ref in zip(starts, refs):
+        data = buckets.get(ref.id, {})
+        labels.append(start.isoformat())
+        values.append({field: data.get(field, 0) for field in ACTIVITY_FIELDS})
+    return labels, values
@@ -0,0 +1,153 @@
+import threading
+import time
+from collections import OrderedDict
+
+from .config import ARTICLE_CACHE_SIZE, ARTICLE_CACHE_TTL, ARTICLE_CACHE_LISTEN
+from .firebase import db, ARTICLES_COLLECTION
+
+
+class ArticleCache:
+    """Bounded LRU + TTL cache of article DocumentSnapshots keyed by slug.
+
+    Snapshots are immutable and to_dict() returns a copy, so cached entries can be
+    handed to callers as-is. Missing articles are not cached.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, listen: bool = False):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.listen = listen
+        self._entries = OrderedDict()  # slug -> (snapshot, expires_at)
+        self._watches = {}
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def peek(self, slug: str):
+        """Cached snapshot, or None without falling through to Firestore"""
+        with self._lock:
+            entry = self._entries.get(slug)
+            if entry and (self.listen or entry[1] > time.monotonic()):
+                self._entries.move_to_end(slug)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            return None
+
+    def get(self, slug: str):
+        cached = self.peek(slug)
+        if cached is not None:
+            return cached
+
+        doc = db.collection(ARTICLES_COLLECTION).document(slug).get()
+        if doc.exists:
+            self.put(slug, doc)
+        else:
+            self.invalidate(slug)
+        return doc
+
+    def put(self, slug: str, doc):
+        stale_watches = []
+        with self._lock:
+            self._entries[slug] = (doc, time.monotonic() + self.ttl)
+            self._entries.move_to_end(slug)
+            if self.listen and slug not in self._watches:
+                self._watch(slug)
+            while len(self._entries) > self.maxsize:
+                evicted, _ = self._entries.popitem(last=False)
+                stale_watches.append(self._watches.pop(evicted, None))
+                self.evictions += 1
+        self._unsubscribe(stale_watches)
+
+    def invalidate(self, slug: str):
+        with self._lock:
+            if self._entries.pop(slug, None) is not None:
+                self.invalidations += 1
+            watch = self._watches.pop(slug, None)
+        self._unsubscribe([watch])
+
+    def clear(self):
+        with self._lock:
+            watches = list(self._watches.values())
+            self._watches.clear()
+            self._entries.clear()
+        self._unsubscribe(watches)
+
+    def _watch(self, slug: str):
+        def on_change(snapshots, changes, read_time):
+            for snapshot in snapshots:
+                with self._lock:
+                    if slug not in self._entries:
+                        continue
+                    if snapshot.exists:
+                        self._entries[slug] = (snapshot, time.monotonic() + self.ttl)
+                    else:
+                        self._entries.pop(slug, None)
+
+        ref = db.collection(ARTICLES_COLLECTION).document(slug)
+        self._watches[slug] = ref.on_snapshot(on_change)
+
+    @staticmethod
+    def _unsubscribe(watches):
+        # Called without the lock held: closing a watch waits for its callback thread
+        for watch in watches:
+            if watch is not None:
+                watch.unsubscribe()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "listening": self.listen,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+article_cache = ArticleCache(ARTICLE_CACHE_SIZE, ARTICLE_CACHE_TTL, ARTICLE_CACHE_LISTEN)
+
+
+def get_article_doc(slug: str):
+    """Cached replacement for db.collection(ARTICLES_COLLECTION).document(slug).get()"""
+    return article_cache.get(slug)
+
+
+def article_exists(slug: str) -> bool:
+    """Existence check that reads a single small field on a cache miss"""
+    if article_cache.peek(slug) is not None:
+        return True
+    return db.collection(ARTICLES_COLLECTION).document(slug).get(field_paths=["created_at"]).exists
+
+
+def get_article_docs(slugs, field_paths=None) -> dict:
+    """Fetch many articles in one get_all round trip, serving what it can from the cache.
+
+    Returns {slug: snapshot} for the articles that exist. Masked reads (field_paths) are
+    not cached since the snapshots are partial.
+    """
+    found = {}
+    missing = []
+    for slug in dict.fromkeys(slugs):
+        cached = article_cache.peek(slug)
+        if cached is not None:
+            found[slug] = cached
+        else:
+            missing.append(slug)
+
+    if missing:
+        refs = [db.collection(ARTICLES_COLLECTION).document(slug) for slug in missing]
+        for doc in db.get_all(refs, field_paths=field_paths):
+            if not doc.exists:
+                continue
+            found[doc.id] = doc
+            if field_paths is None:
+                article_cache.put(doc.id, doc)
+    return found
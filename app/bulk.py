@@ -0,0 +1,285 @@
+"""Bulk NDJSON import/export of articles and comments.
+
+    python -m app.bulk export articles.ndjson
+    python -m app.bulk import articles.ndjson [--media-root DIR] [--ops-per-second N] [--index]
+
+One JSON object per line. Articles: {"kind": "article", "id": ..., "title": ..., "content": ...}
+plus any other article fields; "thumbnail_path" and "media_paths" name local files to upload.
+Comments: {"kind": "comment", "article_id": ..., "id": ..., "user_id": ..., "text": ..., "created_at": ...}.
+Export writes every article, then every comment, so the file can be imported as-is.
+
+Imports are resumable: after each chunk is durable the byte offset is saved to a checkpoint
+file, and a rerun continues from there. The global stats and search df a chunk changes are
+increments, so they are worked out before the chunk is written and saved with the checkpoint;
+a rerun replays an interrupted chunk's documents (overwrites) and applies the saved changes.
+Only a crash between applying them and saving the checkpoint can count a chunk twice
+(python -m app.stats reconciles the stats).
+
+The search index is skipped unless --index is given; python -m app.search rebuilds it
+afterwards in far fewer writes than indexing article by article.
+"""
+import argparse
+import json
+import os
+import sys
+from collections import Counter
+from datetime import datetime, timezone
+from google.cloud.firestore_v1.bulk_writer import BulkWriterOptions
+
+from .firebase import db, ARTICLES_COLLECTION
+from .models import generate_slug, new_article_data
+from .counters import init_article_counters, reset_article_counters, commit, flush_counters
+from .stats import increment_stats
+from .search import search_index_changes, df_writes
+from .trending import lifetime_trending_score
+from .utils import upload_paths_to_storage
+from .routers.comments import COMMENTS_SUBCOL
+
+CHUNK_SIZE = 500
+EXPORT_PAGE_SIZE = 500
+DATETIME_FIELDS = ("created_at", "updated_at")
+# What a re-import needs from the stored article to correct the index and the totals
+EXISTING_FIELDS = ["title", "content", "tags", "keywords", "views", "likes_count", "comments_count", "shares_count"]
+# Counter field -> global stats key
+STATS_KEYS = {"views": "views", "likes_count": "likes", "comments_count": "comments", "shares_count": "shares"}
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _write_line(out, record: dict):
+    out.write(json.dumps(record, default=_encode, ensure_ascii=False))
+    out.write("\n")
+
+
+def export_ndjson(out, page_size: int = EXPORT_PAGE_SIZE) -> dict:
+    """Stream every article, then every comment, a page at a time"""
+    articles = 0
+    last = None
+    while True:
+        query = db.collection(ARTICLES_COLLECTION).order_by("__name__").limit(page_size)
+        if last is not None:
+            query = query.start_after(last)
+        docs = list(query.stream())
+        for doc in docs:
+            _write_line(out, {"kind": "article", **doc.to_dict(), "id": doc.id})
+        articles += len(docs)
+        if len(docs) < page_size:
+            break
+        last = docs[-1]
+
+    # One collection group scan instead of a query per article
+    comments = 0
+    last = None
+    while True:
+        query = db.collection_group(COMMENTS_SUBCOL).order_by("__name__").limit(page_size)
+        if last is not None:
+            query = query.start_after(last)
+        docs = list(query.stream())
+        for doc in docs:
+            article_ref = doc.reference.parent.parent
+            if article_ref is None or article_ref.parent.id != ARTICLES_COLLECTION:
+                continue
+            _write_line(out, {"kind": "comment", **doc.to_dict(), "id": doc.id, "article_id": article_ref.id})
+            comments += 1
+        if len(docs) < page_size:
+            break
+        last = docs[-1]
+    return {"articles": articles, "comments": comments}
+
+
+def _parse_datetimes(record: dict):
+    for field in DATETIME_FIELDS:
+        if isinstance(record.get(field), str):
+            record[field] = datetime.fromisoformat(record[field])
+
+
+def _article_from_record(record: dict) -> dict:
+    """Full article document: imported fields over the same defaults create_article writes"""
+    record = {k: v for k, v in record.items() if k not in ("kind", "thumbnail_path", "media_paths")}
+    content = record.pop("content", None) or record.pop("body", "")
+    title = record.pop("title")
+    slug = record.pop("id", None) or record.pop("slug", None) or generate_slug(title)
+    record.pop("slug", None)
+    created_at = record.pop("created_at", None) or datetime.now(timezone.utc)
+    data = new_article_data(slug, title, content, record.pop("author_id", "ViKay"), created_at)
+    data.update(record)
+    if "trending_score" not in record:
+        data["trending_score"] = lifetime_trending_score(data)
+    return data
+
+
+def _upload_media(records, media_root: str):
+    """Upload the local files a chunk references, all at once on the upload pool"""
+    paths = []
+    for record in records:
+        if record.get("thumbnail_path"):
+            paths.append((os.path.join(media_root, record["thumbnail_path"]), "thumbnails"))
+        paths += [(os.path.join(media_root, p), "media") for p in record.get("media_paths") or []]
+    urls = iter(upload_paths_to_storage(paths))
+    for record in records:
+        if record.get("thumbnail_path"):
+            record["thumbnail_url"] = next(urls)
+        if record.get("media_paths"):
+            record["media_urls"] = list(record.get("media_urls") or []) + [next(urls) for _ in record["media_paths"]]
+
+
+def _plan_chunk(records, media_root: str, index: bool) -> dict:
+    """Everything a chunk writes, and the stats and df changes it makes; nothing is written yet"""
+    articles = [r for r in records if r.get("kind", "article") == "article"]
+    comments = [r for r in records if r.get("kind") == "comment"]
+    _upload_media(articles, media_root)
+
+    documents = [_article_from_record(r) for r in articles]
+    refs = [db.collection(ARTICLES_COLLECTION).document(d["id"]) for d in documents]
+    existing = {snap.id: snap.to_dict() for snap in db.get_all(refs, field_paths=EXISTING_FIELDS) if snap.exists} if refs else {}
+
+    plan = {"articles": [], "postings": [], "comments": [], "stats": Counter(), "df": Counter()}
+    for ref, data in zip(refs, documents):
+        old = existing.get(ref.id)
+        plan["articles"].append((ref, data, old is None))
+        if old is None:
+            plan["stats"]["articles"] += 1
+        for field, key in STATS_KEYS.items():
+            plan["stats"][key] += data.get(field, 0) - (old or {}).get(field, 0)
+        if index:
+            writes, deltas = search_index_changes(ref.id, old, data)
+            plan["postings"] += writes
+            plan["df"].update(deltas)
+
+    for record in comments:
+        record = {k: v for k, v in record.items() if k != "kind"}
+        _parse_datetimes(record)
+        article_id = record.pop("article_id")
+        comment_id = record.pop("id", None)
+        comments_ref = db.collection(ARTICLES_COLLECTION).document(article_id).collection(COMMENTS_SUBCOL)
+        plan["comments"].append((comments_ref.document(comment_id) if comment_id else comments_ref.document(), record))
+    return plan
+
+
+def _write_chunk(writer, plan: dict):
+    """The chunk's documents; all overwrites, so writing them again is harmless"""
+    for ref, data, new in plan["articles"]:
+        writer.set(ref, data)
+        if new:
+            init_article_counters(writer, ref.id, data)
+        else:
+            reset_article_counters(writer, ref.id, data)
+    for op, posting_ref, posting in plan["postings"]:
+        if op == "delete":
+            writer.delete(posting_ref)
+        else:
+            writer.set(posting_ref, posting, merge=True)
+    for ref, record in plan["comments"]:
+        writer.set(ref, record)
+    writer.flush()
+
+
+def _apply_totals(writer, stats: dict, df: dict):
+    """The chunk's increments: global stats, and one df write per term (not per article)"""
+    for _, term_ref, update in df_writes(df):
+        writer.set(term_ref, update, merge=True)
+    writer.flush()
+    batch = db.batch()
+    increment_stats(batch, **{k: v for k, v in stats.items() if k in ("articles", "views", "likes", "comments", "shares") and v})
+    commit(batch)
+    # Buffered stats must be written before the chunk is marked done
+    flush_counters()
+
+
+def _read_checkpoint(path: str) -> dict:
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {"offset": 0, "articles": 0, "comments": 0, "chunk": None}
+
+
+def _save_checkpoint(path: str, checkpoint: dict):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp, path)
+
+
+def import_ndjson(path: str, checkpoint_path: str = None, media_root: str = None, chunk_size: int = CHUNK_SIZE,
+                  ops_per_second: int = 500, max_ops_per_second: int = None, index: bool = False) -> dict:
+    checkpoint_path = checkpoint_path or f"{path}.checkpoint"
+    media_root = media_root or os.path.dirname(os.path.abspath(path))
+    checkpoint = _read_checkpoint(checkpoint_path)
+    # The writer batches, parallelises and retries, ramping up from ops_per_second by half every
+    # five minutes (the 500/50/5 rule); flushing per chunk bounds what is held in memory
+    writer = db.bulk_writer(BulkWriterOptions(initial_ops_per_second=ops_per_second, max_ops_per_second=max_ops_per_second))
+
+    with open(path, "rb") as f:
+        f.seek(checkpoint["offset"])
+        while True:
+            records = []
+            while len(records) < chunk_size:
+                line = f.readline()
+                if not line:
+                    break
+                if line.strip():
+                    record = json.loads(line)
+                    _parse_datetimes(record)
+                    records.append(record)
+            if not records:
+                break
+
+            plan = _plan_chunk(records, media_root, index)
+            if checkpoint.get("chunk"):
+                # This chunk was interrupted: its documents may be written already, so what it
+                # changes was only known before then
+                plan["stats"], plan["df"] = Counter(checkpoint["chunk"]["stats"]), Counter(checkpoint["chunk"]["df"])
+            else:
+                checkpoint["chunk"] = {"stats": plan["stats"], "df": plan["df"], "comments": len(plan["comments"])}
+                _save_checkpoint(checkpoint_path, checkpoint)
+
+            _write_chunk(writer, plan)
+            _apply_totals(writer, plan["stats"], plan["df"])
+
+            checkpoint["offset"] = f.tell()
+            checkpoint["articles"] += plan["stats"]["articles"]
+            checkpoint["comments"] += checkpoint["chunk"]["comments"]
+            checkpoint["chunk"] = None
+            _save_checkpoint(checkpoint_path, checkpoint)
+            print(f"imported {checkpoint['articles']} new articles, {checkpoint['comments']} comments", file=sys.stderr)
+
+    writer.close()
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return {"articles": checkpoint["articles"], "comments": checkpoint["comments"]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.bulk", description="Bulk NDJSON import/export")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export")
+    export.add_argument("output", help="NDJSON file to write, or - for stdout")
+    imp = sub.add_parser("import")
+    imp.add_argument("input", help="NDJSON file to read")
+    imp.add_argument("--checkpoint", help="Checkpoint file (default: INPUT.checkpoint)")
+    imp.add_argument("--media-root", help="Directory media paths are relative to (default: the input's directory)")
+    imp.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    imp.add_argument("--ops-per-second", type=int, default=500,
+                     help="Starting write rate; 500 suits a new collection, and the writer ramps up from it")
+    imp.add_argument("--max-ops-per-second", type=int, help="Cap on the ramped-up write rate (default: none)")
+    imp.add_argument("--index", action="store_true",
+                     help="Update the search index while importing (default: rebuild it after with python -m app.search)")
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        if args.output == "-":
+            print(export_ndjson(sys.stdout), file=sys.stderr)
+        else:
+            with open(args.output, "w", encoding="utf-8") as out:
+                print(export_ndjson(out))
+    else:
+        print(import_ndjson(args.input, args.checkpoint, args.media_root, args.chunk_size,
+                            args.ops_per_second, args.max_ops_per_second, args.index))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,93 @@
 import os
 import json
+import functools
 from dotenv import load_dotenv
 
 # Load .env file automatically
 load_dotenv()
 
+# "firebase", or "memory" for the in-process stand-ins in app/fakes.py (local runs, benchmarks)
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "firebase").lower()
+if STORAGE_BACKEND not in ("firebase", "memory"):
+    raise RuntimeError("STORAGE_BACKEND must be firebase or memory")
+
 FIREBASE_SA_JSON_RAW = os.environ.get("FIREBASE_SERVICE_ACCOUNT")
 FIREBASE_STORAGE_BUCKET = os.environ.get("FIREBASE_STORAGE_BUCKET")
 
-if not FIREBASE_SA_JSON_RAW:
-    raise RuntimeError("Set FIREBASE_SERVICE_ACCOUNT in .env")
-if not FIREBASE_STORAGE_BUCKET:
-    raise RuntimeError("Set FIREBASE_STORAGE_BUCKET in .env")
+if STORAGE_BACKEND == "memory":
+    FIREBASE_STORAGE_BUCKET = FIREBASE_STORAGE_BUCKET or "local-bucket"
+else:
+    if not FIREBASE_SA_JSON_RAW:
+        raise RuntimeError("Set FIREBASE_SERVICE_ACCOUNT in .env")
+    if not FIREBASE_STORAGE_BUCKET:
+        raise RuntimeError("Set FIREBASE_STORAGE_BUCKET in .env")
+
+
+@functools.lru_cache(maxsize=None)
+def service_account_info() -> dict:
+    """Service-account JSON as a dictionary, parsed when a client is first built"""
+    return json.loads(FIREBASE_SA_JSON_RAW)
+
+# Article read cache (app/article_cache.py)
+ARTICLE_CACHE_SIZE = int(os.environ.get("ARTICLE_CACHE_SIZE", "1000"))
+ARTICLE_CACHE_TTL = float(os.environ.get("ARTICLE_CACHE_TTL", "30"))
+# Keep cached entries fresh with Firestore listeners so several workers stay coherent
+ARTICLE_CACHE_LISTEN = os.environ.get("ARTICLE_CACHE_LISTEN", "").lower() in ("1", "true", "yes")
+
+# Size of the thread pool that sync route handlers (and so every blocking Firestore/GCS call) run on
+IO_THREADS = int(os.environ.get("IO_THREADS", "40"))
+
+# Media uploads (app/utils.py)
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+UPLOAD_WORKERS = int(os.environ.get("UPLOAD_WORKERS", "8"))
+
+# Processes used to build resized image variants (app/images.py)
+IMAGE_WORKERS = int(os.environ.get("IMAGE_WORKERS", "2"))
+
+# Sharded engagement counters (app/counters.py)
+COUNTER_SHARDS = int(os.environ.get("COUNTER_SHARDS", "10"))
+COUNTER_FLUSH_INTERVAL = float(os.environ.get("COUNTER_FLUSH_INTERVAL", "1"))
+# How often each process adds its counter deltas onto the article documents lists read;
+# a hot article gets about one write per process per interval
+COUNTER_ROLLUP_INTERVAL = float(os.environ.get("COUNTER_ROLLUP_INTERVAL", "5"))
+# Coalesce counter increments in memory and write them once per flush interval.
+# Up to one interval of increments is lost if the process dies.
+COUNTER_WRITE_BEHIND = os.environ.get("COUNTER_WRITE_BEHIND", "true").lower() in ("1", "true", "yes")
+
+# Cached analytics responses (app/response_cache.py). Set RESPONSE_CACHE_URL (redis://...)
+# to share entries between workers; the default is a per-process cache.
+RESPONSE_CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", "10"))
+RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", "1024"))
+RESPONSE_CACHE_URL = os.environ.get("RESPONSE_CACHE_URL")
+# Persistent background jobs (app/jobs.py). Processes on one host share the SQLite file;
+# the memory backend keeps jobs in memory, since the data they refer to is too.
+JOBS_DB_PATH = os.environ.get("JOBS_DB_PATH", ":memory:" if STORAGE_BACKEND == "memory" else "jobs.sqlite3")
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", "5"))
+
+# Per-client limits on likes, shares and comments (app/rate_limit.py), as "requests/seconds"
+# token buckets. Clients are keyed by verified Firebase token when one is sent, otherwise by
+# IP. Behind a proxy that IP only comes from X-Forwarded-For if uvicorn trusts the proxy's
+# address (--forwarded-allow-ips; Procfile and render.yaml trust private networks). Set
+# RATE_LIMIT_URL (redis://...) to share buckets between workers; the default is per process.
+RATE_LIMIT_ENABLED = os.environ.get("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+RATE_LIMIT_LIKES = os.environ.get("RATE_LIMIT_LIKES", "30/60")
+RATE_LIMIT_SHARES = os.environ.get("RATE_LIMIT_SHARES", "30/60")
+RATE_LIMIT_COMMENTS = os.environ.get("RATE_LIMIT_COMMENTS", "10/60")
+RATE_LIMIT_URL = os.environ.get("RATE_LIMIT_URL")
+RATE_LIMIT_KEYS = int(os.environ.get("RATE_LIMIT_KEYS", "100000"))
+
+# Live article events over Server-Sent Events (app/events.py)
+EVENTS_MAX_SUBSCRIBERS = int(os.environ.get("EVENTS_MAX_SUBSCRIBERS", "5000"))
+# Comments queued for one subscriber before it is told to resync instead
+EVENTS_QUEUE_SIZE = int(os.environ.get("EVENTS_QUEUE_SIZE", "100"))
+EVENTS_HEARTBEAT = float(os.environ.get("EVENTS_HEARTBEAT", "15"))
+# An article's listeners stay open this long after its last subscriber leaves, for reconnects
+EVENTS_LINGER = float(os.environ.get("EVENTS_LINGER", "30"))
 
-# Parse JSON and export as dictionary
-FIREBASE_SERVICE_ACCOUNT = json.loads(FIREBASE_SA_JSON_RAW)
\ No newline at end of file
+# Warm caches in a background thread at startup, so the first requests to a new worker
+# don't pay for client setup and cold caches (app/warmup.py)
+WARMUP_ON_STARTUP = os.environ.get("WARMUP_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+WARMUP_ARTICLES = int(os.environ.get("WARMUP_ARTICLES", "50"))
+# Optional steps that read the whole articles collection in every worker (sitemap, related_index)
+WARMUP_FULL_READS = [s.strip() for s in os.environ.get("WARMUP_FULL_READS", "").split(",") if s.strip()]
@@ -0,0 +1,268 @@
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+from google.api_core.exceptions import AlreadyExists, NotFound
+from google.cloud.firestore_v1 import Increment
+
+from .config import COUNTER_SHARDS, COUNTER_FLUSH_INTERVAL, COUNTER_ROLLUP_INTERVAL, COUNTER_WRITE_BEHIND
+from .firebase import db, ARTICLES_COLLECTION
+from .article_cache import article_cache
+from .response_cache import invalidate_analytics
+
+logger = logging.getLogger(__name__)
+
+# Engagement counters live in N shard documents under each article so that a viral article
+# doesn't hit Firestore's ~1 write/second/document limit. The "base" shard holds the totals an
+# article had before sharding (or zeros for new ones). A background flusher periodically adds
+# the deltas this process made onto the article document, which is what lists and feeds read;
+# exact totals come from summing the shards.
+COUNTER_SHARDS_SUBCOL = "counter_shards"
+BASE_SHARD = "base"
+ARTICLE_COUNTER_FIELDS = ("likes_count", "comments_count", "shares_count", "views", "trending_score")
+COUNTER_CACHE_TTL = 5
+BATCH_SIZE = 400
+
+_lock = threading.Lock()
+_pending = {}  # document path -> (ref, static fields, deltas)
+_article_deltas = {}  # article id -> deltas not yet added to the article document
+_totals_cache = {}  # article id -> (totals, expires_at)
+_stop = threading.Event()
+_flusher = None
+
+
+def increment(batch, ref, deltas: dict, static: dict = None):
+    """Add numeric deltas to a document (creating it if needed) as part of a write batch.
+
+    With write-behind enabled the deltas are coalesced in memory instead and written by the
+    flusher, so a hot document gets at most one write per flush interval from this process.
+    """
+    deltas = {k: v for k, v in deltas.items() if v}
+    if not deltas:
+        return
+    if COUNTER_WRITE_BEHIND:
+        with _lock:
+            _, fields, totals = _pending.setdefault(ref.path, (ref, {}, defaultdict(int)))
+            fields.update(static or {})
+            for k, v in deltas.items():
+                totals[k] += v
+        return
+    batch.set(ref, {**(static or {}), **{k: Increment(v) for k, v in deltas.items()}}, merge=True)
+
+
+def commit(batch):
+    """Commit a batch unless everything in it was buffered"""
+    if len(batch):
+        batch.commit()
+        if not COUNTER_WRITE_BEHIND:
+            invalidate_analytics()
+
+
+def _shard_ref(article_id: str, shard_id: str):
+    return db.collection(ARTICLES_COLLECTION).document(article_id).collection(COUNTER_SHARDS_SUBCOL).document(shard_id)
+
+
+def init_article_counters(batch, article_id: str, data: dict = None):
+    """Write the base shard for a new article"""
+    data = data or {}
+    batch.set(_shard_ref(article_id, BASE_SHARD), {f: data.get(f, 0) for f in ARTICLE_COUNTER_FIELDS})
+
+
+def reset_article_counters(batch, article_id: str, data: dict = None):
+    """Overwrite every counter of an article: the base shard takes data's values, the rest are zeroed"""
+    init_article_counters(batch, article_id, data)
+    for i in range(COUNTER_SHARDS):
+        batch.set(_shard_ref(article_id, str(i)), {f: 0 for f in ARTICLE_COUNTER_FIELDS})
+    _totals_cache.pop(article_id, None)
+
+
+def increment_article_counters(batch, article_id: str, **deltas):
+    """e.g. increment_article_counters(batch, slug, likes_count=1, trending_score=points)"""
+    increment(batch, _shard_ref(article_id, str(random.randrange(COUNTER_SHARDS))), deltas)
+    with _lock:
+        totals = _article_deltas.setdefault(article_id, defaultdict(int))
+        for k, v in deltas.items():
+            totals[k] += v
+
+
+def set_article_counter(batch, article_id: str, field: str, value):
+    """Overwrite one counter: the base shard takes the value and every other shard is zeroed"""
+    batch.set(_shard_ref(article_id, BASE_SHARD), {field: value}, merge=True)
+    for i in range(COUNTER_SHARDS):
+        batch.set(_shard_ref(article_id, str(i)), {field: 0}, merge=True)
+    batch.update(db.collection(ARTICLES_COLLECTION).document(article_id), {field: value})
+    _totals_cache.pop(article_id, None)
+
+
+def _all_shard_refs(article_id: str) -> list:
+    return [_shard_ref(article_id, shard_id) for shard_id in [BASE_SHARD, *map(str, range(COUNTER_SHARDS))]]
+
+
+def exact_article_counters(article_id: str) -> dict:
+    """Shard sums plus the increments this process has buffered but not written yet"""
+    totals = _sum_shards(article_id)
+    paths = {ref.path for ref in _all_shard_refs(article_id)}
+    with _lock:
+        for path in paths & _pending.keys():
+            for k, v in _pending[path][2].items():
+                totals[k] = totals.get(k, 0) + v
+    return totals
+
+
+def delete_article_counters(batch, article_id: str) -> dict:
+    """Delete every shard of an article, and drop the increments this process still holds for it.
+
+    Returns the article's exact counters from before, e.g. to take them off the global stats.
+    """
+    totals = exact_article_counters(article_id)
+    refs = _all_shard_refs(article_id)
+    for ref in refs:
+        batch.delete(ref)
+    with _lock:
+        for ref in refs:
+            _pending.pop(ref.path, None)
+        _article_deltas.pop(article_id, None)
+    _totals_cache.pop(article_id, None)
+    return totals
+
+
+def _seed_base_shard(article_id: str):
+    """Move the counters of an article written before sharding into its base shard"""
+    article = db.collection(ARTICLES_COLLECTION).document(article_id).get(field_paths=ARTICLE_COUNTER_FIELDS)
+    if not article.exists:
+        return None
+    ref = _shard_ref(article_id, BASE_SHARD)
+    data = article.to_dict()
+    try:
+        ref.create({f: data.get(f, 0) for f in ARTICLE_COUNTER_FIELDS})
+    except AlreadyExists:
+        # Another worker seeded it first
+        pass
+    return ref.get()
+
+
+def _sum_shards(article_id: str) -> dict:
+    shards_ref = db.collection(ARTICLES_COLLECTION).document(article_id).collection(COUNTER_SHARDS_SUBCOL)
+    shards = list(shards_ref.stream())
+    if not any(shard.id == BASE_SHARD for shard in shards):
+        shards.append(_seed_base_shard(article_id))
+
+    totals = {f: 0 for f in ARTICLE_COUNTER_FIELDS}
+    for shard in shards:
+        if shard is None or not shard.exists:
+            continue
+        data = shard.to_dict()
+        for f in totals:
+            totals[f] += data.get(f, 0)
+    return totals
+
+
+def read_article_counters(article_id: str) -> dict:
+    """Exact counters from the shards, cached for COUNTER_CACHE_TTL seconds"""
+    now = time.monotonic()
+    cached = _totals_cache.get(article_id)
+    if cached and cached[1] > now:
+        return cached[0]
+    totals = _sum_shards(article_id)
+    _totals_cache[article_id] = (totals, now + COUNTER_CACHE_TTL)
+    return totals
+
+
+def _write_pending(pending):
+    items = list(pending.values())
+    for start in range(0, len(items), BATCH_SIZE):
+        batch = db.batch()
+        for ref, fields, deltas in items[start:start + BATCH_SIZE]:
+            batch.set(ref, {**fields, **{k: Increment(v) for k, v in deltas.items() if v}}, merge=True)
+        batch.commit()
+
+
+def _restore(pending: dict = None, article_deltas: dict = None):
+    """Put deltas that failed to write back, so the next flush retries them"""
+    with _lock:
+        for path, (ref, fields, deltas) in (pending or {}).items():
+            _, current_fields, current = _pending.setdefault(path, (ref, {}, defaultdict(int)))
+            current_fields.update(fields)
+            for k, v in deltas.items():
+                current[k] += v
+        for article_id, deltas in (article_deltas or {}).items():
+            current = _article_deltas.setdefault(article_id, defaultdict(int))
+            for k, v in deltas.items():
+                current[k] += v
+
+
+def _roll_up(article_deltas: dict):
+    """Add each article's deltas onto its document; no shard is read"""
+    failed = {}
+    for article_id, deltas in article_deltas.items():
+        try:
+            db.collection(ARTICLES_COLLECTION).document(article_id).update(
+                {k: Increment(v) for k, v in deltas.items() if v}
+            )
+        except NotFound:
+            continue
+        except Exception:
+            logger.warning("Counter roll-up failed for %s", article_id, exc_info=True)
+            failed[article_id] = deltas
+            continue
+        _totals_cache.pop(article_id, None)
+        article_cache.invalidate(article_id)
+    _restore(article_deltas=failed)
+
+
+def flush_counters(roll_up: bool = True):
+    """Write buffered increments, then (with roll_up) add the deltas since the last roll-up onto the articles"""
+    global _pending, _article_deltas
+    with _lock:
+        pending, _pending = _pending, {}
+        article_deltas = {}
+        if roll_up:
+            article_deltas, _article_deltas = _article_deltas, {}
+
+    if pending:
+        try:
+            _write_pending(pending)
+        except Exception:
+            _restore(pending, article_deltas)
+            raise
+
+    now = time.monotonic()
+    for article_id, (_, expires_at) in list(_totals_cache.items()):
+        if expires_at <= now:
+            _totals_cache.pop(article_id, None)
+
+    _roll_up(article_deltas)
+
+    if pending or article_deltas:
+        # Analytics only change once buffered increments reach Firestore
+        invalidate_analytics()
+
+
+def _run_flusher():
+    rolled_up = time.monotonic()
+    while not _stop.wait(COUNTER_FLUSH_INTERVAL):
+        roll_up = time.monotonic() - rolled_up >= COUNTER_ROLLUP_INTERVAL
+        if roll_up:
+            rolled_up = time.monotonic()
+        try:
+            flush_counters(roll_up)
+        except Exception:
+            logger.exception("Counter flush failed")
+
+
+def start_counter_flusher():
+    global _flusher
+    if _flusher is None:
+        _stop.clear()
+        _flusher = threading.Thread(target=_run_flusher, name="counter-flusher", daemon=True)
+        _flusher.start()
+
+
+def stop_counter_flusher():
+    global _flusher
+    _stop.set()
+    if _flusher is not None:
+        _flusher.join()
+        _flusher = None
+    flush_counters()
@@ -0,0 +1,69 @@
+from datetime import datetime, timezone
+
+from .config import COUNTER_WRITE_BEHIND
+from .counters import increment_article_counters, commit
+from .stats import increment_stats
+from .trending import trending_points
+from .activity import record_activity
+from .jobs import register, enqueue
+from .firebase import db
+
+# engagement kind -> article counter field
+COUNTER_FIELDS = {
+    "likes": "likes_count",
+    "comments": "comments_count",
+    "shares": "shares_count",
+    "views": "views",
+}
+
+
+def record_engagement(batch, article_id: str, at: datetime = None, trending_at: datetime = None, **engagement):
+    """Article counters, trending score, global stats and activity buckets for one engagement.
+
+    e.g. record_engagement(batch, slug, likes=1). trending_at is when the points were
+    originally earned, for undoing an earlier engagement such as an unlike.
+    """
+    increment_article_counters(
+        batch,
+        article_id,
+        trending_score=trending_points(trending_at or at, **engagement),
+        **{COUNTER_FIELDS[k]: v for k, v in engagement.items()}
+    )
+    increment_stats(batch, **engagement)
+    record_activity(batch, article_id, at, **engagement)
+
+
+def commit_engagement(batch, article_id: str, at: datetime = None, trending_at: datetime = None, **engagement):
+    """Commit a batch together with the counter writes for an engagement it records.
+
+    With write-behind, increments are buffered only once the batch has committed, so a write
+    that fails its precondition isn't counted.
+    """
+    if COUNTER_WRITE_BEHIND:
+        commit(batch)
+        # Buffered in memory; nothing is added to the already committed batch
+        record_engagement(batch, article_id, at, trending_at, **engagement)
+    else:
+        record_engagement(batch, article_id, at, trending_at, **engagement)
+        commit(batch)
+
+
+def _engagement_job(article_id: str, at: str, engagement: dict):
+    batch = db.batch()
+    record_engagement(batch, article_id, datetime.fromisoformat(at), **engagement)
+    commit(batch)
+
+
+register("engagement", _engagement_job)
+
+
+def defer_engagement(article_id: str, at: datetime = None, **engagement):
+    """Record an engagement no other write depends on (a view, a share) off the request path.
+
+    Buffered in memory with write-behind; otherwise written by a background job.
+    """
+    if COUNTER_WRITE_BEHIND:
+        record_engagement(db.batch(), article_id, at, **engagement)
+    else:
+        at = at or datetime.now(timezone.utc)
+        enqueue("engagement", {"article_id": article_id, "at": at, "engagement": engagement})
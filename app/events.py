@@ -0,0 +1,261 @@
+"""Live article events for Server-Sent Events streams.
+
+Each article with subscribers in this process has one topic with two Firestore listeners,
+shared by all of them: one on the article document, whose counters each process's flusher
+updates every COUNTER_ROLLUP_INTERVAL, and one on comments created since the topic opened. Subscribers are only sent what changed:
+
+    event: counters   data: {"likes_count": 12}      counters that changed, with new values
+    event: comment    data: {"id": ..., "text": ...}  a new comment
+    event: resync     data: {}                        events were dropped; refetch
+    event: deleted    data: {}                        the article is gone; the stream ends
+
+Listener callbacks run on Firestore's threads and hand each event to the event loop once.
+Counter changes are merged into one pending update per subscriber, so a slow reader only
+holds the latest values; one that falls EVENTS_QUEUE_SIZE comments behind has its queue
+dropped and is sent resync instead.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from google.cloud.firestore_v1.base_query import FieldFilter
+from google.cloud.firestore_v1.watch import ChangeType
+
+from .config import EVENTS_MAX_SUBSCRIBERS, EVENTS_QUEUE_SIZE, EVENTS_LINGER
+from .firebase import db, ARTICLES_COLLECTION
+from .metrics import registry
+from .models import CommentOut
+from .serialization import comment_data
+from .routers.comments import COMMENTS_SUBCOL
+
+logger = logging.getLogger(__name__)
+
+STREAMED_COUNTERS = ("likes_count", "comments_count", "shares_count", "views")
+REAP_INTERVAL = 5
+
+
+def format_event(event: str, data: str) -> bytes:
+    return f"event: {event}\ndata: {data}\n\n".encode()
+
+
+class Subscriber:
+    """Events waiting for one stream. Only touched on its event loop."""
+
+    def __init__(self, article_id: str, loop: asyncio.AbstractEventLoop, max_queued: int = EVENTS_QUEUE_SIZE):
+        self.article_id = article_id
+        self.loop = loop
+        self.max_queued = max_queued
+        self.closed = False
+        self.resyncs = 0
+        self._counters = {}
+        self._events = deque()  # (event, JSON data)
+        self._lagged = False
+        self._ready = asyncio.Event()
+
+    def offer(self, event: str, data):
+        if event == "counters":
+            self._counters.update(data)
+        elif event != "deleted" and len(self._events) >= self.max_queued:
+            self._events.clear()
+            if not self._lagged:
+                self._lagged = True
+                self.resyncs += 1
+        else:
+            self._events.append((event, data))
+        self._ready.set()
+
+    async def next(self, timeout: float) -> list:
+        """Encoded events, waiting up to timeout for some; [] if none came"""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        self._ready.clear()
+        frames = [format_event("resync", "{}")] if self._lagged else []
+        self._lagged = False
+        for event, data in self._events:
+            frames.append(format_event(event, data))
+            self.closed = self.closed or event == "deleted"
+        self._events.clear()
+        if self._counters:
+            frames.append(format_event("counters", json.dumps(self._counters)))
+            self._counters = {}
+        return frames
+
+
+class _Topic:
+    def __init__(self, article_id: str):
+        self.article_id = article_id
+        self.subscribers = set()
+        self.counters = None  # latest streamed counter values
+        self.watches = []
+        self.idle_since = None
+
+
+def _deliver(subscribers, event: str, data):
+    for subscriber in subscribers:
+        subscriber.offer(event, data)
+
+
+class EventHub:
+    def __init__(self, max_subscribers: int = EVENTS_MAX_SUBSCRIBERS, linger: float = EVENTS_LINGER):
+        self.max_subscribers = max_subscribers
+        self.linger = linger
+        self._lock = threading.Lock()
+        self._topics = {}  # article id -> _Topic
+        self._subscribers = 0
+        self._reaper = None
+        self.published = 0
+        self.resyncs = 0
+
+    # --- subscribers ------------------------------------------------------------------
+
+    def subscribe(self, subscriber: Subscriber) -> bool:
+        """Add a subscriber, opening its article's listeners if needed; False when full.
+
+        Blocks while the listeners open, so call it from a worker thread.
+        """
+        with self._lock:
+            if self._subscribers >= self.max_subscribers:
+                return False
+            self._subscribers += 1
+            topic = self._topics.get(subscriber.article_id)
+            opening = topic is None
+            if opening:
+                topic = self._topics[subscriber.article_id] = _Topic(subscriber.article_id)
+            topic.subscribers.add(subscriber)
+            topic.idle_since = None
+            counters = topic.counters
+        if opening:
+            try:
+                self._open(topic)
+            except Exception:
+                self.unsubscribe(subscriber)
+                raise
+        elif counters is not None:
+            # The current values, as the starting point for later changes
+            subscriber.loop.call_soon_threadsafe(subscriber.offer, "counters", counters)
+        return True
+
+    def unsubscribe(self, subscriber: Subscriber):
+        """Remove a subscriber; its topic's listeners close once idle for the linger time"""
+        with self._lock:
+            topic = self._topics.get(subscriber.article_id)
+            if topic is None or subscriber not in topic.subscribers:
+                return
+            topic.subscribers.discard(subscriber)
+            self._subscribers -= 1
+            self.resyncs += subscriber.resyncs
+            if topic.subscribers:
+                return
+            topic.idle_since = time.monotonic()
+            if self._reaper is None:
+                self._reaper = threading.Thread(target=self._reap, name="event-reaper", daemon=True)
+                self._reaper.start()
+
+    # --- listeners --------------------------------------------------------------------
+
+    def _open(self, topic: _Topic):
+        article_ref = db.collection(ARTICLES_COLLECTION).document(topic.article_id)
+        since = datetime.now(timezone.utc)
+        comments = article_ref.collection(COMMENTS_SUBCOL).where(filter=FieldFilter("created_at", ">", since))
+        watches = [
+            article_ref.on_snapshot(lambda docs, changes, read_time: self._on_article(topic, docs)),
+            comments.on_snapshot(lambda docs, changes, read_time: self._on_comments(topic, changes)),
+        ]
+        with self._lock:
+            if self._topics.get(topic.article_id) is topic:
+                topic.watches, watches = watches, []
+        # Closed while opening
+        for watch in watches:
+            watch.unsubscribe()
+
+    def _on_article(self, topic: _Topic, docs):
+        doc = docs[0] if docs else None
+        if doc is None or not doc.exists:
+            self._publish(topic, "deleted", "{}")
+            return
+        data = doc.to_dict()
+        current = {f: data.get(f, 0) for f in STREAMED_COUNTERS}
+        with self._lock:
+            previous, topic.counters = topic.counters, current
+        changed = {f: v for f, v in current.items() if previous is None or previous[f] != v}
+        if changed:
+            self._publish(topic, "counters", changed)
+
+    def _on_comments(self, topic: _Topic, changes):
+        for change in changes:
+            if change.type == ChangeType.ADDED:
+                comment = CommentOut(**comment_data(change.document))
+                self._publish(topic, "comment", comment.model_dump_json())
+
+    def _publish(self, topic: _Topic, event: str, data):
+        with self._lock:
+            by_loop = {}
+            for subscriber in topic.subscribers:
+                by_loop.setdefault(subscriber.loop, []).append(subscriber)
+            self.published += 1
+        for loop, subscribers in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(_deliver, subscribers, event, data)
+            except RuntimeError:
+                # The loop has shut down; its streams are gone
+                pass
+
+    def close_idle(self, older_than: float = None) -> int:
+        """Close the listeners of topics without subscribers for longer than the linger time"""
+        cutoff = time.monotonic() - (self.linger if older_than is None else older_than)
+        with self._lock:
+            idle = [t for t in self._topics.values() if t.idle_since is not None and t.idle_since <= cutoff]
+            for topic in idle:
+                del self._topics[topic.article_id]
+        # Without the lock: closing a watch waits for its callback thread
+        for topic in idle:
+            for watch in topic.watches:
+                watch.unsubscribe()
+        return len(idle)
+
+    def _reap(self):
+        while True:
+            time.sleep(REAP_INTERVAL)
+            try:
+                self.close_idle()
+            except Exception:
+                logger.exception("Closing idle event listeners failed")
+
+    def close(self):
+        """Close every listener, e.g. at shutdown"""
+        with self._lock:
+            topics = list(self._topics.values())
+            self._topics.clear()
+            self._subscribers = 0
+        for topic in topics:
+            for watch in topic.watches:
+                watch.unsubscribe()
+
+    # --- monitoring -------------------------------------------------------------------
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "subscribers": self._subscribers,
+                "topics": len(self._topics),
+                "idle_topics": sum(1 for t in self._topics.values() if t.idle_since is not None),
+                "events_published": self.published,
+                "resyncs": self.resyncs,
+                "max_subscribers": self.max_subscribers,
+            }
+
+    def gauges(self) -> list:
+        stats = self.stats()
+        return [
+            ("event_subscribers", "Open article event streams", [((), stats["subscribers"])]),
+            ("event_topics", "Articles with open event listeners", [((), stats["topics"])]),
+        ]
+
+
+event_hub = EventHub()
+registry.gauges.append(event_hub.gauges)
@@ -0,0 +1,733 @@
+"""In-memory stand-ins for the Firestore and Cloud Storage clients.
+
+Selected with STORAGE_BACKEND=memory for local runs and benchmarks. Covers the subset of
+the client APIs this app uses: collections and subcollections, collection groups, get,
+get_all (with field masks), set/create/update/delete with merge, preconditions and the
+Increment/ArrayUnion/ArrayRemove/SERVER_TIMESTAMP/DELETE_FIELD transforms, batches,
+BulkWriter, queries with select/where/order_by/limit/start_after, and document and query
+listeners (a query listener applies its filters but not its order or limit).
+Reads and writes are counted in `ops` the way Firestore bills them.
+"""
+import bisect
+import functools
+import os
+import random
+import string
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from google.api_core.exceptions import AlreadyExists, FailedPrecondition, NotFound
+from google.cloud.firestore_v1 import transforms
+from google.cloud.firestore_v1.watch import ChangeType, DocumentChange
+
+_AUTO_ID_CHARS = string.ascii_letters + string.digits
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+# Sorted query results kept between writes, by (collections, ordering)
+MAX_SORTED_CACHE = 256
+
+
+def _copy(value):
+    """Deep copy for the plain values Firestore stores"""
+    if isinstance(value, dict):
+        return {k: _copy(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_copy(v) for v in value]
+    return value
+
+
+def _get_path(data: dict, field_path: str):
+    value = data
+    for part in field_path.split("."):
+        value = value[part]
+    return value
+
+
+def _project(data: dict, field_paths) -> dict:
+    projected = {}
+    for path in field_paths:
+        try:
+            value = _get_path(data, path)
+        except (KeyError, TypeError):
+            continue
+        target = projected
+        parts = path.split(".")
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        target[parts[-1]] = _copy(value)
+    return projected
+
+
+# Firestore orders values of different types by type first
+def _type_rank(value) -> int:
+    if value is None:
+        return 0
+    if isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, datetime):
+        return 3
+    if isinstance(value, str):
+        return 4
+    if isinstance(value, bytes):
+        return 5
+    if isinstance(value, tuple):
+        return 6  # document path
+    if isinstance(value, list):
+        return 8
+    return 9
+
+
+def _compare(a, b) -> int:
+    ra, rb = _type_rank(a), _type_rank(b)
+    if ra != rb:
+        return -1 if ra < rb else 1
+    if ra in (0, 9):
+        return 0
+    if a < b:
+        return -1
+    return 1 if a > b else 0
+
+
+class _Stored:
+    __slots__ = ("data", "create_time", "update_time")
+
+    def __init__(self, data, create_time, update_time):
+        self.data = data
+        self.create_time = create_time
+        self.update_time = update_time
+
+
+class FakeSnapshot:
+    def __init__(self, reference, data, create_time=None, update_time=None, read_time=None):
+        self.reference = reference
+        self._data = data
+        self.create_time = create_time
+        self.update_time = update_time
+        self.read_time = read_time
+
+    @property
+    def id(self):
+        return self.reference.id
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return _copy(self._data) if self._data is not None else None
+
+    def get(self, field_path: str):
+        if self._data is None:
+            raise KeyError(field_path)
+        return _copy(_get_path(self._data, field_path))
+
+
+class _Precondition:
+    def __init__(self, exists=None, last_update_time=None):
+        self.exists = exists
+        self.last_update_time = last_update_time
+
+
+class _Watch:
+    def __init__(self, client, path, callback):
+        self._client = client
+        self._path = path
+        self._callback = callback
+
+    def unsubscribe(self):
+        self._client._remove_watch(self._path, self)
+
+
+class _QueryWatch(_Watch):
+    def __init__(self, client, query, callback):
+        super().__init__(client, query._collection_path, callback)
+        self._query = query
+        self._matched = set()  # paths of the documents currently in the result
+
+
+class FakeDocumentReference:
+    _trace_kind = "document"
+
+    def __init__(self, client, path: str):
+        self._client = client
+        self.path = path
+
+    @property
+    def id(self):
+        return self.path.rsplit("/", 1)[-1]
+
+    @property
+    def parent(self):
+        return FakeCollectionReference(self._client, self.path.rsplit("/", 1)[0])
+
+    def collection(self, collection_id: str):
+        return FakeCollectionReference(self._client, f"{self.path}/{collection_id}")
+
+    def get(self, field_paths=None, transaction=None, **kwargs):
+        return self._client._snapshot(self, field_paths, count=True)
+
+    def set(self, document_data: dict, merge=False):
+        return self._client._commit([("set", self, document_data, merge, None)])[0]
+
+    def create(self, document_data: dict):
+        return self._client._commit([("create", self, document_data, False, None)])[0]
+
+    def update(self, field_updates: dict, option=None):
+        return self._client._commit([("update", self, field_updates, False, option)])[0]
+
+    def delete(self, option=None):
+        return self._client._commit([("delete", self, None, False, option)])[0]
+
+    def on_snapshot(self, callback):
+        return self._client._add_watch(self, callback)
+
+    def __eq__(self, other):
+        return isinstance(other, FakeDocumentReference) and other.path == self.path
+
+    def __hash__(self):
+        return hash(self.path)
+
+    def __repr__(self):
+        return f"FakeDocumentReference({self.path!r})"
+
+
+class FakeQuery:
+    _trace_kind = "query"
+
+    def __init__(self, client, collection_path: str = None, group_id: str = None,
+                 fields=None, filters=(), orders=(), limit=None, cursor=None):
+        self._client = client
+        self._collection_path = collection_path
+        self._group_id = group_id
+        self._fields = fields
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._limit = limit
+        self._cursor = cursor
+
+    def _copy_with(self, **changes):
+        state = {
+            "collection_path": self._collection_path, "group_id": self._group_id, "fields": self._fields,
+            "filters": self._filters, "orders": self._orders, "limit": self._limit, "cursor": self._cursor,
+        }
+        state.update(changes)
+        return FakeQuery(self._client, **state)
+
+    def select(self, field_paths):
+        return self._copy_with(fields=list(field_paths))
+
+    def where(self, field_path=None, op_string=None, value=None, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copy_with(filters=self._filters + ((field_path, op_string, value),))
+
+    def order_by(self, field_path: str, direction: str = "ASCENDING"):
+        return self._copy_with(orders=self._orders + ((field_path, direction == "DESCENDING"),))
+
+    def limit(self, count: int):
+        return self._copy_with(limit=count)
+
+    def start_after(self, document_fields_or_snapshot):
+        return self._copy_with(cursor=document_fields_or_snapshot)
+
+    def stream(self, transaction=None, **kwargs):
+        return iter(self.get())
+
+    def get(self, transaction=None, **kwargs):
+        return self._client._run_query(self)
+
+    def on_snapshot(self, callback):
+        return self._client._add_query_watch(self, callback)
+
+
+class FakeCollectionReference(FakeQuery):
+    _trace_kind = "collection"
+
+    def __init__(self, client, path: str):
+        super().__init__(client, collection_path=path)
+        self.path = path
+
+    @property
+    def id(self):
+        return self.path.rsplit("/", 1)[-1]
+
+    @property
+    def parent(self):
+        if "/" not in self.path:
+            return None
+        return FakeDocumentReference(self._client, self.path.rsplit("/", 1)[0])
+
+    def document(self, document_id: str = None):
+        document_id = document_id or "".join(random.choices(_AUTO_ID_CHARS, k=20))
+        return FakeDocumentReference(self._client, f"{self.path}/{document_id}")
+
+    def add(self, document_data: dict, document_id: str = None):
+        ref = self.document(document_id)
+        return ref.create(document_data), ref
+
+
+class FakeWriteBatch:
+    _trace_kind = "batch"
+
+    def __init__(self, client):
+        self._client = client
+        self._writes = []
+
+    def __len__(self):
+        return len(self._writes)
+
+    def set(self, reference, document_data, merge=False):
+        self._writes.append(("set", reference, document_data, merge, None))
+
+    def create(self, reference, document_data):
+        self._writes.append(("create", reference, document_data, False, None))
+
+    def update(self, reference, field_updates, option=None):
+        self._writes.append(("update", reference, field_updates, False, option))
+
+    def delete(self, reference, option=None):
+        self._writes.append(("delete", reference, None, False, option))
+
+    def commit(self, **kwargs):
+        return self._client._commit(self._writes)
+
+
+class FakeBulkWriter:
+    """Applies each write immediately; flush and close have nothing to wait for"""
+
+    _trace_kind = "bulk_writer"
+
+    def __init__(self, client):
+        self._client = client
+
+    def set(self, reference, document_data, merge=False):
+        self._client._commit([("set", reference, document_data, merge, None)])
+
+    def create(self, reference, document_data):
+        self._client._commit([("create", reference, document_data, False, None)])
+
+    def update(self, reference, field_updates, option=None):
+        self._client._commit([("update", reference, field_updates, False, option)])
+
+    def delete(self, reference, option=None):
+        self._client._commit([("delete", reference, None, False, option)])
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeFirestore:
+    _trace_kind = "client"
+
+    def __init__(self):
+        self._collections = defaultdict(dict)   # collection path -> {doc id: _Stored}
+        self._versions = Counter()              # collection path -> write count, for the query cache
+        self._sorted = {}                       # (collection path, orders) -> (version, keys, docs)
+        self._watches = defaultdict(list)
+        self._lock = threading.RLock()
+        self._last_write = _EPOCH
+        self.ops = Counter()                    # reads, writes, rpcs
+        # Simulated network round trip, in seconds, for load tests
+        self.rpc_latency = 0.0
+        # Count writes per document path, to find hot documents
+        self.track_documents = False
+        self.document_writes = Counter()
+
+    # --- references -------------------------------------------------------------------
+
+    def collection(self, path: str):
+        return FakeCollectionReference(self, path)
+
+    def document(self, path: str):
+        return FakeDocumentReference(self, path)
+
+    def collection_group(self, collection_id: str):
+        return FakeQuery(self, group_id=collection_id)
+
+    def batch(self):
+        return FakeWriteBatch(self)
+
+    def bulk_writer(self, options=None):
+        return FakeBulkWriter(self)
+
+    @staticmethod
+    def write_option(**kwargs):
+        return _Precondition(**kwargs)
+
+    def reset_ops(self):
+        self.ops.clear()
+        self.document_writes.clear()
+
+    def clear(self):
+        """Drop every document"""
+        with self._lock:
+            self._collections.clear()
+            self._versions.clear()
+            self._sorted.clear()
+            self._watches.clear()
+        self.reset_ops()
+
+    def _rpc(self):
+        with self._lock:
+            self.ops["rpcs"] += 1
+        if self.rpc_latency:
+            time.sleep(self.rpc_latency)
+
+    # --- reads --------------------------------------------------------------------------
+
+    def _now(self):
+        # Strictly increasing, so update times work as preconditions
+        self._last_write = max(datetime.now(timezone.utc), self._last_write + timedelta(microseconds=1))
+        return self._last_write
+
+    def _stored(self, path: str):
+        collection, _, doc_id = path.rpartition("/")
+        return self._collections.get(collection, {}).get(doc_id)
+
+    def _snapshot(self, ref, field_paths=None, count=False):
+        if count:
+            self._rpc()
+        with self._lock:
+            stored = self._stored(ref.path)
+            if count:
+                self.ops["reads"] += 1
+            if stored is None:
+                return FakeSnapshot(ref, None)
+            data = _project(stored.data, field_paths) if field_paths is not None else _copy(stored.data)
+            return FakeSnapshot(ref, data, stored.create_time, stored.update_time)
+
+    def get_all(self, references, field_paths=None, transaction=None, **kwargs):
+        references = list(references)
+        self._rpc()
+        with self._lock:
+            self.ops["reads"] += len(references)
+            snapshots = [self._snapshot(ref, field_paths) for ref in references]
+        return iter(snapshots)
+
+    def _matches(self, data: dict, filters) -> bool:
+        for field_path, op, value in filters:
+            try:
+                actual = _get_path(data, field_path)
+            except (KeyError, TypeError):
+                return False
+            if op == "==" and not actual == value:
+                return False
+            if op == "!=" and not actual != value:
+                return False
+            if op in ("<", "<=", ">", ">=") and _type_rank(actual) != _type_rank(value):
+                return False
+            if op == "<" and not actual < value:
+                return False
+            if op == "<=" and not actual <= value:
+                return False
+            if op == ">" and not actual > value:
+                return False
+            if op == ">=" and not actual >= value:
+                return False
+            if op == "in" and actual not in value:
+                return False
+            if op == "array_contains" and value not in (actual or []):
+                return False
+        return True
+
+    def _order_values(self, path: str, data: dict, orders):
+        values = []
+        for field_path, _ in orders:
+            if field_path == "__name__":
+                values.append(tuple(path.split("/")))
+            else:
+                values.append(_get_path(data, field_path))
+        return values
+
+    def _ordered(self, query):
+        """Documents of the query's collection(s) that have every order field, sorted"""
+        orders = query._orders
+        if not orders or orders[-1][0] != "__name__":
+            # Firestore breaks ties by document name in the direction of the last ordering
+            orders = orders + (("__name__", orders[-1][1] if orders else False),)
+
+        def cmp(a, b):
+            for (x, y), (_, descending) in zip(zip(a, b), orders):
+                c = _compare(x, y)
+                if c:
+                    return -c if descending else c
+            return 0
+
+        key = functools.cmp_to_key(cmp)
+        if query._group_id is not None:
+            paths = [p for p in self._collections if p.rsplit("/", 1)[-1] == query._group_id]
+        else:
+            paths = [query._collection_path]
+
+        cache_key = (tuple(paths), orders)
+        version = tuple(self._versions[p] for p in paths)
+        cached = self._sorted.get(cache_key)
+        if cached is None or cached[0] != version:
+            rows = []
+            for collection in paths:
+                for doc_id, stored in self._collections.get(collection, {}).items():
+                    path = f"{collection}/{doc_id}"
+                    try:
+                        values = self._order_values(path, stored.data, orders)
+                    except (KeyError, TypeError):
+                        continue
+                    rows.append((key(values), path))
+            rows.sort(key=lambda row: row[0])
+            cached = (version, [row[0] for row in rows], [row[1] for row in rows])
+            if len(self._sorted) >= MAX_SORTED_CACHE:
+                self._sorted.clear()
+            self._sorted[cache_key] = cached
+        return orders, key, cached[1], cached[2]
+
+    def _cursor_values(self, query, orders):
+        cursor = query._cursor
+        if isinstance(cursor, FakeSnapshot):
+            return self._order_values(cursor.reference.path, cursor._data or {}, orders)
+        values = []
+        for field_path, _ in orders:
+            value = cursor.get(field_path)
+            if field_path == "__name__":
+                if isinstance(value, FakeDocumentReference):
+                    value = value.path
+                elif "/" not in value:
+                    value = f"{query._collection_path}/{value}"
+                value = tuple(value.split("/"))
+            values.append(value)
+        return values
+
+    def _run_query(self, query):
+        self._rpc()
+        with self._lock:
+            orders, key, keys, paths = self._ordered(query)
+            start = 0
+            if query._cursor is not None:
+                start = bisect.bisect_right(keys, key(self._cursor_values(query, orders)))
+
+            snapshots = []
+            for path in paths[start:]:
+                stored = self._stored(path)
+                if not self._matches(stored.data, query._filters):
+                    continue
+                data = _project(stored.data, query._fields) if query._fields is not None else _copy(stored.data)
+                snapshots.append(FakeSnapshot(self.document(path), data, stored.create_time, stored.update_time))
+                if query._limit is not None and len(snapshots) >= query._limit:
+                    break
+            # An empty result is still billed as one read
+            self.ops["reads"] += max(len(snapshots), 1)
+            return snapshots
+
+    # --- writes -------------------------------------------------------------------------
+
+    def _check(self, op, ref, option):
+        stored = self._stored(ref.path)
+        if op == "create" and stored is not None:
+            raise AlreadyExists(f"Document already exists: {ref.path}")
+        if op == "update" and stored is None:
+            raise NotFound(f"No document to update: {ref.path}")
+        if option is not None:
+            if option.exists is not None and option.exists != (stored is not None):
+                raise FailedPrecondition(f"Precondition failed: {ref.path}")
+            if option.last_update_time is not None and (stored is None or stored.update_time != option.last_update_time):
+                raise FailedPrecondition(f"Document was updated: {ref.path}")
+
+    def _apply_value(self, current, value, now):
+        if value is transforms.SERVER_TIMESTAMP:
+            return now
+        if isinstance(value, transforms.Increment):
+            return (current if isinstance(current, (int, float)) and not isinstance(current, bool) else 0) + value.value
+        if isinstance(value, transforms.Maximum):
+            return value.value if not isinstance(current, (int, float)) else max(current, value.value)
+        if isinstance(value, transforms.Minimum):
+            return value.value if not isinstance(current, (int, float)) else min(current, value.value)
+        if isinstance(value, transforms.ArrayUnion):
+            result = list(current) if isinstance(current, list) else []
+            result += [_copy(v) for v in value.values if v not in result]
+            return result
+        if isinstance(value, transforms.ArrayRemove):
+            return [v for v in current if v not in value.values] if isinstance(current, list) else []
+        if isinstance(value, dict):
+            return {k: self._apply_value(None, v, now) for k, v in value.items() if v is not transforms.DELETE_FIELD}
+        return _copy(value)
+
+    def _merge(self, target: dict, updates: dict, now):
+        for k, v in updates.items():
+            if v is transforms.DELETE_FIELD:
+                target.pop(k, None)
+            elif isinstance(v, dict) and isinstance(target.get(k), dict):
+                self._merge(target[k], v, now)
+            else:
+                target[k] = self._apply_value(target.get(k), v, now)
+
+    def _apply(self, op, ref, data, merge, now):
+        collection, _, doc_id = ref.path.rpartition("/")
+        docs = self._collections[collection]
+        stored = docs.get(doc_id)
+        if op == "delete":
+            docs.pop(doc_id, None)
+        elif op == "update":
+            for field_path, value in data.items():
+                target = stored.data
+                parts = field_path.split(".")
+                for part in parts[:-1]:
+                    target = target.setdefault(part, {})
+                if value is transforms.DELETE_FIELD:
+                    target.pop(parts[-1], None)
+                else:
+                    target[parts[-1]] = self._apply_value(target.get(parts[-1]), value, now)
+            stored.update_time = now
+        elif merge and stored is not None:
+            self._merge(stored.data, data, now)
+            stored.update_time = now
+        else:
+            new_data = {}
+            self._merge(new_data, data, now)
+            create_time = stored.create_time if stored is not None else now
+            docs[doc_id] = _Stored(new_data, create_time, now)
+        self._versions[collection] += 1
+
+    def _commit(self, writes):
+        """Apply writes atomically: every precondition is checked before anything changes"""
+        notify = []
+        written = defaultdict(list)  # query watch -> paths written in its collection
+        self._rpc()
+        with self._lock:
+            for op, ref, _, _, option in writes:
+                self._check(op, ref, option)
+            now = self._now()
+            for op, ref, data, merge, _ in writes:
+                self._apply(op, ref, data, merge, now)
+                if self.track_documents:
+                    self.document_writes[ref.path] += 1
+                for watch in self._watches.get(ref.path, ()):
+                    notify.append((watch, ref))
+                for watch in self._watches.get(ref.path.rpartition("/")[0], ()):
+                    written[watch].append(ref.path)
+            self.ops["writes"] += len(writes)
+            query_changes = [(watch, self._query_changes(watch, paths)) for watch, paths in written.items()]
+        for watch, ref in notify:
+            watch._callback([self._snapshot(ref)], [], now)
+        for watch, (docs, changes) in query_changes:
+            if changes:
+                watch._callback(docs, changes, now)
+        return [now] * len(writes)
+
+    # --- listeners ----------------------------------------------------------------------
+
+    def _add_watch(self, ref, callback):
+        watch = _Watch(self, ref.path, callback)
+        with self._lock:
+            self._watches[ref.path].append(watch)
+        callback([self._snapshot(ref)], [], None)
+        return watch
+
+    def _add_query_watch(self, query, callback):
+        watch = _QueryWatch(self, query, callback)
+        with self._lock:
+            self._watches[watch._path].append(watch)
+            paths = [f"{watch._path}/{doc_id}" for doc_id in self._collections.get(watch._path, {})]
+            docs, changes = self._query_changes(watch, paths)
+        callback(docs, changes, None)
+        return watch
+
+    def _query_changes(self, watch, paths):
+        """Update a query listener's result set for written documents: (all docs, changes)"""
+        changes = []
+        for path in dict.fromkeys(paths):
+            stored = self._stored(path)
+            matches = stored is not None and self._matches(stored.data, watch._query._filters)
+            if matches:
+                kind = ChangeType.MODIFIED if path in watch._matched else ChangeType.ADDED
+                watch._matched.add(path)
+            elif path in watch._matched:
+                kind = ChangeType.REMOVED
+                watch._matched.discard(path)
+            else:
+                continue
+            changes.append(DocumentChange(kind, self._snapshot(self.document(path)), -1, -1))
+        # Listeners are billed a read per document they receive
+        self.ops["reads"] += len(changes)
+        docs = [self._snapshot(self.document(path)) for path in sorted(watch._matched)]
+        return docs, changes
+
+    def _remove_watch(self, path, watch):
+        with self._lock:
+            if watch in self._watches.get(path, []):
+                self._watches[path].remove(watch)
+
+
+class FakeBlob:
+    _trace_kind = "blob"
+
+    def __init__(self, bucket, name: str, chunk_size=None):
+        self.bucket = bucket
+        self.name = name
+        self.chunk_size = chunk_size
+        self.content_type = None
+
+    @property
+    def public_url(self):
+        return f"https://storage.googleapis.com/{self.bucket.name}/{self.name}"
+
+    def _store(self, data: bytes, content_type):
+        self.content_type = content_type
+        with self.bucket._lock:
+            self.bucket.objects[self.name] = data
+            self.bucket.ops["uploads"] += 1
+            self.bucket.ops["bytes"] += len(data)
+
+    def upload_from_file(self, file_obj, size=None, content_type=None, **kwargs):
+        self._store(file_obj.read() if size is None else file_obj.read(size), content_type)
+
+    def upload_from_string(self, data, content_type=None, **kwargs):
+        self._store(data.encode() if isinstance(data, str) else data, content_type)
+
+    def upload_from_filename(self, filename, content_type=None, **kwargs):
+        with open(filename, "rb") as f:
+            self._store(f.read(), content_type)
+
+    def make_public(self, **kwargs):
+        self.bucket.ops["acl"] += 1
+
+    def exists(self, **kwargs):
+        return self.name in self.bucket.objects
+
+    def download_as_bytes(self, **kwargs):
+        try:
+            return self.bucket.objects[self.name]
+        except KeyError:
+            raise NotFound(f"No such object: {self.bucket.name}/{self.name}")
+
+    def delete(self, **kwargs):
+        if self.bucket.objects.pop(self.name, None) is None:
+            raise NotFound(f"No such object: {self.bucket.name}/{self.name}")
+
+
+class FakeBucket:
+    _trace_kind = "bucket"
+
+    def __init__(self, name: str):
+        self.name = name
+        self.objects = {}
+        self.ops = Counter()
+        self._lock = threading.Lock()
+
+    def blob(self, blob_name: str, chunk_size=None, **kwargs):
+        return FakeBlob(self, blob_name, chunk_size)
+
+    def clear(self):
+        with self._lock:
+            self.objects.clear()
+            self.ops.clear()
+
+    def list_blobs(self, prefix: str = "", **kwargs):
+        return [FakeBlob(self, name) for name in sorted(self.objects) if name.startswith(prefix)]
+
+
+def memory_clients(bucket_name: str = None):
+    """A fresh (db, bucket) pair"""
+    return FakeFirestore(), FakeBucket(bucket_name or os.environ.get("FIREBASE_STORAGE_BUCKET", "local-bucket"))
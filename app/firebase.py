@@ -1,27 +1,99 @@
-import firebase_admin
-from firebase_admin import credentials, firestore, storage
-from google.cloud import storage as gcs
-from google.oauth2 import service_account
-from .config import FIREBASE_SERVICE_ACCOUNT, FIREBASE_STORAGE_BUCKET
-
-# Initialize Firebase Admin
-if not firebase_admin._apps:
-    # CORRECT: Use credentials.Certificate() with a dictionary
-    cred = credentials.Certificate(FIREBASE_SERVICE_ACCOUNT)
-    firebase_admin.initialize_app(cred, {
-        "storageBucket": FIREBASE_STORAGE_BUCKET
-    })
-
-# Firestore client
-db = firestore.client()
-
-# Storage clients
-bucket = storage.bucket()  # Firebase admin bucket
-
-# Create GCS client using the service account info
-gcs_credentials = service_account.Credentials.from_service_account_info(FIREBASE_SERVICE_ACCOUNT)
-gcs_client = gcs.Client(
-    credentials=gcs_credentials, 
-    project=FIREBASE_SERVICE_ACCOUNT['project_id']
-)
-gcs_bucket = gcs_client.bucket(FIREBASE_STORAGE_BUCKET)
\ No newline at end of file
+import os
+import threading
+from .config import FIREBASE_STORAGE_BUCKET, IO_THREADS, STORAGE_BACKEND, service_account_info
+from .metrics import traced
+
+ARTICLES_COLLECTION = "articles"
+
+
+class LazyClient:
+    """Builds a client on first use and forwards every attribute to it.
+
+    Keeps importing the app cheap: the SDKs, the credential and the client channels are set
+    up by the first request (or the warmup thread) that needs them, once per process.
+    """
+
+    def __init__(self, build):
+        self._build = build
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def built(self) -> bool:
+        return self._client is not None
+
+    def get(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._build()
+        return self._client
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+
+def _certificate():
+    from firebase_admin import credentials
+    return credentials.Certificate(service_account_info())
+
+
+# One service-account credential, shared by firebase-admin (Firestore, auth) and GCS
+credential = LazyClient(_certificate)
+
+
+def _initialize_app():
+    import firebase_admin
+    if not firebase_admin._apps:
+        firebase_admin.initialize_app(credential.get(), {
+            "storageBucket": FIREBASE_STORAGE_BUCKET
+        })
+    return firebase_admin.get_app()
+
+
+firebase_app = LazyClient(_initialize_app)
+
+
+def _firestore_client():
+    from firebase_admin import firestore
+    # Calls through it are timed and counted per request (app/metrics.py)
+    return traced(firestore.client(firebase_app.get()), "firestore")
+
+
+def _gcs_bucket():
+    from google.cloud import storage as gcs
+    if os.environ.get("STORAGE_EMULATOR_HOST"):
+        # Local GCS stand-in (e.g. fake-gcs-server); the client sends requests to the emulator host
+        from google.auth.credentials import AnonymousCredentials
+        gcs_credentials = AnonymousCredentials()
+    else:
+        gcs_credentials = credential.get().get_credential()
+    gcs_client = gcs.Client(
+        credentials=gcs_credentials,
+        project=service_account_info()['project_id']
+    )
+    return traced(gcs_client.bucket(FIREBASE_STORAGE_BUCKET), "gcs")
+
+
+if STORAGE_BACKEND == "memory":
+    # In-process Firestore/GCS stand-ins: no credentials, no network, state lost on exit
+    from .fakes import memory_clients
+    _memory_db, _memory_bucket = memory_clients(FIREBASE_STORAGE_BUCKET)
+    db = traced(_memory_db, "firestore")
+    gcs_bucket = traced(_memory_bucket, "gcs")
+else:
+    # Built on first use; GCS only once something is uploaded
+    db = LazyClient(_firestore_client)
+    gcs_bucket = LazyClient(_gcs_bucket)
+bucket = gcs_bucket
+
+
+def configure_io_threads(limit: int = IO_THREADS):
+    """Bound the worker threads used for blocking client calls.
+
+    The Firestore and GCS clients are synchronous, so routes that use them are plain `def`
+    handlers and FastAPI runs them on the anyio thread pool instead of the event loop.
+    Must be called from inside the running event loop.
+    """
+    from anyio import to_thread
+    to_thread.current_default_thread_limiter().total_tokens = limit
@@ -0,0 +1,149 @@
+import hashlib
+import re
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi import Request, Response
+
+# Cache-Control by path, first match wins. Public content can be held by a CDN and served stale
+# while it revalidates; analytics is for editors only and stays out of shared caches.
+CACHE_POLICIES = [
+    (re.compile(r"^/sitemap(-\d+)?\.xml$"), "public, max-age=3600, stale-while-revalidate=86400"),
+    (re.compile(r"^/analytics/"), "private, max-age=30, stale-while-revalidate=60"),
+    (re.compile(r"^/articles/[^/]+/comments$"), "public, max-age=10, stale-while-revalidate=60"),
+    (re.compile(r"^/articles/"), "public, max-age=60, stale-while-revalidate=300"),
+]
+
+
+def make_etag(*parts) -> str:
+    digest = hashlib.sha1("|".join(str(p) for p in parts).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+# Stored fields article_version reads; a projected read must include them to be validated
+VERSION_FIELDS = ["updated_at", "likes_count", "comments_count", "shares_count", "views"]
+
+
+def article_version(data: dict) -> tuple:
+    """What changes an article's representation: edits and the rolled-up counters"""
+    return (data.get("id"), *(data.get(f) for f in VERSION_FIELDS))
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return any(tag.removeprefix("W/") == etag.removeprefix("W/") for tag in candidates)
+
+
+def _not_modified_since(if_modified_since: str, last_modified) -> bool:
+    if not if_modified_since or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    # HTTP dates have one-second resolution
+    return last_modified.replace(microsecond=0) <= since
+
+
+def validator_headers(etag: str, last_modified=None) -> dict:
+    headers = {"ETag": etag}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+    return headers
+
+
+def not_modified(request: Request, etag: str, last_modified=None):
+    """A 304 response if the client's copy is current, otherwise None.
+
+    Call before serialising so a revalidation costs only the reads needed to build the ETag.
+    If-None-Match takes precedence over If-Modified-Since, as RFC 9110 requires.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        fresh = etag_matches(if_none_match, etag)
+    else:
+        fresh = _not_modified_since(request.headers.get("if-modified-since"), last_modified)
+    if fresh:
+        return Response(status_code=304, headers=validator_headers(etag, last_modified))
+    return None
+
+
+class HTTPCacheMiddleware:
+    """Adds Cache-Control to GET responses and answers If-None-Match with 304.
+
+    Routes that can derive an ETag cheaply set it themselves (and usually short-circuit with
+    not_modified()). For the rest, a strong ETag is computed from the response body, which
+    still saves the transfer and lets CDNs revalidate.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+
+        policy = next((value for pattern, value in CACHE_POLICIES if pattern.match(scope["path"])), None)
+        request_headers = dict(scope["headers"])
+        if_none_match = request_headers.get(b"if-none-match", b"").decode("latin-1")
+        start = {}
+        body = []
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = [(k, v) for k, v in message["headers"]]
+                names = {k.lower() for k, _ in headers}
+                if policy and message["status"] in (200, 304) and b"cache-control" not in names:
+                    headers.append((b"cache-control", policy.encode()))
+                message = {**message, "headers": headers}
+                content_type = next((v for k, v in headers if k.lower() == b"content-type"), b"")
+                if message["status"] != 200 or content_type.startswith(b"text/event-stream"):
+                    # Event streams never end, so there's no body to hash
+                    await send(message)
+                    return
+                etag = next((v.decode("latin-1") for k, v in headers if k.lower() == b"etag"), None)
+                if etag is not None:
+                    if etag_matches(if_none_match, etag):
+                        start.update(message, status=304, skip_body=True)
+                        await send(_as_304(message))
+                    else:
+                        await send(message)
+                    return
+                # No validator: hold the body back to hash it
+                start.update(message, buffer=True)
+                return
+
+            if start.get("skip_body"):
+                if not message.get("more_body"):
+                    await send({"type": "http.response.body", "body": b""})
+                return
+            if start.get("buffer"):
+                body.append(message.get("body", b""))
+                if message.get("more_body"):
+                    return
+                content = b"".join(body)
+                etag = '"%s"' % hashlib.sha1(content).hexdigest()
+                headers = [(k, v) for k, v in start["headers"] if k.lower() != b"content-length"]
+                headers.append((b"etag", etag.encode()))
+                response_start = {"type": "http.response.start", "status": 200, "headers": headers}
+                if etag_matches(if_none_match, etag):
+                    await send(_as_304(response_start))
+                    await send({"type": "http.response.body", "body": b""})
+                    return
+                headers.append((b"content-length", str(len(content)).encode()))
+                await send(response_start)
+                await send({"type": "http.response.body", "body": content})
+                return
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+def _as_304(message):
+    # A 304 carries the validators and caching headers but no body or content headers
+    dropped = {b"content-length", b"content-type"}
+    headers = [(k, v) for k, v in message["headers"] if k.lower() not in dropped]
+    return {"type": "http.response.start", "status": 304, "headers": headers}
@@ -0,0 +1,77 @@
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import blurhash
+from PIL import Image, ImageOps
+
+from .config import IMAGE_WORKERS
+
+# Nothing in this module may import the Firebase clients: it is imported again by the
+# spawned worker processes, which only need the pure image functions.
+
+VARIANT_WIDTHS = (320, 640, 1280)
+VARIANT_FORMATS = (("webp", "WEBP", "image/webp"), ("jpg", "JPEG", "image/jpeg"))
+SOCIAL_CARD_SIZE = (1200, 630)
+VARIANT_QUALITY = 80
+BLURHASH_COMPONENTS = (4, 3)
+
+# Formats Pillow can decode; anything else (svg, video) is stored as uploaded
+PROCESSABLE_TYPES = {"image/jpeg", "image/png", "image/webp", "image/gif", "image/bmp", "image/tiff"}
+
+_pool = None
+
+
+def _encode(image: Image.Image, fmt: str) -> bytes:
+    out = io.BytesIO()
+    image.save(out, format=fmt, quality=VARIANT_QUALITY)
+    return out.getvalue()
+
+
+def process_image(data: bytes, social_card: bool = False) -> dict:
+    """Resize an image into web variants plus blurhash and dimensions.
+
+    Runs in a worker process. Returns encoded bytes for each variant; nothing is uploaded here.
+    """
+    image = ImageOps.exif_transpose(Image.open(io.BytesIO(data))).convert("RGB")
+    width, height = image.size
+
+    preview = image.copy()
+    preview.thumbnail((64, 64))
+    result = {
+        "width": width,
+        "height": height,
+        "blurhash": blurhash.encode(preview, *BLURHASH_COMPONENTS),
+        "variants": [],
+        "social_card": None,
+    }
+
+    # Never upscale; an image narrower than every target still gets one variant at its own width
+    targets = [w for w in VARIANT_WIDTHS if w < width] or [width]
+    for target in targets:
+        resized = image.resize((target, round(height * target / width)), Image.LANCZOS)
+        for ext, fmt, content_type in VARIANT_FORMATS:
+            result["variants"].append({
+                "width": resized.width,
+                "height": resized.height,
+                "format": ext,
+                "content_type": content_type,
+                "data": _encode(resized, fmt),
+            })
+
+    if social_card:
+        card = ImageOps.fit(image, SOCIAL_CARD_SIZE, Image.LANCZOS)
+        result["social_card"] = _encode(card, "JPEG")
+    return result
+
+
+def get_image_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn rather than fork: forking a process that holds gRPC channels is unsafe
+        _pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def process_image_in_pool(data: bytes, social_card: bool = False) -> dict:
+    return get_image_pool().submit(process_image, data, social_card).result()
@@ -0,0 +1,242 @@
+"""Persistent background jobs for work that follows from a write.
+
+Jobs are rows in a local SQLite file, so queued work survives a restart and every worker
+process on the host drains the same queue. A job runs at least once: handlers must be safe
+to repeat, and enqueueing with an idempotency key that is already queued or done is a no-op.
+Jobs that share a group (e.g. an article id) run one at a time, in the order enqueued, so
+later changes to an article never overtake earlier ones.
+
+    register("search_index", update_search_index)
+    enqueue("search_index", {"slug": slug, "new_data": data}, key=..., group=slug)
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from .config import JOBS_DB_PATH, JOB_WORKERS, JOB_MAX_ATTEMPTS
+from .metrics import registry, collect
+
+logger = logging.getLogger(__name__)
+
+# A claimed job is handed to another worker if not finished within this many seconds
+LEASE_SECONDS = 300
+RETRY_DELAY = 2
+MAX_RETRY_DELAY = 600
+# Other processes' jobs are only seen by polling
+POLL_INTERVAL = 1.0
+# Finished jobs, and their idempotency keys, are kept this long; failed ones until removed
+RETENTION_SECONDS = 86400
+CLEANUP_INTERVAL = 300
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    idempotency_key TEXT UNIQUE,
+    job_group TEXT,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    run_at REAL NOT NULL,
+    enqueued_at REAL NOT NULL,
+    lease_until REAL,
+    finished_at REAL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, run_at);
+CREATE INDEX IF NOT EXISTS jobs_group ON jobs (job_group, status);
+"""
+
+# Next runnable job: queued and due, or running on an expired lease, with nothing earlier
+# still pending in its group
+CLAIM = """
+SELECT id, kind, payload, attempts, max_attempts, enqueued_at FROM jobs AS j
+WHERE ((status = 'queued' AND run_at <= :now) OR (status = 'running' AND lease_until < :now))
+  AND NOT EXISTS (
+    SELECT 1 FROM jobs AS e
+    WHERE e.job_group = j.job_group AND e.id < j.id AND e.status IN ('queued', 'running')
+  )
+ORDER BY run_at, id
+LIMIT 1
+"""
+
+_handlers = {}
+
+
+def register(kind: str, func):
+    """Run func(**payload) for jobs of this kind"""
+    _handlers[kind] = func
+    return func
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class JobQueue:
+    def __init__(self, path: str = JOBS_DB_PATH, workers: int = JOB_WORKERS):
+        self.path = path
+        self.workers = workers
+        # One connection per process; SQLite's file lock orders writers across processes
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition()
+        self._stop = threading.Event()
+        self._threads = []
+        self._last_cleanup = 0.0
+        with self._lock:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+
+    # --- producers --------------------------------------------------------------------
+
+    def enqueue(self, kind: str, payload: dict, key: str = None, group: str = None, delay: float = 0,
+                max_attempts: int = JOB_MAX_ATTEMPTS) -> bool:
+        """Queue a job; False if one with the same idempotency key already exists"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO jobs (kind, payload, idempotency_key, job_group, max_attempts, run_at, enqueued_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (kind, json.dumps(payload, default=_encode), key, group, max_attempts, now + delay, now),
+            )
+        if cursor.rowcount:
+            with self._wakeup:
+                self._wakeup.notify()
+        return bool(cursor.rowcount)
+
+    # --- workers ----------------------------------------------------------------------
+
+    def _claim(self):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                job = self._conn.execute(CLAIM, {"now": now}).fetchone()
+                if job is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_until = ? WHERE id = ?",
+                        (now + LEASE_SECONDS, job["id"]),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return job
+
+    def _finish(self, job, error: Exception = None) -> str:
+        now = time.time()
+        attempts = job["attempts"] + 1
+        if error is None:
+            outcome, sql, params = "done", "UPDATE jobs SET status = 'done', finished_at = ?, last_error = NULL WHERE id = ?", (now, job["id"])
+        elif attempts < job["max_attempts"]:
+            delay = min(RETRY_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+            outcome, sql, params = "retry", "UPDATE jobs SET status = 'queued', run_at = ?, last_error = ? WHERE id = ?", (now + delay, repr(error), job["id"])
+        else:
+            outcome, sql, params = "failed", "UPDATE jobs SET status = 'failed', finished_at = ?, last_error = ? WHERE id = ?", (now, repr(error), job["id"])
+        with self._lock:
+            self._conn.execute(sql, params)
+        return outcome
+
+    def run_job(self, job) -> str:
+        handler = _handlers.get(job["kind"])
+        error = None
+        with collect() as m:
+            try:
+                if handler is None:
+                    raise LookupError(f"No handler for job kind {job['kind']!r}")
+                handler(**json.loads(job["payload"]))
+            except Exception as exc:
+                error = exc
+                logger.exception("Job %s (%s) failed, attempt %d", job["id"], job["kind"], job["attempts"] + 1)
+        outcome = self._finish(job, error)
+        registry.observe_job(job["kind"], outcome, time.time() - job["enqueued_at"], m)
+        return outcome
+
+    def run_pending(self) -> int:
+        """Run due jobs in this thread until none are left; returns how many ran"""
+        count = 0
+        while (job := self._claim()) is not None:
+            self.run_job(job)
+            count += 1
+        return count
+
+    def _work(self):
+        while not self._stop.is_set():
+            try:
+                job = self._claim()
+                if job is None:
+                    self._cleanup()
+                    with self._wakeup:
+                        self._wakeup.wait(POLL_INTERVAL)
+                    continue
+                self.run_job(job)
+            except Exception:
+                logger.exception("Job worker error")
+                self._stop.wait(POLL_INTERVAL)
+
+    def _cleanup(self):
+        now = time.time()
+        if now - self._last_cleanup < CLEANUP_INTERVAL:
+            return
+        self._last_cleanup = now
+        with self._lock:
+            self._conn.execute("DELETE FROM jobs WHERE status = 'done' AND finished_at < ?", (now - RETENTION_SECONDS,))
+
+    def start(self):
+        if self._threads:
+            return
+        self._stop.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 10):
+        """Stop taking jobs and wait for the running ones; unfinished jobs stay queued"""
+        self._stop.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    # --- monitoring -------------------------------------------------------------------
+
+    def stats(self) -> dict:
+        now = time.time()
+        with self._lock:
+            depth = dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            oldest = self._conn.execute("SELECT MIN(enqueued_at) FROM jobs WHERE status IN ('queued', 'running')").fetchone()[0]
+            by_kind = self._conn.execute(
+                "SELECT kind, COUNT(*) FROM jobs WHERE status IN ('queued', 'running') GROUP BY kind"
+            ).fetchall()
+        return {
+            "depth": {status: depth.get(status, 0) for status in ("queued", "running", "done", "failed")},
+            "pending_by_kind": dict(by_kind),
+            "oldest_pending_seconds": now - oldest if oldest else 0.0,
+            "workers": len(self._threads),
+        }
+
+    def gauges(self) -> list:
+        stats = self.stats()
+        return [
+            ("job_queue_depth", "Jobs by status", [((("status", s),), n) for s, n in stats["depth"].items()]),
+            ("job_oldest_pending_seconds", "Age of the oldest queued or running job", [((), stats["oldest_pending_seconds"])]),
+        ]
+
+
+job_queue = JobQueue()
+registry.gauges.append(job_queue.gauges)
+
+
+def enqueue(kind: str, payload: dict, key: str = None, group: str = None, delay: float = 0) -> bool:
+    return job_queue.enqueue(kind, payload, key, group, delay)
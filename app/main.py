@@ -1,19 +1,59 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from .routers import articles, comments, likes_shares, sitemap, analytics
+from .config import WARMUP_ON_STARTUP
+from .firebase import configure_io_threads
+from .http_cache import HTTPCacheMiddleware
+from .metrics import MetricsMiddleware
+from .rate_limit import RateLimitMiddleware
+from .counters import start_counter_flusher, stop_counter_flusher
+from .warmup import start_warmup
+from .jobs import job_queue
+from .events import event_hub
+from .pagination import NEXT_PAGE_HEADER
+from .routers import articles, comments, events, likes_shares, sitemap, analytics, metrics
 
 app = FastAPI(title="Blog CMS")
 
+# Innermost, so 429s still get CORS headers; it runs before routing, so a rejected request
+# makes no Firestore calls
+app.add_middleware(RateLimitMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_methods=["*"],
-    allow_headers=["*"]
+    allow_headers=["*"],
+    # Browsers hide other response headers from cross-origin scripts; these carry the next
+    # page cursor, the validator for conditional GETs and the wait after a 429
+    expose_headers=[NEXT_PAGE_HEADER, "ETag", "Retry-After"],
 )
+# Cache-Control and conditional GETs so a CDN can absorb read traffic
+app.add_middleware(HTTPCacheMiddleware)
+# Outermost, so its timings cover the other middleware too
+app.add_middleware(MetricsMiddleware)
+
+
+@app.on_event("startup")
+async def startup():
+    configure_io_threads()
+    start_counter_flusher()
+    job_queue.start()
+    if WARMUP_ON_STARTUP:
+        start_warmup()
+
+
+@app.on_event("shutdown")
+def shutdown():
+    # Let running jobs finish (queued ones wait in the queue file), then write out
+    # buffered counter increments before the worker exits
+    event_hub.close()
+    job_queue.stop()
+    stop_counter_flusher()
 
 
 app.include_router(analytics.router, prefix="/analytics", tags=["analytics"])
 app.include_router(articles.router, prefix="/articles", tags=["articles"])
 app.include_router(comments.router, prefix="/articles", tags=["comments"])
+app.include_router(events.router, prefix="/articles", tags=["events"])
 app.include_router(likes_shares.router, prefix="/articles", tags=["likes_shares"])
-app.include_router(sitemap.router, tags=["sitemap"])
\ No newline at end of file
+app.include_router(sitemap.router, tags=["sitemap"])
+app.include_router(metrics.router, tags=["metrics"])
\ No newline at end of file
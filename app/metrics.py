@@ -0,0 +1,406 @@
+import functools
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from google.cloud.firestore_v1.base_client import BaseClient
+from google.cloud.firestore_v1.base_collection import BaseCollectionReference
+from google.cloud.firestore_v1.base_document import BaseDocumentReference
+from google.cloud.firestore_v1.base_query import BaseQuery
+from google.cloud.firestore_v1.base_batch import BaseBatch
+from google.cloud.firestore_v1.bulk_writer import BulkWriter
+
+# Latency histogram buckets in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Background jobs, from enqueue to completion: seconds to minutes
+JOB_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900)
+# Label for backend calls made outside a request, e.g. by the counter flusher
+BACKGROUND_ROUTE = "-"
+
+
+class RequestMetrics:
+    """What one request spent, by phase. Shared by the threads that serve the request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.seconds = defaultdict(float)   # phase -> seconds
+        self.calls = defaultdict(int)        # (system, method) -> calls
+        self.reads = 0
+        self.writes = 0
+        self.upload_bytes = 0
+        self._lock = threading.Lock()
+
+    def add(self, phase: str, seconds: float, method: str = None, reads: int = 0, writes: int = 0, upload_bytes: int = 0):
+        with self._lock:
+            self.seconds[phase] += seconds
+            if method:
+                self.calls[(phase, method)] += 1
+            self.reads += reads
+            self.writes += writes
+            self.upload_bytes += upload_bytes
+
+    def server_timing(self) -> str:
+        parts = []
+        for phase, seconds in self.seconds.items():
+            calls = sum(n for (system, _), n in self.calls.items() if system == phase)
+            desc = f';desc="{calls} calls"' if calls else ""
+            parts.append(f"{phase};dur={seconds * 1000:.1f}{desc}")
+        parts.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(parts)
+
+
+_current = ContextVar("request_metrics", default=None)
+
+
+class _Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = defaultdict(int)                              # (route, method, status)
+        self.latency = defaultdict(lambda: [0] * (len(BUCKETS) + 1))  # route -> bucket counts, +Inf last
+        self.latency_sum = defaultdict(float)
+        self.backend_calls = defaultdict(int)                         # (route, system, method)
+        self.backend_seconds = defaultdict(float)                     # (route, system)
+        self.reads = defaultdict(int)
+        self.writes = defaultdict(int)
+        self.upload_bytes = defaultdict(int)
+        self.jobs = defaultdict(int)                                      # (kind, outcome)
+        self.job_latency = defaultdict(lambda: [0] * (len(JOB_BUCKETS) + 1))  # kind -> bucket counts
+        self.job_latency_sum = defaultdict(float)
+        self.gauges = []  # callables returning [(name, help, samples)], read at scrape time
+
+    def observe_request(self, route: str, method: str, status: int, elapsed: float, m: RequestMetrics):
+        with self._lock:
+            self.requests[(route, method, status)] += 1
+            _observe(self.latency[route], BUCKETS, elapsed)
+            self.latency_sum[route] += elapsed
+            self._add_backend(route, m)
+
+    def observe_job(self, kind: str, outcome: str, latency: float, m: RequestMetrics):
+        """A job attempt; latency runs from enqueue to the end of the attempt"""
+        with self._lock:
+            self.jobs[(kind, outcome)] += 1
+            if outcome != "retry":
+                _observe(self.job_latency[kind], JOB_BUCKETS, latency)
+                self.job_latency_sum[kind] += latency
+            self._add_backend(f"job:{kind}", m)
+
+    def observe_background(self, m: RequestMetrics):
+        with self._lock:
+            self._add_backend(BACKGROUND_ROUTE, m)
+
+    def _add_backend(self, route: str, m: RequestMetrics):
+        for (system, method), n in m.calls.items():
+            self.backend_calls[(route, system, method)] += n
+        for phase, seconds in m.seconds.items():
+            self.backend_seconds[(route, phase)] += seconds
+        self.reads[route] += m.reads
+        self.writes[route] += m.writes
+        self.upload_bytes[route] += m.upload_bytes
+
+    def render(self) -> str:
+        """Prometheus text exposition format"""
+        lines = []
+        gauges = [g for source in self.gauges for g in source()]
+
+        def family(name, kind, help_text, samples, suffix=""):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+                lines.append(f"{name}{suffix}{{{label_text}}} {value}")
+
+        with self._lock:
+            family("http_requests_total", "counter", "Requests served",
+                   [((("handler", r), ("method", m), ("status", s)), n) for (r, m, s), n in self.requests.items()])
+            family("http_request_duration_seconds", "histogram", "Request latency",
+                   _buckets("handler", self.latency, BUCKETS), "_bucket")
+            lines += [f'http_request_duration_seconds_sum{{handler="{_escape(r)}"}} {s}' for r, s in self.latency_sum.items()]
+            lines += [f'http_request_duration_seconds_count{{handler="{_escape(r)}"}} {sum(c)}' for r, c in self.latency.items()]
+            family("backend_calls_total", "counter", "Firestore and GCS client calls",
+                   [((("handler", r), ("system", s), ("method", m)), n) for (r, s, m), n in self.backend_calls.items()])
+            family("backend_seconds_total", "counter", "Time spent in Firestore/GCS calls and serialisation",
+                   [((("handler", r), ("phase", p)), s) for (r, p), s in self.backend_seconds.items()])
+            family("firestore_documents_read_total", "counter", "Documents read (billed reads)",
+                   [((("handler", r),), n) for r, n in self.reads.items()])
+            family("firestore_documents_written_total", "counter", "Documents written",
+                   [((("handler", r),), n) for r, n in self.writes.items()])
+            family("gcs_upload_bytes_total", "counter", "Bytes uploaded to Cloud Storage",
+                   [((("handler", r),), n) for r, n in self.upload_bytes.items()])
+            family("jobs_total", "counter", "Background job attempts by outcome (done, retry, failed)",
+                   [((("kind", k), ("outcome", o)), n) for (k, o), n in self.jobs.items()])
+            family("job_latency_seconds", "histogram", "Time from enqueue to job completion",
+                   _buckets("kind", self.job_latency, JOB_BUCKETS), "_bucket")
+            lines += [f'job_latency_seconds_sum{{kind="{_escape(k)}"}} {s}' for k, s in self.job_latency_sum.items()]
+            lines += [f'job_latency_seconds_count{{kind="{_escape(k)}"}} {sum(c)}' for k, c in self.job_latency.items()]
+        for name, help_text, samples in gauges:
+            family(name, "gauge", help_text, samples)
+        return "\n".join(lines) + "\n"
+
+
+def _observe(counts: list, buckets: tuple, value: float):
+    for i, bound in enumerate(buckets):
+        if value <= bound:
+            counts[i] += 1
+            return
+    counts[-1] += 1
+
+
+def _buckets(label: str, histograms: dict, buckets: tuple) -> list:
+    """Cumulative bucket samples, +Inf last"""
+    samples = []
+    for key, counts in histograms.items():
+        cumulative = 0
+        for bound, n in zip(buckets + ("+Inf",), counts):
+            cumulative += n
+            samples.append((((label, key), ("le", bound)), cumulative))
+    return samples
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+registry = _Registry()
+
+
+def _record(phase: str, seconds: float, method: str = None, **counts):
+    m = _current.get()
+    if m is not None:
+        m.add(phase, seconds, method, **counts)
+    else:
+        background = RequestMetrics()
+        background.add(phase, seconds, method, **counts)
+        registry.observe_background(background)
+
+
+@contextmanager
+def collect():
+    """Collect the backend calls of work done outside a request, such as a background job"""
+    m = RequestMetrics()
+    token = _current.set(m)
+    try:
+        yield m
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def timed(phase: str):
+    """Attribute a block to a phase of the current request, e.g. with timed("serialize"): ..."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(phase, time.perf_counter() - started)
+
+
+# --- Traced client proxies -------------------------------------------------------------
+
+# Client classes by kind; other implementations (app/fakes.py) declare theirs as _trace_kind
+_KINDS = [
+    (BaseClient, "client"),
+    (BaseCollectionReference, "collection"),
+    (BaseDocumentReference, "document"),
+    (BaseQuery, "query"),
+    (BaseBatch, "batch"),
+    (BulkWriter, "bulk_writer"),
+]
+_DOCUMENT_WRITES = {"set", "create", "update", "delete"}
+_GCS_CALLS = {
+    "upload_from_file", "upload_from_filename", "upload_from_string", "make_public", "delete",
+    "download_as_bytes", "download_to_filename", "exists", "reload", "list_blobs", "get_blob",
+}
+
+
+class Traced:
+    """Proxy that times and counts the client calls that go over the network.
+
+    Builder calls (collection, document, where, order_by, blob, ...) return further proxies;
+    proxies passed back into the client are unwrapped first.
+    """
+
+    __slots__ = ("_target", "_system")
+
+    def __init__(self, target, system: str):
+        object.__setattr__(self, "_target", target)
+        object.__setattr__(self, "_system", system)
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if callable(attr) and not isinstance(attr, type):
+            return functools.partial(_call, self._target, self._system, name, attr)
+        return _wrap(attr, self._system)
+
+    def __setattr__(self, name, value):
+        setattr(self._target, name, value)
+
+    def __len__(self):
+        return len(self._target)
+
+    def __iter__(self):
+        return iter(self._target)
+
+    def __eq__(self, other):
+        return self._target == _unwrap(other)
+
+    def __hash__(self):
+        return hash(self._target)
+
+    def __repr__(self):
+        return f"Traced({self._target!r})"
+
+
+@functools.lru_cache(maxsize=None)
+def _add_gcs_kinds():
+    # google.cloud.storage is only imported once the GCS client is built, not at startup
+    from google.cloud.storage import Blob, Bucket
+    _KINDS.extend([(Bucket, "bucket"), (Blob, "blob")])
+
+
+def traced(target, system: str):
+    # Fakes name their own kinds, so the memory backend never imports google.cloud.storage
+    if system == "gcs" and not hasattr(type(target), "_trace_kind"):
+        _add_gcs_kinds()
+    return Traced(target, system)
+
+
+def _kind(value):
+    kind = getattr(type(value), "_trace_kind", None)
+    if kind is not None:
+        return kind
+    for cls, kind in _KINDS:
+        if isinstance(value, cls):
+            return kind
+    return None
+
+
+def _wrap(value, system: str):
+    if _kind(value) is not None:
+        return Traced(value, system)
+    return value
+
+
+def _unwrap(value):
+    if isinstance(value, Traced):
+        return value._target
+    if isinstance(value, (list, tuple)):
+        return type(value)(_unwrap(v) for v in value)
+    return value
+
+
+def _upload_size(name: str, args, kwargs) -> int:
+    if name == "upload_from_string":
+        return len(args[0]) if args else len(kwargs.get("data", b""))
+    if name == "upload_from_filename":
+        path = args[0] if args else kwargs.get("filename")
+        return os.path.getsize(path) if path and os.path.exists(path) else 0
+    if name == "upload_from_file":
+        return kwargs.get("size") or 0
+    return 0
+
+
+def _call(target, system: str, name: str, method, *args, **kwargs):
+    args = [_unwrap(a) for a in args]
+    kwargs = {k: _unwrap(v) for k, v in kwargs.items()}
+
+    if system == "gcs":
+        if name not in _GCS_CALLS:
+            return _wrap(method(*args, **kwargs), system)
+        started = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            _record(system, time.perf_counter() - started, name, upload_bytes=_upload_size(name, args, kwargs))
+
+    kind = _kind(target)
+    if name in ("stream", "get_all") or (name == "get" and kind in ("query", "collection")):
+        return _traced_reads(system, name, method, args, kwargs)
+    if name == "get" and kind == "document":
+        return _timed_call(system, name, method, args, kwargs, reads=1)
+    if name in _DOCUMENT_WRITES and kind == "document":
+        return _timed_call(system, name, method, args, kwargs, writes=1)
+    if name == "add" and kind == "collection":
+        return _timed_call(system, name, method, args, kwargs, writes=1)
+    if name in _DOCUMENT_WRITES and kind == "bulk_writer":
+        # Queued; the writer sends them from its own threads
+        _record(system, 0.0, writes=1)
+        return method(*args, **kwargs)
+    if name == "commit" and kind == "batch":
+        return _timed_call(system, name, method, args, kwargs, writes=len(target))
+    if name in ("flush", "close") and kind == "bulk_writer":
+        return _timed_call(system, name, method, args, kwargs)
+    return _wrap(method(*args, **kwargs), system)
+
+
+def _timed_call(system, name, method, args, kwargs, **counts):
+    started = time.perf_counter()
+    try:
+        return method(*args, **kwargs)
+    finally:
+        _record(system, time.perf_counter() - started, name, **counts)
+
+
+def _traced_reads(system, name, method, args, kwargs):
+    """Time a streaming read across its iteration and count the documents it returns"""
+    started = time.perf_counter()
+    result = method(*args, **kwargs)
+    elapsed = time.perf_counter() - started
+    if isinstance(result, list):
+        _record(system, elapsed, name, reads=max(len(result), 1))
+        return result
+
+    def iterate():
+        spent = elapsed
+        count = 0
+        iterator = iter(result)
+        try:
+            while True:
+                t = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    spent += time.perf_counter() - t
+                count += 1
+                yield item
+        finally:
+            # An empty query is still billed as one read
+            _record(system, spent, name, reads=max(count, 1))
+    return iterate()
+
+
+# --- Middleware --------------------------------------------------------------------------
+
+class MetricsMiddleware:
+    """Per-request timings and backend call counts, recorded by handler and sent as Server-Timing"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        m = RequestMetrics()
+        token = _current.set(m)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                headers = list(message["headers"]) + [(b"server-timing", m.server_timing().encode())]
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            # Label by handler name: route.path on an included router lacks the router's prefix
+            endpoint = scope.get("endpoint")
+            label = getattr(endpoint, "__name__", None) or "unmatched"
+            registry.observe_request(label, scope["method"], status["code"], time.perf_counter() - m.started, m)
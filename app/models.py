@@ -1,3 +1,4 @@
+import math
 import re
 from pydantic import BaseModel, Field
 from typing import List, Optional
@@ -10,6 +11,59 @@ def generate_slug(title: str) -> str:
     return slug
 
 
+WORDS_PER_MINUTE = 200
+EXCERPT_LENGTH = 200
+
+
+def make_excerpt(content: str, length: int = EXCERPT_LENGTH) -> str:
+    text = " ".join(content.split())
+    if len(text) <= length:
+        return text
+    return text[:length].rsplit(" ", 1)[0] + "…"
+
+
+def reading_time_minutes(content: str) -> int:
+    return max(1, math.ceil(len(content.split()) / WORDS_PER_MINUTE))
+
+
+def new_article_data(
+    slug: str,
+    title: str,
+    content: str,
+    author_id: str,
+    created_at: datetime,
+    thumbnail_url: Optional[str] = None,
+    media_urls: List[str] = None,
+    tags: List[str] = None,
+    meta_title: Optional[str] = None,
+    meta_description: Optional[str] = None,
+    keywords: List[str] = None,
+) -> dict:
+    """Document for a new article, with its derived fields and zeroed counters"""
+    return {
+        "id": slug,
+        "slug": slug,
+        "title": title,
+        "content": content,
+        "author_id": author_id,
+        "thumbnail_url": thumbnail_url,
+        "media_urls": media_urls or [],
+        "tags": tags or [],
+        "meta_title": meta_title or title,
+        "meta_description": meta_description or content[:150],
+        "keywords": keywords or [],
+        "excerpt": make_excerpt(content),
+        "reading_time_minutes": reading_time_minutes(content),
+        "created_at": created_at,
+        "updated_at": created_at,
+        "likes_count": 0,
+        "comments_count": 0,
+        "shares_count": 0,
+        "views": 0,
+        "trending_score": 0.0
+    }
+
+
 class ArticleIn(BaseModel):
     title: str
     content: str
@@ -19,6 +73,21 @@ class ArticleIn(BaseModel):
     keywords: List[str] = []
 
 
+class ImageVariant(BaseModel):
+    url: str
+    width: int
+    height: int
+    format: str
+
+
+class ProcessedImage(BaseModel):
+    source_url: str
+    width: int
+    height: int
+    blurhash: Optional[str] = None
+    variants: List[ImageVariant] = []
+
+
 class ArticleOut(BaseModel):
     id: str
     slug: str
@@ -26,7 +95,13 @@ class ArticleOut(BaseModel):
     content: str
     author_id: str
     thumbnail_url: Optional[str] = None
+    thumbnail_variants: List[ImageVariant] = []
+    thumbnail_blurhash: Optional[str] = None
+    thumbnail_width: Optional[int] = None
+    thumbnail_height: Optional[int] = None
+    social_card_url: Optional[str] = None
     media_urls: List[str] = []
+    media_variants: List[ProcessedImage] = []
     tags: List[str] = []
     created_at: datetime
     updated_at: datetime
@@ -36,6 +111,31 @@ class ArticleOut(BaseModel):
     meta_title: Optional[str] = None
     meta_description: Optional[str] = None
     keywords: List[str] = []
+    excerpt: Optional[str] = None
+    reading_time_minutes: Optional[int] = None
+
+    class Config:
+        json_encoders = {
+            datetime: lambda v: v.isoformat() if hasattr(v, 'isoformat') else str(v)
+        }
+
+
+class ArticleSummary(BaseModel):
+    """Feed/list projection of an article, without the body"""
+    id: str
+    slug: str
+    title: str
+    excerpt: str = ""
+    reading_time_minutes: Optional[int] = None
+    author_id: str
+    thumbnail_url: Optional[str] = None
+    thumbnail_blurhash: Optional[str] = None
+    tags: List[str] = []
+    created_at: datetime
+    updated_at: datetime
+    likes_count: int = 0
+    comments_count: int = 0
+    shares_count: int = 0
 
     class Config:
         json_encoders = {
@@ -43,6 +143,11 @@ class ArticleOut(BaseModel):
         }
 
 
+class ArticleBatchOut(BaseModel):
+    articles: List[ArticleOut] = []
+    missing: List[str] = []
+
+
 class CommentIn(BaseModel):
     text: str
 
@@ -0,0 +1,67 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from fastapi import HTTPException
+from google.cloud import firestore
+
+# Returned on list responses when there is a further page
+NEXT_PAGE_HEADER = "X-Next-Page-Token"
+
+
+def _encode(data: dict) -> str:
+    raw = json.dumps(data, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode(token: str) -> dict:
+    padded = token + "=" * (-len(token) % 4)
+    return json.loads(base64.urlsafe_b64decode(padded.encode()))
+
+
+def encode_cursor(created_at: datetime, doc_id: str) -> str:
+    return _encode({"t": created_at.isoformat(), "id": doc_id})
+
+
+def decode_cursor(token: str):
+    try:
+        data = _decode(token)
+        return datetime.fromisoformat(data["t"]), data["id"]
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid page_token")
+
+
+def encode_score_cursor(score: float, doc_id: str, depth: int = 0) -> str:
+    return _encode({"s": score, "id": doc_id, "d": depth})
+
+
+def decode_score_cursor(token: str) -> tuple:
+    """(score, doc id, postings depth) from a search page token"""
+    try:
+        data = _decode(token)
+        return float(data["s"]), str(data["id"]), int(data.get("d", 0))
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid page_token")
+
+
+def newest_first_page(query, page_size: int, page_token: str = None):
+    """Order by created_at with the document id as tie-breaker and resume after the cursor.
+
+    The cursor carries both values, so no document has to be read to resume.
+    """
+    query = (
+        query.order_by("created_at", direction=firestore.Query.DESCENDING)
+        .order_by("__name__", direction=firestore.Query.DESCENDING)
+    )
+    if page_token:
+        created_at, doc_id = decode_cursor(page_token)
+        query = query.start_after({"created_at": created_at, "__name__": doc_id})
+    return query.limit(page_size)
+
+
+def next_page_token(docs, page_size: int):
+    """Cursor for the page after `docs`, or None when this was the last page"""
+    if len(docs) < page_size:
+        return None
+    last = docs[-1]
+    return encode_cursor(last.get("created_at"), last.id)
@@ -0,0 +1,210 @@
+import logging
+import math
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+
+from .config import (
+    RATE_LIMIT_ENABLED, RATE_LIMIT_LIKES, RATE_LIMIT_SHARES, RATE_LIMIT_COMMENTS,
+    RATE_LIMIT_URL, RATE_LIMIT_KEYS,
+)
+from .firebase import firebase_app
+
+logger = logging.getLogger(__name__)
+
+# Engagement writes, by the last path segment under /articles/{id}/
+LIMITED_PATHS = re.compile(r"^/articles/[^/]+/(like|share|comments)$")
+# Verified tokens (and rejected ones) are remembered so each is checked once, not per request
+TOKEN_CACHE_SIZE = 10000
+TOKEN_CACHE_TTL = 300
+INVALID_TOKEN_TTL = 60
+
+
+def parse_rate(value: str) -> tuple:
+    """"30/60" -> (bucket capacity 30, refill of 0.5 tokens a second)"""
+    count, seconds = value.split("/")
+    return int(count), int(count) / float(seconds)
+
+
+class MemoryBuckets:
+    """Token buckets in this process; least recently used ones are dropped beyond maxsize"""
+
+    blocking = False
+
+    def __init__(self, maxsize: int = 100000):
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()  # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    def take(self, key: str, capacity: int, rate: float) -> tuple:
+        """Take a token if there is one: (allowed, seconds until the next token)"""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                tokens = capacity
+            else:
+                tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+                self._buckets.move_to_end(key)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (1 - tokens) / rate
+
+
+# Same algorithm as MemoryBuckets, atomic in Redis and on the Redis clock
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call("TIME")
+local now = clock[1] + clock[2] / 1000000
+local state = redis.call("HMGET", KEYS[1], "tokens", "at")
+local tokens = capacity
+if state[1] then
+  tokens = math.min(capacity, tonumber(state[1]) + (now - tonumber(state[2])) * rate)
+end
+local allowed = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+  allowed = 1
+end
+redis.call("HSET", KEYS[1], "tokens", tostring(tokens), "at", tostring(now))
+redis.call("EXPIRE", KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisBuckets:
+    """Token buckets shared by every worker. Anything with take() can be passed to RateLimiter."""
+
+    blocking = True
+
+    def __init__(self, client):
+        self._take = client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def take(self, key: str, capacity: int, rate: float) -> tuple:
+        allowed, tokens = self._take(keys=[key], args=[capacity, rate])
+        return bool(allowed), 0.0 if allowed else (1 - float(tokens)) / rate
+
+
+def redis_buckets(url: str) -> RedisBuckets:
+    try:
+        import redis
+    except ImportError:
+        raise RuntimeError("RATE_LIMIT_URL is set but the redis package is not installed")
+    return RedisBuckets(redis.Redis.from_url(url))
+
+
+def _verified_user(authorization: str):
+    """(uid or None, seconds to remember the answer) for an Authorization header"""
+    from .dependencies import verify_firebase_token
+    try:
+        firebase_app.get()
+        decoded = verify_firebase_token(authorization)
+    except Exception:
+        return None, INVALID_TOKEN_TTL
+    return decoded["uid"], max(0, min(TOKEN_CACHE_TTL, decoded.get("exp", 0) - time.time()))
+
+
+class RateLimiter:
+    def __init__(self, store, rules: dict, enabled: bool = True):
+        self.store = store
+        self.rules = rules  # path segment -> (capacity, refill per second)
+        self.enabled = enabled
+        self._tokens = OrderedDict()  # Authorization header -> (uid or None, expires_at)
+        self.allowed = Counter()
+        self.rejected = Counter()
+        self.errors = 0
+
+    async def client_key(self, scope) -> str:
+        authorization = next((v for k, v in scope["headers"] if k == b"authorization"), None)
+        if authorization is not None:
+            uid = await self._user(authorization.decode("latin-1"))
+            if uid is not None:
+                return f"user:{uid}"
+        client = scope.get("client")
+        return f"ip:{client[0] if client else 'unknown'}"
+
+    async def _user(self, authorization: str):
+        cached = self._tokens.get(authorization)
+        if cached is not None and cached[1] > time.monotonic():
+            return cached[0]
+        # Verifying can fetch Google's signing keys, so it runs off the event loop
+        uid, ttl = await run_in_threadpool(_verified_user, authorization)
+        self._tokens[authorization] = (uid, time.monotonic() + ttl)
+        while len(self._tokens) > TOKEN_CACHE_SIZE:
+            self._tokens.popitem(last=False)
+        return uid
+
+    async def check(self, rule: str, scope) -> tuple:
+        """(allowed, seconds until the client may retry) for a request matching rule"""
+        capacity, rate = self.rules[rule]
+        key = f"rl:{rule}:{await self.client_key(scope)}"
+        try:
+            if self.store.blocking:
+                allowed, retry_after = await run_in_threadpool(self.store.take, key, capacity, rate)
+            else:
+                allowed, retry_after = self.store.take(key, capacity, rate)
+        except Exception:
+            # A shared store being down shouldn't take the endpoints down with it
+            self.errors += 1
+            logger.warning("Rate limit store failed; allowing the request", exc_info=True)
+            return True, 0.0
+        (self.allowed if allowed else self.rejected)[rule] += 1
+        return allowed, retry_after
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "rules": {rule: {"requests": capacity, "per_seconds": round(capacity / rate, 3)}
+                      for rule, (capacity, rate) in self.rules.items()},
+            "allowed": dict(self.allowed),
+            "rejected": dict(self.rejected),
+            "store_errors": self.errors,
+            "cached_tokens": len(self._tokens),
+        }
+
+
+class RateLimitMiddleware:
+    """Answers over-limit likes, shares and comments with 429 before they reach a route"""
+
+    def __init__(self, app, limiter: RateLimiter = None):
+        self.app = app
+        self.limiter = limiter or rate_limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not self.limiter.enabled:
+            await self.app(scope, receive, send)
+            return
+        match = LIMITED_PATHS.match(scope["path"])
+        if match is None:
+            await self.app(scope, receive, send)
+            return
+
+        allowed, retry_after = await self.limiter.check(match.group(1), scope)
+        if allowed:
+            await self.app(scope, receive, send)
+            return
+        response = JSONResponse(
+            {"detail": "Too many requests"},
+            status_code=429,
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+        await response(scope, receive, send)
+
+
+rate_limiter = RateLimiter(
+    redis_buckets(RATE_LIMIT_URL) if RATE_LIMIT_URL else MemoryBuckets(RATE_LIMIT_KEYS),
+    {
+        "like": parse_rate(RATE_LIMIT_LIKES),
+        "share": parse_rate(RATE_LIMIT_SHARES),
+        "comments": parse_rate(RATE_LIMIT_COMMENTS),
+    },
+    RATE_LIMIT_ENABLED,
+)
@@ -0,0 +1,313 @@
+"""Related articles from an in-memory TF-IDF index.
+
+Each article is a sparse vector of its title/body terms (weighted as for search) plus its
+exact tags and keywords. Vectors are IDF-weighted and L2-normalised into one sparse matrix,
+so the articles related to one are a sparse matrix-vector product and a partial sort.
+
+Writes in this process update the index immediately: new and changed articles go to a
+small pending set that is scored alongside the matrix and folded into it every
+COMPACT_AFTER changes. Each worker rebuilds from Firestore every REFRESH_INTERVAL seconds,
+in the background, to pick up other workers' writes.
+"""
+import logging
+import threading
+import time
+import numpy as np
+from scipy import sparse
+
+from .firebase import db, ARTICLES_COLLECTION
+from .search import term_scores, INDEX_FIELDS
+
+logger = logging.getLogger(__name__)
+
+TAG_WEIGHT = 3.0
+KEYWORD_WEIGHT = 2.0
+# Bounds the columns read per lookup; the heaviest features decide relatedness anyway
+MAX_QUERY_FEATURES = 40
+COMPACT_AFTER = 500
+REFRESH_INTERVAL = 3600
+
+
+def article_features(data: dict) -> dict:
+    """Feature -> weight: search term scores plus one feature per tag and keyword"""
+    features = dict(term_scores(data))
+    for tag in data.get("tags") or []:
+        if tag.strip():
+            features[f"tag:{tag.strip().lower()}"] = TAG_WEIGHT
+    for keyword in data.get("keywords") or []:
+        if keyword.strip():
+            features[f"kw:{keyword.strip().lower()}"] = KEYWORD_WEIGHT
+    return features
+
+
+def _normalise_rows(matrix):
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return sparse.diags(1.0 / norms) @ matrix
+
+
+def _idf_weights(df, live: int):
+    return (np.log((1 + live) / (1 + df)) + 1).astype(np.float32)
+
+
+def _build(items) -> dict:
+    """Index state for (slug, article data) pairs, built without touching a live index"""
+    vocab = {}
+    slugs, indptr, columns, weights = [], [0], [], []
+    for slug, data in items:
+        features = article_features(data)
+        # New features get the next column
+        columns.append(np.array([vocab.setdefault(feature, len(vocab)) for feature in features], dtype=np.int32))
+        weights.append(np.array(list(features.values()), dtype=np.float32))
+        slugs.append(slug)
+        indptr.append(indptr[-1] + len(features))
+    columns = np.concatenate(columns) if columns else np.zeros(0, dtype=np.int32)
+    weights = np.concatenate(weights) if weights else np.zeros(0, dtype=np.float32)
+    df = np.zeros(max(1024, len(vocab)), dtype=np.int64)
+    np.add.at(df, columns, 1)
+    tf = sparse.csr_matrix((weights, columns, np.asarray(indptr)), shape=(len(slugs), len(vocab)))
+    matrix = _normalise_rows(tf @ sparse.diags(_idf_weights(df[:len(vocab)], len(slugs)))).tocsc()
+    return {"vocab": vocab, "df": df, "slugs": slugs, "tf": tf, "matrix": matrix}
+
+
+class RelatedIndex:
+    def __init__(self, compact_after: int = COMPACT_AFTER, refresh_interval: float = REFRESH_INTERVAL):
+        self.compact_after = compact_after
+        self.refresh_interval = refresh_interval
+        self._lock = threading.RLock()
+        # Held by the one caller that builds a cold index; updates and lookups don't wait on it
+        self._build_lock = threading.Lock()
+        self._vocab = {}                          # feature -> column
+        self._df = np.zeros(1024, dtype=np.int64)  # column -> live articles with the feature
+        self._slugs = []                          # matrix row -> slug
+        self._rows = {}                           # slug -> live matrix row
+        self._live = np.zeros(0, dtype=bool)
+        self._tf = sparse.csr_matrix((0, 0), dtype=np.float32)      # raw feature weights
+        self._matrix = sparse.csc_matrix((0, 0), dtype=np.float32)  # normalised tf-idf
+        self._pending = {}                        # slug -> (columns, weights), not yet compacted
+        self._pending_matrix = None
+        self._journal = None                      # writes made while a rebuild is streaming
+        self.built_at = None
+        self._refreshing = False
+
+    # --- building ---------------------------------------------------------------------
+
+    @property
+    def ready(self) -> bool:
+        return self.built_at is not None
+
+    def _encode(self, features: dict):
+        vocab = self._vocab
+        # New features get the next column
+        columns = np.array([vocab.setdefault(feature, len(vocab)) for feature in features], dtype=np.int32)
+        weights = np.array(list(features.values()), dtype=np.float32)
+        if len(self._vocab) > len(self._df):
+            self._df = np.concatenate([self._df, np.zeros(max(len(self._df), len(self._vocab) - len(self._df)), dtype=np.int64)])
+        return columns, weights
+
+    def _idf(self, columns):
+        return _idf_weights(self._df[columns], len(self._rows) + len(self._pending))
+
+    def _install(self, state: dict):
+        """Swap in a built state. Call with the lock held."""
+        self._vocab = state["vocab"]
+        self._df = state["df"]
+        self._slugs = state["slugs"]
+        self._tf = state["tf"]
+        self._matrix = state["matrix"]
+        self._rows = {slug: row for row, slug in enumerate(self._slugs)}
+        self._live = np.ones(len(self._slugs), dtype=bool)
+        self._pending = {}
+        self._pending_matrix = None
+        self.built_at = time.monotonic()
+
+    def load(self, items):
+        """Replace the index with (slug, article data) pairs"""
+        state = _build(items)
+        with self._lock:
+            self._install(state)
+
+    def _reweight(self):
+        idf = self._idf(np.arange(self._tf.shape[1]))
+        self._matrix = _normalise_rows(self._tf @ sparse.diags(idf)).tocsc()
+        self._pending_matrix = None
+
+    def compact(self):
+        """Fold pending articles into the matrix and drop removed rows"""
+        with self._lock:
+            keep = np.flatnonzero(self._live)
+            tf = self._tf[keep]
+            tf.resize((tf.shape[0], len(self._vocab)))
+            slugs = [self._slugs[row] for row in keep]
+            if self._pending:
+                indptr = np.cumsum([0] + [len(c) for c, _ in self._pending.values()])
+                pending = sparse.csr_matrix(
+                    (np.concatenate([w for _, w in self._pending.values()]),
+                     np.concatenate([c for c, _ in self._pending.values()]), indptr),
+                    shape=(len(self._pending), len(self._vocab)),
+                )
+                tf = sparse.vstack([tf, pending], format="csr")
+                slugs += list(self._pending)
+            self._tf = tf
+            self._slugs = slugs
+            self._rows = {slug: row for row, slug in enumerate(slugs)}
+            self._live = np.ones(len(slugs), dtype=bool)
+            self._pending = {}
+            self._reweight()
+
+    # --- incremental updates ----------------------------------------------------------
+
+    def upsert(self, slug: str, data: dict):
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append((slug, data))
+            if not self.ready:
+                return
+            self._drop(slug)
+            columns, weights = self._encode(article_features(data))
+            np.add.at(self._df, columns, 1)
+            self._pending[slug] = (columns, weights)
+            self._pending_matrix = None
+            if len(self._pending) >= self.compact_after:
+                self.compact()
+
+    def remove(self, slug: str):
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append((slug, None))
+            if self.ready:
+                self._drop(slug)
+
+    def _drop(self, slug: str):
+        if slug in self._pending:
+            columns, _ = self._pending.pop(slug)
+            np.subtract.at(self._df, columns, 1)
+            self._pending_matrix = None
+        row = self._rows.pop(slug, None)
+        if row is not None:
+            self._live[row] = False
+            start, end = self._tf.indptr[row], self._tf.indptr[row + 1]
+            np.subtract.at(self._df, self._tf.indices[start:end], 1)
+
+    # --- lookups ----------------------------------------------------------------------
+
+    def _query_vector(self, slug: str, data: dict = None):
+        if slug in self._pending:
+            columns, weights = self._pending[slug]
+        elif slug in self._rows:
+            row = self._rows[slug]
+            start, end = self._tf.indptr[row], self._tf.indptr[row + 1]
+            columns, weights = self._tf.indices[start:end], self._tf.data[start:end]
+        elif data is not None:
+            # Not indexed here yet, e.g. written by another worker
+            features = {f: w for f, w in article_features(data).items() if f in self._vocab}
+            columns = np.fromiter((self._vocab[f] for f in features), dtype=np.int32, count=len(features))
+            weights = np.fromiter(features.values(), dtype=np.float32, count=len(features))
+        else:
+            return None
+        weights = weights * self._idf(columns)
+        if len(columns) > MAX_QUERY_FEATURES:
+            top = np.argpartition(-weights, MAX_QUERY_FEATURES)[:MAX_QUERY_FEATURES]
+            columns, weights = columns[top], weights[top]
+        norm = np.linalg.norm(weights)
+        return columns, weights / norm if norm else weights
+
+    def _pending_scores(self):
+        if self._pending_matrix is None:
+            slugs = list(self._pending)
+            if not slugs:
+                self._pending_matrix = ([], None)
+            else:
+                indptr = np.cumsum([0] + [len(self._pending[s][0]) for s in slugs])
+                columns = np.concatenate([self._pending[s][0] for s in slugs])
+                weights = np.concatenate([self._pending[s][1] for s in slugs])
+                tf = sparse.csr_matrix((weights, columns, indptr), shape=(len(slugs), len(self._vocab)))
+                self._pending_matrix = (slugs, _normalise_rows(tf @ sparse.diags(self._idf(np.arange(len(self._vocab))))).tocsc())
+        return self._pending_matrix
+
+    def related(self, slug: str, limit: int = 10, data: dict = None):
+        """[(slug, similarity)] most similar first, or None if the article isn't known.
+
+        data is used for an article this index hasn't seen.
+        """
+        with self._lock:
+            query = self._query_vector(slug, data)
+            if query is None:
+                return None
+            columns, weights = query
+            matrix, slugs, live = self._matrix, self._slugs, self._live
+            own_row = self._rows.get(slug)
+            pending_slugs, pending = self._pending_scores()
+
+        candidates = []
+        in_matrix = columns < matrix.shape[1]
+        if matrix.shape[0]:
+            scores = matrix[:, columns[in_matrix]] @ weights[in_matrix]
+            scores[~live] = 0
+            if own_row is not None:
+                scores[own_row] = 0
+            k = min(limit, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+            candidates += [(slugs[row], float(scores[row])) for row in top if scores[row] > 0]
+        if pending_slugs:
+            in_pending = columns < pending.shape[1]
+            scores = pending[:, columns[in_pending]] @ weights[in_pending]
+            candidates += [(s, float(score)) for s, score in zip(pending_slugs, scores) if score > 0 and s != slug]
+
+        candidates.sort(key=lambda item: (-item[1], item[0]))
+        return candidates[:limit]
+
+    # --- loading from Firestore -------------------------------------------------------
+
+    def rebuild(self):
+        """Rebuild from every article, replaying writes made while streaming and building.
+
+        Only the swap holds the lock, so updates and lookups carry on meanwhile.
+        """
+        with self._lock:
+            self._journal = []
+        started = time.perf_counter()
+        try:
+            query = db.collection(ARTICLES_COLLECTION).select(INDEX_FIELDS)
+            docs = [(doc.id, doc.to_dict()) for doc in query.stream()]
+            state = _build(docs)
+            with self._lock:
+                journal, self._journal = self._journal, None
+                self._install(state)
+                for slug, data in journal:
+                    if data is None:
+                        self.remove(slug)
+                    else:
+                        self.upsert(slug, data)
+        finally:
+            with self._lock:
+                self._journal = None
+                self._refreshing = False
+        logger.info("related index: %d articles in %.1fs", len(docs), time.perf_counter() - started)
+
+    def ensure_ready(self):
+        """Build on first use; once built, refresh in the background when stale"""
+        if not self.ready:
+            with self._build_lock:
+                if not self.ready:
+                    self.rebuild()
+            return
+        if time.monotonic() - self.built_at > self.refresh_interval:
+            with self._lock:
+                if self._refreshing:
+                    return
+                self._refreshing = True
+            threading.Thread(target=self.rebuild, name="related-rebuild", daemon=True).start()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "articles": len(self._rows) + len(self._pending),
+                "pending": len(self._pending),
+                "features": len(self._vocab),
+                "nonzeros": int(self._matrix.nnz),
+                "age_seconds": time.monotonic() - self.built_at if self.ready else None,
+            }
+
+
+related_index = RelatedIndex()
@@ -0,0 +1,153 @@
+import functools
+import json
+import math
+import threading
+import time
+from collections import OrderedDict
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+
+from .config import RESPONSE_CACHE_TTL, RESPONSE_CACHE_SIZE, RESPONSE_CACHE_URL
+
+# Namespaces whose data changes with engagement and article writes
+ANALYTICS_NAMESPACES = ("summary", "trending", "activity")
+
+
+class MemoryBackend:
+    """Per-process store with the subset of the Redis API the cache uses"""
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()  # key -> (value, expires_at or None)
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ex: float = None):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ex if ex else None)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            value, expires_at = self._entries.get(key, (b"0", None))
+            value = str(int(value) + 1).encode()
+            self._entries[key] = (value, expires_at)
+            return int(value)
+
+
+def redis_backend(url: str):
+    """A redis.Redis client; anything with get/set(ex=)/incr can be passed to ResponseCache instead"""
+    try:
+        import redis
+    except ImportError:
+        raise RuntimeError("RESPONSE_CACHE_URL is set but the redis package is not installed")
+    return redis.Redis.from_url(url)
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ResponseCache:
+    """TTL cache of encoded JSON responses with single-flight computation.
+
+    Keys carry a per-namespace generation number; invalidate() bumps it so every entry in
+    the namespace is skipped at once and left to expire. Coalescing is per process: with a
+    shared backend, each worker computes a missing entry at most once.
+    """
+
+    def __init__(self, backend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def _key(self, namespace: str, params: dict) -> str:
+        generation = int(self.backend.get(f"gen:{namespace}") or 0)
+        args = "&".join(f"{k}={params[k]}" for k in sorted(params))
+        return f"resp:{namespace}:{generation}:{args}"
+
+    def get_or_compute(self, namespace: str, params: dict, compute, ttl: float = None) -> bytes:
+        key = self._key(namespace, params)
+        value = self.backend.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            self.coalesced += 1
+            return flight.value
+
+        self.misses += 1
+        try:
+            flight.value = json.dumps(jsonable_encoder(compute())).encode()
+            # Redis only takes whole seconds for ex
+            self.backend.set(key, flight.value, ex=max(1, math.ceil(ttl or self.ttl)))
+            return flight.value
+        except Exception as exc:
+            flight.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def cached(self, namespace: str, ttl: float = None):
+        """Decorator for sync routes; the route's keyword arguments form the cache key"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(**params):
+                body = self.get_or_compute(namespace, params, lambda: func(**params), ttl)
+                return Response(content=body, media_type="application/json")
+            return wrapper
+        return decorator
+
+    def invalidate(self, *namespaces: str):
+        for namespace in namespaces:
+            self.backend.incr(f"gen:{namespace}")
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._flights),
+            "ttl": self.ttl,
+        }
+
+
+response_cache = ResponseCache(
+    redis_backend(RESPONSE_CACHE_URL) if RESPONSE_CACHE_URL else MemoryBackend(RESPONSE_CACHE_SIZE),
+    RESPONSE_CACHE_TTL,
+)
+
+
+def invalidate_analytics():
+    response_cache.invalidate(*ANALYTICS_NAMESPACES)
@@ -1,67 +1,38 @@
 from fastapi import APIRouter, HTTPException, Query
-from datetime import datetime, timedelta, timezone
-from google.cloud import firestore
-from ..firebase import db
+from typing import Optional
+from ..stats import read_stats
+from ..trending import top_trending, decayed_score
+from ..activity import PERIOD_BUCKETS, read_activity
+from ..article_cache import article_cache, get_article_doc
+from ..counters import read_article_counters
+from ..utils import upload_metrics
+from ..response_cache import response_cache
+from ..jobs import job_queue
+from ..events import event_hub
+from ..rate_limit import rate_limiter
 
 router = APIRouter()
 
 
-# Filter by timeframe
-def get_time_range(period: str):
-    now = datetime.now(timezone.utc)
-
-    if period == "day":
-        return now - timedelta(days=1)
-    elif period == "week":
-        return now - timedelta(weeks=1)
-    elif period == "month":
-        return now - timedelta(days=30)
-    elif period == "year":
-        return now - timedelta(days=365)
-    else:
+# Validate the requested timeframe
+def check_period(period: str):
+    if period not in PERIOD_BUCKETS:
         raise HTTPException(400, "Invalid period. Use day, week, month, or year.")
     
 
 @router.get("/summary")
-async def analytics_summary():
-    articles = db.collection("articles").stream()
-
-    total_articles = 0
-    total_views = 0
-    total_likes = 0
-    total_comments = 0
-    total_shares = 0
+@response_cache.cached("summary")
+def analytics_summary():
+    return read_stats()
 
-    for doc in articles:
-        data = doc.to_dict()
-        total_articles += 1
-        total_views += data.get("views", 0)
-        total_likes += data.get("likes_count", 0)
-        total_comments += data.get("comments_count", 0)
-        total_shares += data.get("shares_count", 0)
-
-    return {
-        "total_articles": total_articles,
-        "total_views": total_views,
-        "total_likes": total_likes,
-        "total_comments": total_comments,
-        "total_shares": total_shares,
-    }
 
 @router.get("/trending")
-async def trending_articles(limit: int = 10):
-    articles = db.collection("articles").stream()
-
+@response_cache.cached("trending")
+def trending_articles(limit: int = Query(10, ge=1, le=100)):
     ranking = []
-    for doc in articles:
+    for doc in top_trending(limit):
         data = doc.to_dict()
-
-        score = (
-            data.get("likes_count", 0) * 2 +
-            data.get("comments_count", 0) * 3 +
-            data.get("shares_count", 0) * 4 +
-            data.get("views", 0) * 0.5 
-        )
+        score = decayed_score(data.get("trending_score", 0))
 
         ranking.append({
             "id": doc.id,
@@ -74,31 +45,17 @@ async def trending_articles(limit: int = 10):
             "views": data.get("views", 0),
         })
 
-    ranking.sort(key=lambda x: x["score"], reverse=True)
-
-    return ranking[:limit]
+    return ranking
 
 
 @router.get("/activity")
-async def activity_chart(period: str = Query(..., description="day, week, month, year")):
-    start_time = get_time_range(period)
-    articles = db.collection("articles").stream()
-
-    labels = []
-    values = []
-
-    for doc in articles:
-        data = doc.to_dict()
-        created_at = data.get("created_at")
-
-        if created_at and created_at >= start_time:
-            labels.append(data.get("title"))
-            values.append({
-                "likes": data.get("likes_count", 0),
-                "comments": data.get("comments_count", 0),
-                "shares": data.get("shares_count", 0),
-                "views": data.get("views", 0),
-            })
+@response_cache.cached("activity")
+def activity_chart(
+    period: str = Query(..., description="day, week, month, year"),
+    article_id: Optional[str] = Query(None, description="Limit the series to one article")
+):
+    check_period(period)
+    labels, values = read_activity(period, article_id)
 
     return {
         "period": period,
@@ -107,21 +64,59 @@ async def activity_chart(period: str = Query(..., description="day, week, month,
     }
 
 
+@router.get("/cache")
+async def article_cache_stats():
+    return article_cache.stats()
+
+
+@router.get("/responses")
+async def response_cache_stats():
+    return response_cache.stats()
+
+
+@router.get("/uploads")
+async def upload_stats():
+    return upload_metrics
+
+
+@router.get("/jobs")
+def job_queue_stats():
+    return job_queue.stats()
+
+
+@router.get("/events")
+async def event_stream_stats():
+    return event_hub.stats()
+
+
+@router.get("/rate-limits")
+async def rate_limit_stats():
+    return rate_limiter.stats()
+
+
+@router.get("/related")
+async def related_index_stats():
+    from .articles import related_index
+    return related_index().stats()
+
+
 @router.get("/{slug}/detail")
-async def article_detail_analytics(slug: str):
-    doc = db.collection("articles").document(slug).get()
+def article_detail_analytics(slug: str):
+    doc = get_article_doc(slug)
     if not doc.exists:
         raise HTTPException(404, "Article not found")
     
     data = doc.to_dict()
+    # Exact totals from the counter shards; the article document lags by up to a flush interval
+    counters = read_article_counters(slug)
 
     return {
         "id": slug,
         "title": data.get("title"),
-        "views": data.get("views", 0),
-        "likes": data.get("likes_count", 0),
-        "comments": data.get("comments_count", 0),
-        "shares": data.get("shares_count", 0),
+        "views": counters["views"],
+        "likes": counters["likes_count"],
+        "comments": counters["comments_count"],
+        "shares": counters["shares_count"],
         "created_at": data.get("created_at"),
         "updated_at": data.get("updated_at"),
     }
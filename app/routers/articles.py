@@ -1,63 +1,122 @@
-from fastapi import APIRouter, File, UploadFile, Form, Header, HTTPException, Query
-from typing import List, Optional
+import logging
+from fastapi import APIRouter, File, UploadFile, Form, Header, HTTPException, Query, Request, Response
+from typing import List, Optional, Union
 from datetime import datetime, timezone
-from google.cloud import firestore
 
+from fastapi.encoders import jsonable_encoder
 from fastapi.responses import JSONResponse
-from ..firebase import db
-from ..models import ArticleOut, generate_slug
-from ..utils import upload_file_to_storage
-from google.cloud.firestore_v1 import Increment
-from google.cloud.firestore_v1.base_document import DocumentSnapshot
+from ..firebase import db, ARTICLES_COLLECTION
+from ..models import ArticleOut, ArticleSummary, ArticleBatchOut, generate_slug, make_excerpt, reading_time_minutes, new_article_data
+from ..utils import upload_files_to_storage, upload_bytes_to_storage, images_for_processing, download_from_storage
+from ..images import process_image_in_pool
+from ..stats import increment_stats
+from ..counters import reset_article_counters, delete_article_counters, commit
+from ..engagement import defer_engagement
+from ..sitemaps import sitemap_upsert, sitemap_remove
+from ..response_cache import invalidate_analytics
+from ..article_cache import article_cache, get_article_doc, get_article_docs, article_exists
+from ..search import queue_index_update, search_article_ids
+from ..jobs import register, enqueue
+from ..pagination import NEXT_PAGE_HEADER, newest_first_page, next_page_token, encode_score_cursor, decode_score_cursor
+from ..serialization import article_data, summary_data, json_list_response, article_list_adapter, summary_list_adapter
+from ..http_cache import make_etag, article_version, not_modified, validator_headers, VERSION_FIELDS
+from google.api_core.exceptions import AlreadyExists, NotFound
+from google.cloud.firestore_v1 import ArrayUnion
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-ARTICLES_COLLECTION = "articles"
+MAX_BATCH_IDS = 300
+RELATED_LIMIT = 5
+# Fields ArticleOut needs; batch reads use this as the field mask
+ARTICLE_OUT_FIELDS = [name for name in ArticleOut.model_fields if name != "id"]
+# Field mask for ?view=summary; meta_description is the excerpt fallback for older articles
+SUMMARY_FIELDS = [name for name in ArticleSummary.model_fields if name != "id"] + ["meta_description"]
 
 
-def convert_firestore_timestamp(timestamp):
-    """Convert Firestore timestamp to regular datetime"""
-    if hasattr(timestamp, 'isoformat'):
-        # If it's already a datetime-like object
-        return timestamp
-    elif hasattr(timestamp, 'timestamp'):
-        # Convert to datetime
-        return timestamp
-    return timestamp
+def related_index():
+    # Imported on first use: numpy and scipy would add a fifth of a second to every cold start
+    from ..related import related_index
+    return related_index
 
 
-def prepare_article_data(doc: DocumentSnapshot):
-    """Prepare article data for response, converting timestamps"""
-    data = doc.to_dict()
-    data["id"] = doc.id
-    
-    # Ensure all required fields are present
-    if "author_id" not in data:
-        data["author_id"] = "anonymous"
-    if "comments_count" not in data:
-        data["comments_count"] = 0
-    if "likes_count" not in data:
-        data["likes_count"] = 0
-    if "shares_count" not in data:
-        data["shares_count"] = 0
-    if "media_urls" not in data:
-        data["media_urls"] = []
-    if "tags" not in data:
-        data["tags"] = []
-    if "keywords" not in data:
-        data["keywords"] = []
-    
-    # Convert Firestore timestamps to regular datetime
-    if "created_at" in data:
-        data["created_at"] = convert_firestore_timestamp(data["created_at"])
-    if "updated_at" in data:
-        data["updated_at"] = convert_firestore_timestamp(data["updated_at"])
-    
-    return data
+def list_field_mask(view: str, fields: Optional[str]):
+    """Firestore field mask for the requested projection, or None for full articles"""
+    if fields:
+        requested = list(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+        unknown = set(requested) - set(ARTICLE_OUT_FIELDS + ["id"])
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+        return [f for f in requested if f != "id"]
+    if view == "summary":
+        return SUMMARY_FIELDS
+    return None
+
+
+def process_article_images(article_id: str, images):
+    """Build resized variants for freshly uploaded images and attach them to the article.
+
+    images is [(url, dest_folder)]. Runs as a job: a failed download is retried, an image
+    that can't be decoded is skipped.
+    """
+    updates = {}
+    media_images = []
+    for url, folder in images:
+        is_thumbnail = folder == "thumbnails"
+        data = download_from_storage(url)
+        try:
+            result = process_image_in_pool(data, social_card=is_thumbnail)
+        except Exception:
+            logger.exception("Could not process image %s", url)
+            continue
+
+        variants = [
+            {
+                "url": upload_bytes_to_storage(v["data"], f"{folder}/variants", v["format"], v["content_type"]),
+                "width": v["width"],
+                "height": v["height"],
+                "format": v["format"],
+            }
+            for v in result["variants"]
+        ]
+        if is_thumbnail:
+            updates["thumbnail_variants"] = variants
+            updates["thumbnail_blurhash"] = result["blurhash"]
+            updates["thumbnail_width"] = result["width"]
+            updates["thumbnail_height"] = result["height"]
+            updates["social_card_url"] = upload_bytes_to_storage(result["social_card"], "social", "jpg", "image/jpeg")
+        else:
+            media_images.append({
+                "source_url": url,
+                "width": result["width"],
+                "height": result["height"],
+                "blurhash": result["blurhash"],
+                "variants": variants,
+            })
+
+    if media_images:
+        updates["media_variants"] = ArrayUnion(media_images)
+    if not updates:
+        return
+    try:
+        db.collection(ARTICLES_COLLECTION).document(article_id).update(updates)
+    except NotFound:
+        # Deleted while the images were being processed
+        return
+    article_cache.invalidate(article_id)
+
+
+register("image_variants", process_article_images)
+
+
+def queue_image_variants(article_id: str, images):
+    if images:
+        enqueue("image_variants", {"article_id": article_id, "images": images}, key=f"images:{article_id}:{images[0][0]}")
 
 
 @router.post("/", response_model=ArticleOut)
-async def create_article(
+def create_article(
     title: str = Form(...), 
     content: str = Form(...), 
     tags: Optional[str] = Form(""), 
@@ -69,94 +128,152 @@ async def create_article(
 ):
     # Use "ViKay" as default author_id since we removed auth
     author_id = "ViKay"
+    slug = generate_slug(title)
+    # Checked before uploading anything; create() below catches a concurrent create
+    if article_exists(slug):
+        raise HTTPException(status_code=409, detail="An article with this title already exists")
     tags_list = [t.strip() for t in tags.split(",")] if tags else []
     keywords_list = [k.strip() for k in keywords.split(",")] if keywords else []
 
-    thumbnail_url = upload_file_to_storage(thumbnail, "thumbnails") if thumbnail else None
-    media_urls = [upload_file_to_storage(f, "media") for f in media] if media else []
+    files = [(thumbnail, "thumbnails")] if thumbnail else []
+    files += [(f, "media") for f in media or []]
+    urls = upload_files_to_storage(files)
+    images = images_for_processing(files, urls)
+    thumbnail_url = urls.pop(0) if thumbnail else None
+    media_urls = urls
 
     now = datetime.now(timezone.utc)
-    slug = generate_slug(title)
     doc_ref = db.collection(ARTICLES_COLLECTION).document(slug)
-    article_data = {
-        "id": slug,
-        "slug": slug,
-        "title": title,
-        "content": content,
-        "author_id": author_id,
-        "thumbnail_url": thumbnail_url,
-        "media_urls": media_urls,
-        "tags": tags_list,
-        "meta_title": meta_title or title,
-        "meta_description": meta_description or content[:150],
-        "keywords": keywords_list,
-        "created_at": now,
-        "updated_at": now,
-        "likes_count": 0,
-        "comments_count": 0,
-        "shares_count": 0
-    }
-    doc_ref.set(article_data)
-    doc = doc_ref.get()
-    if doc.exists:
-        data = prepare_article_data(doc)
-        return ArticleOut(**data)
-    else:
-        raise HTTPException(status_code=500, detail="Failed to create article")
+    new_article = new_article_data(
+        slug, title, content, author_id, now,
+        thumbnail_url=thumbnail_url,
+        media_urls=media_urls,
+        tags=tags_list,
+        meta_title=meta_title,
+        meta_description=meta_description,
+        keywords=keywords_list,
+    )
+    batch = db.batch()
+    batch.create(doc_ref, new_article)
+    # Every shard is written, so nothing left behind by an earlier article with this slug counts
+    reset_article_counters(batch, slug)
+    try:
+        batch.commit()
+    except AlreadyExists:
+        raise HTTPException(status_code=409, detail="An article with this title already exists")
+    # Counted only once the article exists; with write-behind this is buffered, not written
+    stats_batch = db.batch()
+    increment_stats(stats_batch, articles=1)
+    commit(stats_batch)
+    sitemap_upsert(slug, now)
+    invalidate_analytics()
+    article_cache.invalidate(slug)
+    related_index().upsert(slug, new_article)
+    # Derived work runs on the job queue; the response is built from what was just written
+    queue_index_update(slug, new_data=new_article, key=f"search:{slug}:{now.isoformat()}")
+    queue_image_variants(slug, images)
+    return ArticleOut(**new_article)
+
+
+@router.get("/batch", response_model=ArticleBatchOut)
+def get_articles_batch(ids: str = Query(..., description="Comma-separated article ids")):
+    slugs = list(dict.fromkeys(s.strip() for s in ids.split(",") if s.strip()))
+    if len(slugs) > MAX_BATCH_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_IDS} ids per request")
+    
+    found = get_article_docs(slugs, field_paths=ARTICLE_OUT_FIELDS)
+    return ArticleBatchOut(
+        articles=[ArticleOut(**article_data(found[s])) for s in slugs if s in found],
+        missing=[s for s in slugs if s not in found],
+    )
 
 
 @router.get("/{slug}", response_model=ArticleOut)
-async def get_article(slug: str):
-    doc = db.collection(ARTICLES_COLLECTION).document(slug).get()
+def get_article(slug: str, request: Request, response: Response):
+    doc = get_article_doc(slug)
     if not doc.exists:
         raise HTTPException(status_code=404, detail="Article not found")
     
-    data = prepare_article_data(doc)
+    # A revalidation is still a view
+    defer_engagement(slug, views=1)
+    
+    data = article_data(doc)
+    etag = make_etag(*article_version(data))
+    cached = not_modified(request, etag, data.get("updated_at"))
+    if cached:
+        return cached
+    response.headers.update(validator_headers(etag, data.get("updated_at")))
     return ArticleOut(**data)
 
 
-@router.get("/", response_model=List[ArticleOut])
+@router.get("/{slug}/related", response_model=List[ArticleSummary])
+def related_articles(slug: str, limit: int = Query(RELATED_LIMIT, ge=1, le=20)):
+    if not article_exists(slug):
+        raise HTTPException(status_code=404, detail="Article not found")
+    index = related_index()
+    index.ensure_ready()
+    ranked = index.related(slug, limit)
+    if ranked is None:
+        ranked = index.related(slug, limit, data=get_article_doc(slug).to_dict() or {})
+
+    # The index may lag deletes made by other workers; those articles are skipped
+    found = get_article_docs([s for s, _ in ranked], field_paths=SUMMARY_FIELDS)
+    return json_list_response(summary_list_adapter, [summary_data(found[s]) for s, _ in ranked if s in found])
+
+
+@router.get("/", response_model=List[Union[ArticleOut, ArticleSummary]])
 def list_articles( 
+    request: Request,
     q: Optional[str] = Query(None), 
     page_size: int = Query(10, ge=1, le=100), 
-    page_token: Optional[str] = Query(None)
+    page_token: Optional[str] = Query(None),
+    view: str = Query("full", pattern="^(full|summary)$", description="summary omits the article body"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return")
 ):
-    # FIXED: Use firestore.Query directly
-    col = db.collection(ARTICLES_COLLECTION).order_by("created_at", direction=firestore.Query.DESCENDING)
+    field_mask = list_field_mask(view, fields)
+    # The ETag needs the edit time and counters even when they aren't returned
+    read_mask = None if field_mask is None else list(dict.fromkeys(field_mask + VERSION_FIELDS))
     
     if q:
-        snapshot = col.limit(100).stream()
-        results = []
-        for s in snapshot:
-            d = s.to_dict()
-            match = q.lower() in d.get("title", "").lower() or any(q.lower() in t.lower() for t in d.get("tags", []))
-
-            if match:
-                data = prepare_article_data(s)
-                results.append(ArticleOut(**data))
-        return results[:page_size]
-    
-    if page_token:
-        try:
-            last_doc = db.collection(ARTICLES_COLLECTION).document(page_token).get()
-            if not last_doc.exists:
-                raise HTTPException(status_code=400, detail="Invalid page_token")
-            query = col.start_after({"created_at": last_doc.to_dict()["created_at"]}).limit(page_size)
-        except Exception:
-            query = col.limit(page_size)
+        # For searches the page token is the (score, slug) of the last result, and how deep
+        # the postings were read to find it
+        after = decode_score_cursor(page_token) if page_token else None
+        ranked, depth = search_article_ids(q, after=after, limit=page_size)
+        slugs = [slug for slug, _ in ranked]
+        token = encode_score_cursor(ranked[-1][1], slugs[-1], depth) if len(ranked) == page_size else None
+        found = get_article_docs(slugs, field_paths=read_mask)
+        docs = [found[s] for s in slugs if s in found]
     else:
-        query = col.limit(page_size)
+        # Opaque (created_at, slug) cursor; the next one is returned in the X-Next-Page-Token header
+        col = db.collection(ARTICLES_COLLECTION)
+        if read_mask is not None:
+            # created_at is needed to build the next cursor
+            col = col.select(list(dict.fromkeys(read_mask + ["created_at"])))
+        query = newest_first_page(col, page_size, page_token)
+        docs = list(query.stream())
+        token = next_page_token(docs, page_size)
     
-    articles = []
-    for doc in query.stream():
-        data = prepare_article_data(doc)
-        articles.append(ArticleOut(**data))
+    # The page's version is its ids, edit times and counters; checked before anything is encoded
+    etag = make_etag(view, fields, token, *(article_version({**doc.to_dict(), "id": doc.id}) for doc in docs))
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
     
-    return articles
+    # Encoded here in one pass; returning a Response skips FastAPI's response_model re-validation
+    headers = validator_headers(etag)
+    if token:
+        headers[NEXT_PAGE_HEADER] = token
+    if fields:
+        requested = set(field_mask) | {"id"}
+        rows = [{"id": doc.id, **{k: v for k, v in doc.to_dict().items() if k in requested}} for doc in docs]
+        return JSONResponse(jsonable_encoder(rows), headers=headers)
+    if view == "summary":
+        return json_list_response(summary_list_adapter, [summary_data(doc) for doc in docs], headers)
+    return json_list_response(article_list_adapter, [article_data(doc) for doc in docs], headers)
 
 
 @router.put("/{article_id}", response_model=ArticleOut)
-async def update_article(
+def update_article(
     article_id: str, 
     title: Optional[str] = Form(None), 
     content: Optional[str] = Form(None), 
@@ -175,23 +292,33 @@ async def update_article(
         updates["title"] = title
     if content: 
         updates["content"] = content
+        updates["excerpt"] = make_excerpt(content)
+        updates["reading_time_minutes"] = reading_time_minutes(content)
     if tags: 
         updates["tags"] = [t.strip() for t in tags.split(",")]
+    files = [(thumbnail, "thumbnails")] if thumbnail else []
+    files += [(f, "media") for f in media or []]
+    urls = upload_files_to_storage(files)
+    images = images_for_processing(files, urls)
     if thumbnail: 
-        updates["thumbnail_url"] = upload_file_to_storage(thumbnail, "thumbnails")
+        updates["thumbnail_url"] = urls.pop(0)
     if media:
         data = doc.to_dict()
         media_list = data.get("media_urls", [])
-        media_list += [upload_file_to_storage(f, "media") for f in media]
+        media_list += urls
         updates["media_urls"] = media_list
     
     updates["updated_at"] = datetime.now(timezone.utc)
     doc_ref.update(updates)
-    
-    updated_doc = doc_ref.get()
-    data = prepare_article_data(updated_doc)
-    
-    return ArticleOut(**data)
+    sitemap_upsert(article_id, updates["updated_at"])
+    invalidate_analytics()
+    article_cache.invalidate(article_id)
+    updated = {**article_data(doc), **updates}
+    if "title" in updates or "content" in updates or "tags" in updates:
+        related_index().upsert(article_id, updated)
+        queue_index_update(article_id, doc.to_dict(), updated, key=f"search:{article_id}:{updates['updated_at'].isoformat()}")
+    queue_image_variants(article_id, images)
+    return ArticleOut(**updated)
 
 
 @router.delete("/{article_id}")
@@ -202,5 +329,23 @@ def delete_article(article_id: str):
     if not doc.exists:
         raise HTTPException(status_code=404, detail="Article not found")
     
-    doc_ref.delete()
+    data = doc.to_dict()
+    batch = db.batch()
+    batch.delete(doc_ref)
+    # The article document lags the shards, so the stats come off at the exact totals
+    counters = delete_article_counters(batch, article_id)
+    increment_stats(
+        batch,
+        articles=-1,
+        views=-counters["views"],
+        likes=-counters["likes_count"],
+        comments=-counters["comments_count"],
+        shares=-counters["shares_count"],
+    )
+    batch.commit()
+    sitemap_remove(article_id)
+    invalidate_analytics()
+    article_cache.invalidate(article_id)
+    queue_index_update(article_id, old_data=data)
+    related_index().remove(article_id)
     return {"ok": True, "deleted": article_id}
\ No newline at end of file
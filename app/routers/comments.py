@@ -1,48 +1,27 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
+from fastapi import APIRouter, HTTPException, Query, Request
+from typing import List, Optional
 from datetime import datetime, timezone
-from google.cloud import firestore
 
 from .articles import ARTICLES_COLLECTION
 from ..firebase import db
 from ..models import CommentIn, CommentOut
-from google.cloud.firestore_v1 import Increment
-from google.cloud.firestore_v1.base_document import DocumentSnapshot
+from ..article_cache import article_exists
+from ..engagement import defer_engagement
+from ..pagination import NEXT_PAGE_HEADER, newest_first_page, next_page_token
+from ..serialization import comment_data, comment_list_adapter, json_list_response
+from ..http_cache import make_etag, not_modified, validator_headers
 
 router = APIRouter()
 COMMENTS_SUBCOL = "comments"
 
 
-def convert_firestore_timestamp(timestamp):
-    """Convert Firestore timestamp to regular datetime"""
-    if hasattr(timestamp, 'isoformat'):
-        # If it's already a datetime-like object
-        return timestamp
-    elif hasattr(timestamp, 'timestamp'):
-        # Convert to datetime
-        return timestamp
-    return timestamp
-
-
-def prepare_comment_data(doc: DocumentSnapshot):
-    """Prepare comment data for response, converting timestamps"""
-    data = doc.to_dict()
-    data["id"] = doc.id
-    
-    # Convert Firestore timestamp to regular datetime
-    if "created_at" in data:
-        data["created_at"] = convert_firestore_timestamp(data["created_at"])
-    
-    return data
-
-
 @router.post("/{article_id}/comments", response_model=CommentOut)
 def post_comment(article_id: str, payload: CommentIn):
     # Removed auth requirement
     user_id = "ViKay"  # Default user ID
-    article_ref = db.collection(ARTICLES_COLLECTION).document(article_id)
-    if not article_ref.get().exists:
+    if not article_exists(article_id):
         raise HTTPException(status_code=404, detail="Article not found")
+    article_ref = db.collection(ARTICLES_COLLECTION).document(article_id)
     
     comment_ref = article_ref.collection(COMMENTS_SUBCOL).document()
     now = datetime.now(timezone.utc)
@@ -51,22 +30,36 @@ def post_comment(article_id: str, payload: CommentIn):
         "text": payload.text, 
         "created_at": now
     }
-    comment_ref.set(comment_data)
-    article_ref.update({"comments_count": Increment(1)})
+    comment_ref.create(comment_data)
+    # Counters, trending and activity follow in the background
+    defer_engagement(article_id, now, comments=1)
     
     return CommentOut(id=comment_ref.id, **comment_data)
 
 
 @router.get("/{article_id}/comments", response_model=List[CommentOut])
-def get_comments(article_id: str, limit: int = 50):
+def get_comments(
+    article_id: str, 
+    request: Request,
+    limit: int = Query(50, ge=1, le=500), 
+    page_token: Optional[str] = Query(None)
+):
     article_ref = db.collection(ARTICLES_COLLECTION).document(article_id)
-    if not article_ref.get().exists:
+    
+    q = newest_first_page(article_ref.collection(COMMENTS_SUBCOL), limit, page_token)
+    docs = list(q.stream())
+    # Only an empty page needs to tell a missing article from one without comments
+    if not docs and not article_exists(article_id):
         raise HTTPException(status_code=404, detail="Article not found")
+    token = next_page_token(docs, limit)
     
-    q = article_ref.collection(COMMENTS_SUBCOL).order_by("created_at", direction=firestore.Query.DESCENDING).limit(limit)
-    comments = []
-    for doc in q.stream():
-        data = prepare_comment_data(doc)
-        comments.append(CommentOut(**data))
+    # Comments aren't edited, so a page is identified by the ids on it
+    etag = make_etag(article_id, token, *(doc.id for doc in docs))
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    headers = validator_headers(etag)
+    if token:
+        headers[NEXT_PAGE_HEADER] = token
     
-    return comments
\ No newline at end of file
+    return json_list_response(comment_list_adapter, [comment_data(doc) for doc in docs], headers)
\ No newline at end of file
@@ -0,0 +1,45 @@
+import asyncio
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+
+from ..config import EVENTS_HEARTBEAT
+from ..article_cache import article_exists
+from ..events import event_hub, Subscriber
+
+router = APIRouter()
+
+# Reconnect after 5s; the first frame also flushes headers through proxies
+RETRY_FRAME = b"retry: 5000\n\n"
+HEARTBEAT_FRAME = b": ping\n\n"
+
+
+async def _stream(subscriber: Subscriber):
+    try:
+        yield RETRY_FRAME
+        while not subscriber.closed:
+            frames = await subscriber.next(EVENTS_HEARTBEAT)
+            yield b"".join(frames) if frames else HEARTBEAT_FRAME
+    finally:
+        event_hub.unsubscribe(subscriber)
+
+
+@router.get("/{article_id}/events")
+async def article_events(article_id: str):
+    """Server-Sent Events with an article's counter changes and new comments, instead of polling.
+
+    A resync event means events were dropped: refetch the article and its first page of comments.
+    """
+    if not await run_in_threadpool(article_exists, article_id):
+        raise HTTPException(status_code=404, detail="Article not found")
+    subscriber = Subscriber(article_id, asyncio.get_running_loop())
+    if not await run_in_threadpool(event_hub.subscribe, subscriber):
+        raise HTTPException(status_code=503, detail="Too many event streams", headers={"Retry-After": "30"})
+    return StreamingResponse(
+        _stream(subscriber),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Also runs if the client left before the stream started
+        background=BackgroundTask(event_hub.unsubscribe, subscriber),
+    )
@@ -1,48 +1,69 @@
 from fastapi import APIRouter, HTTPException
+from datetime import datetime, timezone
 from ..firebase import db
-from google.cloud import firestore
 from .articles import ARTICLES_COLLECTION
-from google.cloud.firestore_v1 import Increment
+from google.api_core.exceptions import AlreadyExists, FailedPrecondition, NotFound
+from ..article_cache import get_article_doc, article_exists
+from ..engagement import commit_engagement, defer_engagement
 
 router = APIRouter()
 LIKES_SUBCOL = "likes"
+# Attempts before giving up on a like another request keeps toggling
+LIKE_ATTEMPTS = 5
 
 @router.post("/{article_id}/like")
 def like_article(article_id: str):
     # Removed auth requirement
     user_id = "ViKay"  # Default user ID
-    article_ref = db.collection(ARTICLES_COLLECTION).document(article_id)
-    if not article_ref.get().exists:
+    if not article_exists(article_id):
         raise HTTPException(status_code=404, detail="Article not found")
-    
+    article_ref = db.collection(ARTICLES_COLLECTION).document(article_id)
     like_ref = article_ref.collection(LIKES_SUBCOL).document(user_id)
-    like_doc = like_ref.get()
     
-    if like_doc.exists:
-        like_ref.delete()
-        article_ref.update({"likes_count": Increment(-1)})
-        return {"liked": False}
-    else:
-        like_ref.set({"user_id": user_id, "created_at": firestore.SERVER_TIMESTAMP})
-        article_ref.update({"likes_count": Increment(1)})
-        return {"liked": True}
+    # The like document's own preconditions decide the toggle: create() fails if it is
+    # already liked, and the delete only applies to the like that was read. Either way the
+    # like and its counter writes land together or not at all, so unlike views and shares
+    # the counters aren't deferred to a job.
+    for _ in range(LIKE_ATTEMPTS):
+        now = datetime.now(timezone.utc)
+        batch = db.batch()
+        batch.create(like_ref, {"user_id": user_id, "created_at": now})
+        try:
+            commit_engagement(batch, article_id, now, likes=1)
+            return {"liked": True}
+        except AlreadyExists:
+            pass
+        
+        like_doc = like_ref.get(field_paths=["created_at"])
+        if not like_doc.exists:
+            # Unliked in the meantime
+            continue
+        batch = db.batch()
+        batch.delete(like_ref, option=db.write_option(last_update_time=like_doc.update_time))
+        try:
+            # Remove the trending points at the weight they were added with
+            commit_engagement(batch, article_id, now, trending_at=like_doc.get("created_at"), likes=-1)
+            return {"liked": False}
+        except (FailedPrecondition, NotFound):
+            continue
+    
+    raise HTTPException(status_code=409, detail="Like is being changed concurrently, try again")
     
 
 @router.post("/{article_id}/share")
 def share_article(article_id: str):
-    article_ref = db.collection(ARTICLES_COLLECTION).document(article_id)
-    article_doc = article_ref.get()
+    article_doc = get_article_doc(article_id)
     
     if not article_doc.exists:
         raise HTTPException(status_code=404, detail="Article not found")
     
     article_data = article_doc.to_dict()
     
-    # Increment share count
-    article_ref.update({"shares_count": Increment(1)})
+    # Increment share count, in the background
+    defer_engagement(article_id, shares=1)
     
-    # Get thumbnail - prefer article thumbnail
-    thumbnail_url = article_data.get("thumbnail_url")
+    # Prefer the precomputed 1200x630 social card, then the article thumbnail
+    thumbnail_url = article_data.get("social_card_url") or article_data.get("thumbnail_url")
     
     # If no thumbnail, look in media_urls
     if not thumbnail_url and article_data.get("media_urls"):
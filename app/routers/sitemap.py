@@ -1,16 +1,41 @@
-from fastapi import APIRouter, Response
+import hashlib
+from email.utils import format_datetime
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
 
-from .articles import ARTICLES_COLLECTION
-from ..firebase import db
+from ..sitemaps import get_sitemap_pages, iter_urlset, iter_sitemap_index
+from ..http_cache import etag_matches
 
 router = APIRouter()
 
+
+def xml_response(request: Request, chunks, etag: str, last_modified: str = None):
+    headers = {"ETag": etag}
+    if last_modified:
+        headers["Last-Modified"] = last_modified
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return StreamingResponse(chunks, media_type="application/xml", headers=headers)
+
+
 @router.get("/sitemap.xml", response_class=Response)
-async def sitemap():
-    articles = db.collection(ARTICLES_COLLECTION).stream()
-    xml = '<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
-    for doc in articles:
-        slug = doc.id
-        xml += f"<url><loc>https://vikayblog.com/articles/{slug}</loc></url>\n"
-    xml += "</urlset>"
-    return Response(content=xml, media_type="application/xml")
+def sitemap(request: Request):
+    pages = get_sitemap_pages()
+    if len(pages) == 1:
+        page = pages[0]
+        return xml_response(request, iter_urlset(page), page.etag, page.last_modified_header)
+
+    # Too many URLs for one file: serve an index pointing at /sitemap-1.xml, /sitemap-2.xml, ...
+    etag = '"%s"' % hashlib.sha1("".join(p.etag for p in pages).encode()).hexdigest()
+    stamps = [p.last_modified for p in pages if p.last_modified]
+    last_modified = format_datetime(max(stamps), usegmt=True) if stamps else None
+    return xml_response(request, iter_sitemap_index(pages), etag, last_modified)
+
+
+@router.get("/sitemap-{number:int}.xml", response_class=Response)
+def sitemap_page(number: int, request: Request):
+    pages = get_sitemap_pages()
+    if number < 1 or number > len(pages):
+        raise HTTPException(status_code=404, detail="Sitemap not found")
+    page = pages[number - 1]
+    return xml_response(request, iter_urlset(page), page.etag, page.last_modified_header)
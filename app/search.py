@@ -0,0 +1,217 @@
+import math
+import re
+from collections import Counter, defaultdict
+from google.cloud import firestore
+from google.cloud.firestore_v1 import Increment
+
+from .firebase import db, ARTICLES_COLLECTION
+from .stats import read_stats
+from .jobs import register, enqueue
+
+SEARCH_TERMS_COLLECTION = "search_terms"
+POSTINGS_SUBCOL = "postings"
+
+# How much a term occurrence counts for, by the field it appears in
+FIELD_WEIGHTS = {
+    "title": 3,
+    "tags": 3,
+    "keywords": 2,
+    "content": 1,
+}
+# Bound the index writes per article: only the most frequent body terms are scored, and
+# only the highest scoring terms overall get a posting (plus a df increment each)
+MAX_CONTENT_TERMS = 100
+MAX_TERMS_PER_ARTICLE = 64
+# Postings first read per term for a multi-term query; doubled while a page can't be filled
+# with results no unread posting could outrank
+MAX_CANDIDATES_PER_TERM = 100
+MAX_QUERY_TERMS = 8
+BATCH_SIZE = 400
+# Article fields the index is built from
+INDEX_FIELDS = ["title", "content", "tags", "keywords"]
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "for", "from", "has", "have",
+    "in", "is", "it", "its", "of", "on", "or", "that", "the", "this", "to", "was", "were",
+    "will", "with",
+}
+
+
+def tokenize(text: str) -> list:
+    return [t for t in re.findall(r"[a-z0-9]+", (text or "").lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+def term_scores(data: dict) -> dict:
+    """Field-weighted, log-scaled term frequencies for an article"""
+    content_terms = Counter(tokenize(data.get("content", ""))).most_common(MAX_CONTENT_TERMS)
+    weighted = Counter({term: count * FIELD_WEIGHTS["content"] for term, count in content_terms})
+    for term in tokenize(data.get("title", "")):
+        weighted[term] += FIELD_WEIGHTS["title"]
+    for field in ("tags", "keywords"):
+        for value in data.get(field, []):
+            for term in tokenize(value):
+                weighted[term] += FIELD_WEIGHTS[field]
+    return {term: 1 + math.log(weight) for term, weight in weighted.most_common(MAX_TERMS_PER_ARTICLE)}
+
+
+def _terms_ref():
+    return db.collection(SEARCH_TERMS_COLLECTION)
+
+
+def search_index_changes(slug: str, old_data: dict = None, new_data: dict = None):
+    """Posting writes for one article, and the change in document frequency per term"""
+    old_scores = term_scores(old_data) if old_data else {}
+    new_scores = term_scores(new_data) if new_data else {}
+
+    writes = []
+    df_deltas = {}
+    for term in old_scores.keys() - new_scores.keys():
+        writes.append(("delete", _terms_ref().document(term).collection(POSTINGS_SUBCOL).document(slug), None))
+        df_deltas[term] = -1
+    for term, score in new_scores.items():
+        if old_scores.get(term) != score:
+            writes.append(("set", _terms_ref().document(term).collection(POSTINGS_SUBCOL).document(slug), {"score": score}))
+        if term not in old_scores:
+            df_deltas[term] = 1
+    return writes, df_deltas
+
+
+def df_writes(df_deltas: dict) -> list:
+    return [("set", _terms_ref().document(term), {"df": Increment(delta)}) for term, delta in df_deltas.items() if delta]
+
+
+def update_search_index(slug: str, old_data: dict = None, new_data: dict = None):
+    """Bring the postings for one article from old_data to new_data.
+
+    Pass old_data=None when indexing a new article and new_data=None when removing one.
+    """
+    writes, df_deltas = search_index_changes(slug, old_data, new_data)
+    writes += df_writes(df_deltas)
+
+    for start in range(0, len(writes), BATCH_SIZE):
+        batch = db.batch()
+        for op, ref, data in writes[start:start + BATCH_SIZE]:
+            if op == "delete":
+                batch.delete(ref)
+            else:
+                batch.set(ref, data, merge=True)
+        batch.commit()
+
+
+register("search_index", update_search_index)
+
+
+def queue_index_update(slug: str, old_data: dict = None, new_data: dict = None, key: str = None):
+    """update_search_index as a background job; jobs for one article run in order"""
+    old_data = {f: old_data.get(f) for f in INDEX_FIELDS} if old_data else None
+    new_data = {f: new_data.get(f) for f in INDEX_FIELDS} if new_data else None
+    if old_data != new_data:
+        enqueue("search_index", {"slug": slug, "old_data": old_data, "new_data": new_data}, key=key, group=slug)
+
+
+def _postings(term_ref, limit: int, after: tuple = None):
+    # The id tie-break follows the score's direction, so no composite index is needed
+    query = term_ref.collection(POSTINGS_SUBCOL).order_by("score", direction=firestore.Query.DESCENDING)
+    if after is not None:
+        query = query.start_after({"score": after[0], "__name__": after[1]})
+    return query.limit(limit).stream()
+
+
+def search_article_ids(q: str, after: tuple = None, limit: int = 10) -> tuple:
+    """Relevance-ranked (slug, score) pairs for a query, resuming after an earlier
+    (score, slug, depth); returns them with the depth to resume multi-term queries at.
+
+    Results are ordered by summed tf-idf, then slug, both descending. Multi-term queries read
+    each term's postings best first and only return results no unread posting could outrank,
+    reading deeper until a page is full or every posting has been read, so every match is
+    reachable. Candidates that could make the page get their missing term scores by point reads.
+    """
+    terms = list(dict.fromkeys(tokenize(q)))[:MAX_QUERY_TERMS]
+    if not terms:
+        return [], 0
+    cursor = tuple(after[:2]) if after else None
+
+    if len(terms) == 1:
+        # One term orders the same with or without its idf, so the postings page directly
+        postings = _postings(_terms_ref().document(terms[0]), limit, cursor)
+        return [(posting.id, posting.get("score")) for posting in postings], 0
+
+    term_refs = [_terms_ref().document(term) for term in terms]
+    doc_freq = {snap.id: snap.to_dict().get("df", 0) for snap in db.get_all(term_refs) if snap.exists}
+    total_articles = max(read_stats()["total_articles"], 1)
+    idf = {term: math.log(1 + total_articles / df) for term, df in doc_freq.items() if df > 0}
+
+    found = defaultdict(dict)  # slug -> term -> posting score, 0 once known to be absent
+    last = {}                  # term with unread postings -> (score, slug) read down to
+    unread = set(idf)
+    depth, target = 0, max(MAX_CANDIDATES_PER_TERM, after[2] if after else 0)
+    while True:
+        # Read on from where each term stopped
+        for term in list(unread):
+            postings = list(_postings(_terms_ref().document(term), target - depth, last.get(term)))
+            for posting in postings:
+                found[posting.id][term] = posting.get("score")
+            if len(postings) < target - depth:
+                unread.discard(term)
+            else:
+                last[term] = (postings[-1].get("score"), postings[-1].id)
+        depth = target
+
+        # Nothing unread scores above this, so results above it are in their final order
+        threshold = sum(last[term][0] * idf[term] for term in unread)
+        # Score bounds from what has been read; only candidates that could still make this
+        # page get their missing scores looked up
+        bounds = {}
+        for slug, scores in found.items():
+            lower = sum(score * idf[term] for term, score in scores.items())
+            if cursor is None or (lower, slug) <= cursor:
+                missing = [term for term in unread if term not in scores]
+                bounds[slug] = (lower, lower + sum(last[term][0] * idf[term] for term in missing), missing)
+        lowers = sorted((lower for lower, _, _ in bounds.values()), reverse=True)
+        cutoff = max(threshold, lowers[limit - 1] if len(lowers) >= limit else 0)
+        lookups = [(slug, term) for slug, (_, upper, missing) in bounds.items() if upper > threshold and upper >= cutoff for term in missing]
+        if lookups:
+            refs = [_terms_ref().document(term).collection(POSTINGS_SUBCOL).document(slug) for slug, term in lookups]
+            # get_all returns snapshots in any order, missing documents included
+            for snap in db.get_all(refs):
+                found[snap.id][snap.reference.parent.parent.id] = snap.get("score") if snap.exists else 0
+
+        settled = []
+        for slug, scores in found.items():
+            if all(term in scores for term in unread):
+                item = (sum(score * idf[term] for term, score in scores.items()), slug)
+                if item[0] > threshold and (cursor is None or item < cursor):
+                    settled.append(item)
+        if len(settled) >= limit or not unread:
+            settled.sort(reverse=True)
+            return [(slug, score) for score, slug in settled[:limit]], depth
+        target *= 2
+
+
+def index_all_articles():
+    """Rebuild the index from the articles: clear it, then write every posting and one df per term.
+
+    Searches miss articles not yet re-indexed while it runs, so run it after bulk imports or off-peak.
+    """
+    writer = db.bulk_writer()
+    for posting in db.collection_group(POSTINGS_SUBCOL).select([]).stream():
+        writer.delete(posting.reference)
+    for term in _terms_ref().select([]).stream():
+        writer.delete(term.reference)
+    writer.flush()
+
+    count = 0
+    doc_freq = Counter()
+    for doc in db.collection(ARTICLES_COLLECTION).select(INDEX_FIELDS).stream():
+        for term, score in term_scores(doc.to_dict()).items():
+            writer.set(_terms_ref().document(term).collection(POSTINGS_SUBCOL).document(doc.id), {"score": score})
+            doc_freq[term] += 1
+        count += 1
+    for term, df in doc_freq.items():
+        writer.set(_terms_ref().document(term), {"df": df})
+    writer.close()
+    return {"indexed": count, "terms": len(doc_freq)}
+
+
+if __name__ == "__main__":
+    print(index_all_articles())
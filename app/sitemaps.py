@@ -0,0 +1,157 @@
+import hashlib
+import logging
+import threading
+import time
+from email.utils import format_datetime
+from xml.sax.saxutils import escape
+
+from .firebase import db, ARTICLES_COLLECTION
+
+logger = logging.getLogger(__name__)
+
+SITE_URL = "https://vikayblog.com"
+MAX_URLS_PER_SITEMAP = 50000
+# Writes in this process update the cached entries in place; each worker re-reads the
+# collection in the background this often to pick up other workers' writes
+SITEMAP_CACHE_TTL = 3600
+# URLs per streamed chunk: a sync iterator costs one thread hop per chunk
+STREAM_CHUNK_URLS = 1000
+
+_lock = threading.Lock()
+# Held by the one request that builds a cold cache; the rest wait for it
+_build_lock = threading.Lock()
+_state = {
+    "entries": None,     # slug -> updated_at for every article, once loaded
+    "pages": None,       # SitemapPages built from entries, until the next change
+    "version": 0,        # bumped on every change to entries
+    "built_at": 0.0,
+    "journal": None,     # changes made while a reload is streaming
+    "refreshing": False,
+}
+
+
+class SitemapPage:
+    def __init__(self, entries):
+        self.entries = entries
+        stamps = [updated_at for _, updated_at in entries if updated_at]
+        self.last_modified = max(stamps) if stamps else None
+        digest = hashlib.sha1()
+        for slug, updated_at in entries:
+            digest.update(f"{slug}|{updated_at}\n".encode())
+        self.etag = f'"{digest.hexdigest()}"'
+
+    @property
+    def last_modified_header(self):
+        return format_datetime(self.last_modified, usegmt=True) if self.last_modified else None
+
+
+def _apply(slug: str, updated_at):
+    """Record a created/updated (or, with updated_at None, deleted) article. Call with _lock held."""
+    if _state["journal"] is not None:
+        _state["journal"][slug] = updated_at
+    entries = _state["entries"]
+    if entries is None:
+        return
+    if updated_at is None:
+        if entries.pop(slug, False) is False:
+            return
+    else:
+        entries[slug] = updated_at
+    _state["pages"] = None
+    _state["version"] += 1
+
+
+def sitemap_upsert(slug: str, updated_at):
+    with _lock:
+        _apply(slug, updated_at)
+
+
+def sitemap_remove(slug: str):
+    with _lock:
+        _apply(slug, None)
+
+
+def invalidate_sitemap():
+    """Forget every entry; the next request reloads the collection"""
+    with _lock:
+        _state["entries"] = None
+        _state["pages"] = None
+        _state["version"] += 1
+
+
+def _reload():
+    with _lock:
+        _state["journal"] = {}
+    try:
+        # Only the document id and updated_at are needed, so skip the article bodies
+        query = db.collection(ARTICLES_COLLECTION).select(["updated_at"])
+        entries = {doc.id: doc.to_dict().get("updated_at") for doc in query.stream()}
+        with _lock:
+            journal, _state["journal"] = _state["journal"], None
+            _state["entries"] = entries
+            for slug, updated_at in journal.items():
+                _apply(slug, updated_at)
+            _state["pages"] = None
+            _state["version"] += 1
+            _state["built_at"] = time.monotonic()
+    finally:
+        with _lock:
+            _state["journal"] = None
+            _state["refreshing"] = False
+
+
+def _refresh_in_background():
+    try:
+        _reload()
+    except Exception:
+        logger.exception("Sitemap refresh failed")
+
+
+def _paginate(entries: dict):
+    items = sorted(entries.items())
+    pages = [SitemapPage(items[i:i + MAX_URLS_PER_SITEMAP]) for i in range(0, len(items), MAX_URLS_PER_SITEMAP)]
+    return pages or [SitemapPage([])]
+
+
+def get_sitemap_pages():
+    """Sitemap pages from the cached entries. Only a cold cache reads the collection inline."""
+    if _state["entries"] is None:
+        with _build_lock:
+            if _state["entries"] is None:
+                _reload()
+
+    with _lock:
+        if time.monotonic() - _state["built_at"] > SITEMAP_CACHE_TTL and not _state["refreshing"]:
+            _state["refreshing"] = True
+            threading.Thread(target=_refresh_in_background, name="sitemap-refresh", daemon=True).start()
+        if _state["pages"] is not None:
+            return _state["pages"]
+        entries, version = dict(_state["entries"] or {}), _state["version"]
+
+    # Sorted and hashed outside the lock so writes don't wait on it
+    pages = _paginate(entries)
+    with _lock:
+        if _state["version"] == version:
+            _state["pages"] = pages
+    return pages
+
+
+def _lastmod(value):
+    return f"<lastmod>{value.isoformat()}</lastmod>" if value else ""
+
+
+def iter_urlset(page: SitemapPage):
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    for start in range(0, len(page.entries), STREAM_CHUNK_URLS):
+        yield "".join(
+            f"<url><loc>{SITE_URL}/articles/{escape(slug)}</loc>{_lastmod(updated_at)}</url>\n"
+            for slug, updated_at in page.entries[start:start + STREAM_CHUNK_URLS]
+        )
+    yield "</urlset>"
+
+
+def iter_sitemap_index(pages):
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    for number, page in enumerate(pages, start=1):
+        yield f"<sitemap><loc>{SITE_URL}/sitemap-{number}.xml</loc>{_lastmod(page.last_modified)}</sitemap>\n"
+    yield "</sitemapindex>"
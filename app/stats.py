@@ -0,0 +1,69 @@
+import random
+
+from .firebase import db, ARTICLES_COLLECTION
+from .counters import increment
+from .response_cache import invalidate_analytics
+
+STATS_COLLECTION = "stats"
+GLOBAL_STATS_DOC = "global"
+STATS_SHARDS_SUBCOL = "shards"
+NUM_STATS_SHARDS = 10
+
+STATS_FIELDS = {
+    "articles": "total_articles",
+    "views": "total_views",
+    "likes": "total_likes",
+    "comments": "total_comments",
+    "shares": "total_shares",
+}
+
+
+def _shards_ref():
+    return db.collection(STATS_COLLECTION).document(GLOBAL_STATS_DOC).collection(STATS_SHARDS_SUBCOL)
+
+
+def increment_stats(batch, **deltas):
+    """Add increments for the global counters to a write batch.
+
+    A random shard is picked so concurrent writers don't contend on one document.
+    """
+    shard_ref = _shards_ref().document(str(random.randrange(NUM_STATS_SHARDS)))
+    increment(batch, shard_ref, {STATS_FIELDS[k]: v for k, v in deltas.items()})
+
+
+def read_stats():
+    """Sum all shards into the global counters (NUM_STATS_SHARDS reads)"""
+    totals = {field: 0 for field in STATS_FIELDS.values()}
+    for shard in _shards_ref().stream():
+        data = shard.to_dict()
+        for field in totals:
+            totals[field] += data.get(field, 0)
+    return totals
+
+
+def rebuild_stats():
+    """Recompute the global counters from the articles collection and reset the shards"""
+    totals = {field: 0 for field in STATS_FIELDS.values()}
+    query = db.collection(ARTICLES_COLLECTION).select(["views", "likes_count", "comments_count", "shares_count"])
+    for doc in query.stream():
+        data = doc.to_dict()
+        totals["total_articles"] += 1
+        totals["total_views"] += data.get("views", 0)
+        totals["total_likes"] += data.get("likes_count", 0)
+        totals["total_comments"] += data.get("comments_count", 0)
+        totals["total_shares"] += data.get("shares_count", 0)
+
+    batch = db.batch()
+    shards = _shards_ref()
+    batch.set(shards.document("0"), totals)
+    for i in range(1, NUM_STATS_SHARDS):
+        batch.set(shards.document(str(i)), {field: 0 for field in totals})
+    batch.commit()
+    invalidate_analytics()
+    return totals
+
+
+if __name__ == "__main__":
+    # python -m app.stats  -> reconcile the aggregates when drift is suspected. A CLI rather
+    # than a route: it reads every article, so it mustn't be something anyone can trigger
+    print(rebuild_stats())
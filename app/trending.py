@@ -0,0 +1,86 @@
+import math
+from datetime import datetime, timezone
+from google.cloud import firestore
+
+from .firebase import db, ARTICLES_COLLECTION
+from .counters import set_article_counter
+from .response_cache import invalidate_analytics
+
+# Engagement weights used for the trending score
+TRENDING_POINTS = {
+    "likes": 2,
+    "comments": 3,
+    "shares": 4,
+    "views": 0.5,
+}
+
+# Scores are stored as points * 2 ** ((t - EPOCH) / HALF_LIFE). Ordering by the stored value
+# is the same as ordering by the decayed score at any moment, so Firestore can sort it with an
+# index and nothing has to be rewritten as time passes. With a 72h half-life the weights stay
+# within float range for ~8 years after the epoch; move the epoch forward and rebuild before then.
+TRENDING_EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+TRENDING_HALF_LIFE_HOURS = 72
+
+
+def _weight(at: datetime = None) -> float:
+    at = at or datetime.now(timezone.utc)
+    hours = (at - TRENDING_EPOCH).total_seconds() / 3600
+    return math.pow(2, hours / TRENDING_HALF_LIFE_HOURS)
+
+
+def trending_points(at: datetime = None, **engagement) -> float:
+    """Amount to add to the article's trending_score, e.g. trending_points(likes=1)"""
+    points = sum(TRENDING_POINTS[k] * v for k, v in engagement.items())
+    return points * _weight(at)
+
+
+def decayed_score(stored_score: float) -> float:
+    """Convert a stored trending_score into the score as of now"""
+    return stored_score / _weight()
+
+
+# Fields the trending endpoint returns; the article body is never read
+TRENDING_FIELDS = ["title", "thumbnail_url", "trending_score", "likes_count", "comments_count", "shares_count", "views"]
+
+
+def top_trending(limit: int):
+    query = (
+        db.collection(ARTICLES_COLLECTION)
+        .select(TRENDING_FIELDS)
+        .order_by("trending_score", direction=firestore.Query.DESCENDING)
+        .limit(limit)
+    )
+    return query.stream()
+
+
+def lifetime_trending_score(data: dict) -> float:
+    """Stored trending_score for an article's lifetime counters, as if earned when it was created"""
+    points = (
+        data.get("likes_count", 0) * TRENDING_POINTS["likes"] +
+        data.get("comments_count", 0) * TRENDING_POINTS["comments"] +
+        data.get("shares_count", 0) * TRENDING_POINTS["shares"] +
+        data.get("views", 0) * TRENDING_POINTS["views"]
+    )
+    return points * _weight(data.get("created_at"))
+
+
+def rebuild_trending():
+    """Recompute every article's trending_score from its lifetime counters.
+
+    Engagement is treated as having happened at the article's creation time.
+    """
+    batch = db.batch()
+    count = 0
+    for doc in db.collection(ARTICLES_COLLECTION).stream():
+        set_article_counter(batch, doc.id, "trending_score", lifetime_trending_score(doc.to_dict()))
+        count += 1
+        if count % 25 == 0:
+            batch.commit()
+            batch = db.batch()
+    batch.commit()
+    invalidate_analytics()
+    return {"rebuilt": count}
+
+
+if __name__ == "__main__":
+    print(rebuild_trending())
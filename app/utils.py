@@ -1,24 +1,147 @@
-import tempfile, os, uuid
-from fastapi import UploadFile
+import os, time, uuid, logging, threading, mimetypes, contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+from urllib.parse import unquote
+from fastapi import HTTPException, UploadFile
+from .config import MAX_UPLOAD_BYTES, UPLOAD_WORKERS, FIREBASE_STORAGE_BUCKET
 from .firebase import gcs_bucket
+from .images import PROCESSABLE_TYPES
 
-def upload_file_to_storage(upload: UploadFile, dest_folder: str = "articles") -> str:
+logger = logging.getLogger(__name__)
+
+# Files above this go up as a chunked resumable upload; must be a multiple of 256 KiB
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+_upload_pool = ThreadPoolExecutor(max_workers=UPLOAD_WORKERS, thread_name_prefix="upload")
+_metrics_lock = threading.Lock()
+upload_metrics = {"files": 0, "bytes": 0, "seconds": 0.0, "failures": 0, "rejected": 0}
+
+
+class _ProgressReader:
+    """File wrapper that logs how far an upload has got"""
+
+    def __init__(self, fileobj, name: str, size: int):
+        self._file = fileobj
+        self._name = name
+        self._size = size
+        self.bytes_read = 0
+
+    def read(self, n=-1):
+        chunk = self._file.read(n)
+        self.bytes_read += len(chunk)
+        logger.debug("upload %s: %d/%d bytes", self._name, self.bytes_read, self._size)
+        return chunk
+
+    def seek(self, *args):
+        return self._file.seek(*args)
+
+    def tell(self):
+        return self._file.tell()
+
+
+def _upload_size(upload: UploadFile) -> int:
+    f = upload.file
+    f.seek(0, os.SEEK_END)
+    size = f.tell()
+    f.seek(0)
+    return size
+
+
+def _check_size(upload: UploadFile) -> int:
+    size = _upload_size(upload)
+    if size > MAX_UPLOAD_BYTES:
+        with _metrics_lock:
+            upload_metrics["rejected"] += 1
+        raise HTTPException(status_code=413, detail=f"{upload.filename} exceeds the {MAX_UPLOAD_BYTES} byte upload limit")
+    return size
+
+
+def upload_file_to_storage(upload: UploadFile, dest_folder: str = "articles", size: Optional[int] = None) -> str:
+    if size is None:
+        size = _check_size(upload)
     ext = os.path.splitext(upload.filename)[1]
     blob_name = f"{dest_folder}/{uuid.uuid4().hex}{ext}"
-    blob = gcs_bucket.blob(blob_name)
-
-    # Save to temp file
-    with tempfile.NamedTemporaryFile(delete=False) as tmp:
-        tmp.write(upload.file.read())
-        tmp.flush()
+    blob = gcs_bucket.blob(blob_name, chunk_size=UPLOAD_CHUNK_SIZE)
 
+    # Stream straight from the request's spooled file; no extra temp-file copy
+    started = time.perf_counter()
     try:
-        blob.upload_from_filename(tmp.name, content_type=upload.content_type)
+        upload.file.seek(0)
+        blob.upload_from_file(_ProgressReader(upload.file, blob_name, size), size=size, content_type=upload.content_type)
         blob.make_public() # Public for mobile client
-        return blob.public_url
-    finally:
-        try:
-            os.unlink(tmp.name)
-        except Exception:
-            pass
+    except Exception:
+        with _metrics_lock:
+            upload_metrics["failures"] += 1
+        raise
+    elapsed = time.perf_counter() - started
+
+    with _metrics_lock:
+        upload_metrics["files"] += 1
+        upload_metrics["bytes"] += size
+        upload_metrics["seconds"] += elapsed
+    logger.info("uploaded %s (%d bytes) in %.3fs", blob_name, size, elapsed)
+    return blob.public_url
+
+
+def upload_path_to_storage(path: str, dest_folder: str) -> str:
+    """Upload a local file, e.g. media referenced by a bulk import"""
+    ext = os.path.splitext(path)[1]
+    blob = gcs_bucket.blob(f"{dest_folder}/{uuid.uuid4().hex}{ext}", chunk_size=UPLOAD_CHUNK_SIZE)
+    started = time.perf_counter()
+    try:
+        blob.upload_from_filename(path, content_type=mimetypes.guess_type(path)[0])
+        blob.make_public()
+    except Exception:
+        with _metrics_lock:
+            upload_metrics["failures"] += 1
+        raise
+    with _metrics_lock:
+        upload_metrics["files"] += 1
+        upload_metrics["bytes"] += os.path.getsize(path)
+        upload_metrics["seconds"] += time.perf_counter() - started
+    return blob.public_url
+
+
+def upload_paths_to_storage(paths: List[Tuple[str, str]]) -> List[str]:
+    """Upload (path, dest_folder) pairs concurrently on the upload pool; URLs come back in input order"""
+    futures = [_upload_pool.submit(contextvars.copy_context().run, upload_path_to_storage, path, folder) for path, folder in paths]
+    return [f.result() for f in futures]
+
+
+def upload_files_to_storage(files: List[Tuple[UploadFile, str]]) -> List[str]:
+    """Upload (file, dest_folder) pairs concurrently on the bounded upload pool.
+
+    Sizes are checked for every file before any upload starts. URLs come back in input order.
+    """
+    sizes = [_check_size(upload) for upload, _ in files]
+    # Run in a copy of the request's context so the uploads count towards its metrics
+    futures = [
+        _upload_pool.submit(contextvars.copy_context().run, upload_file_to_storage, upload, folder, size)
+        for (upload, folder), size in zip(files, sizes)
+    ]
+    return [f.result() for f in futures]
+
+
+def upload_bytes_to_storage(data: bytes, dest_folder: str, ext: str, content_type: str) -> str:
+    blob = gcs_bucket.blob(f"{dest_folder}/{uuid.uuid4().hex}.{ext}")
+    blob.upload_from_string(data, content_type=content_type)
+    blob.make_public()
+    with _metrics_lock:
+        upload_metrics["files"] += 1
+        upload_metrics["bytes"] += len(data)
+    return blob.public_url
+
+
+def images_for_processing(files: List[Tuple[UploadFile, str]], urls: List[str]) -> List[Tuple[str, str]]:
+    """(url, dest_folder) for the uploaded files the image pipeline can resize.
+
+    The image job downloads them again, so the request doesn't hold the bytes and a
+    restarted worker can still process them.
+    """
+    return [(url, folder) for (upload, folder), url in zip(files, urls) if upload.content_type in PROCESSABLE_TYPES]
+
 
+def download_from_storage(url: str) -> bytes:
+    """Bytes of an object uploaded by this module, by its public URL"""
+    blob_name = unquote(url.split(f"/{FIREBASE_STORAGE_BUCKET}/", 1)[1])
+    return gcs_bucket.blob(blob_name).download_as_bytes()
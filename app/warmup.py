@@ -0,0 +1,63 @@
+import logging
+import threading
+import time
+from google.cloud import firestore
+
+from .config import WARMUP_ARTICLES, WARMUP_FULL_READS
+from .firebase import db, ARTICLES_COLLECTION, LazyClient
+from .article_cache import article_cache
+from .sitemaps import get_sitemap_pages
+from .routers.analytics import analytics_summary, trending_articles
+
+logger = logging.getLogger(__name__)
+
+
+def _recent_articles():
+    # The first query also opens the channel and fetches an access token
+    query = db.collection(ARTICLES_COLLECTION).order_by("created_at", direction=firestore.Query.DESCENDING).limit(WARMUP_ARTICLES)
+    for doc in query.stream():
+        article_cache.put(doc.id, doc)
+
+
+def _related_index():
+    from .routers.articles import related_index
+    related_index().ensure_ready()
+
+
+# Run in order; a failing step is logged and the rest still run
+STEPS = (
+    ("firestore_client", lambda: db.get() if isinstance(db, LazyClient) else None),
+    ("recent_articles", _recent_articles),
+    ("analytics_summary", analytics_summary),
+    ("trending", lambda: trending_articles(limit=10)),
+)
+# Each reads every article, in every worker, so they only run when listed in WARMUP_FULL_READS
+FULL_READ_STEPS = (
+    ("sitemap", get_sitemap_pages),
+    ("related_index", _related_index),
+)
+
+
+def warm() -> dict:
+    """Build the Firestore client and fill the caches the first requests would otherwise fill.
+
+    Returns seconds per step. GCS is left to the first upload.
+    """
+    timings = {}
+    steps = STEPS + tuple((name, step) for name, step in FULL_READ_STEPS if name in WARMUP_FULL_READS)
+    for name, step in steps:
+        started = time.perf_counter()
+        try:
+            step()
+        except Exception:
+            logger.warning("warmup step %s failed", name, exc_info=True)
+        timings[name] = time.perf_counter() - started
+    logger.info("warmup finished: %s", {k: round(v, 3) for k, v in timings.items()})
+    return timings
+
+
+def start_warmup():
+    """Warm up in the background so startup completes and requests are served meanwhile"""
+    thread = threading.Thread(target=warm, name="warmup", daemon=True)
+    thread.start()
+    return thread
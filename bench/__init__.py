@@ -0,0 +1 @@
+"""Benchmarks run against the in-memory backend; see bench/routers.py"""
@@ -0,0 +1,55 @@
+"""Counters: many concurrent likes on one hot article, with write-behind on and off.
+
+    python -m bench.counters --requests 500 --concurrency 32
+
+Reports the Firestore writes that reached the hottest documents, which is what the
+one-write-per-second-per-document limit applies to.
+"""
+import argparse
+import asyncio
+
+from .harness import seed, reset, run, client, print_table
+from app import counters, engagement
+from app.firebase import _memory_db
+
+
+async def hot_article(article_id: str, requests: int, concurrency: int, name: str):
+    async with client() as http:
+        # Alternate shares and likes so the like document toggles as well
+        make = lambda i: ("POST", f"/articles/{article_id}/{'like' if i % 2 else 'share'}", {})
+        return await run(http, name, make, requests, concurrency)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.counters")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args(argv)
+
+    rows = []
+    hottest = {}
+    saved = counters.COUNTER_WRITE_BEHIND
+    # Both modules read the setting at import time
+    _memory_db.track_documents = True
+    try:
+        for write_behind in (False, True):
+            reset()
+            article_id = seed(100, comments=0, words=20, index_limit=0)[0]
+            counters.COUNTER_WRITE_BEHIND = engagement.COUNTER_WRITE_BEHIND = write_behind
+            _memory_db.reset_ops()
+            name = f"write_behind={'on' if write_behind else 'off'}"
+            result = asyncio.run(hot_article(article_id, args.requests, args.concurrency, name))
+            counters.flush_counters()
+            rows.append(result.row())
+            hottest[name] = _memory_db.document_writes.most_common(3)
+    finally:
+        counters.COUNTER_WRITE_BEHIND = engagement.COUNTER_WRITE_BEHIND = saved
+        _memory_db.track_documents = False
+
+    print_table(rows)
+    for name, docs in hottest.items():
+        print(f"{name} hottest documents: " + ", ".join(f"{path} ({writes})" for path, writes in docs))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""Event streams: how many subscribers one worker holds, and how fast it fans out to them.
+
+    python -m bench.events --subscribers 100,1000,5000 --comments 20
+
+Starts one uvicorn worker on the memory backend (the ASGI test transport buffers whole
+responses, so streams need a real server), opens the given number of SSE connections to
+it from this process, then posts comments and measures how long each subscriber takes to
+receive them. Server memory and CPU time are read from /proc, so this needs Linux. Client
+and server share the machine, so on few cores delivery latency includes client time.
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from .harness import sizes
+
+# Reads a polling tab makes per refresh: the article and a page of comments
+POLL_READS = 1 + 50
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def rss_mb(pid: int):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+
+
+def cpu_seconds(pid: int) -> float:
+    fields = open(f"/proc/{pid}/stat").read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+class Stream:
+    """A raw SSE connection; lighter than an HTTP client, so one process can hold thousands"""
+
+    def __init__(self):
+        self.connected = asyncio.Event()
+        self.comments = asyncio.Queue()
+        self.task = None
+
+    async def run(self, port: int, article_id: str):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port, limit=1 << 20)
+        writer.write(f"GET /articles/{article_id}/events HTTP/1.1\r\nHost: bench\r\nAccept: text/event-stream\r\n\r\n".encode())
+        await writer.drain()
+        try:
+            while line := await reader.readline():
+                if line.startswith(b"event: counters"):
+                    self.connected.set()
+                elif line.startswith(b"event: comment"):
+                    self.comments.put_nowait(time.perf_counter())
+        finally:
+            writer.close()
+
+
+async def measure(port: int, pid: int, article_ids: list, count: int, comments: int, baseline_rss):
+    streams = [Stream() for _ in range(count)]
+    started = time.perf_counter()
+    for i, stream in enumerate(streams):
+        stream.task = asyncio.create_task(stream.run(port, article_ids[i % len(article_ids)]))
+    await asyncio.wait_for(asyncio.gather(*(s.connected.wait() for s in streams)), timeout=120)
+    connect_s = time.perf_counter() - started
+    await asyncio.sleep(0.5)
+    rss = rss_mb(pid)
+
+    # Comments on the first article reach the streams subscribed to it
+    hot = streams[::len(article_ids)]
+    latencies, fanout = [], []
+    server_cpu = cpu_seconds(pid)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}") as http:
+        for i in range(comments):
+            sent = time.perf_counter()
+            response = await http.post(f"/articles/{article_ids[0]}/comments", json={"text": f"comment {i}"})
+            response.raise_for_status()
+            arrivals = await asyncio.wait_for(asyncio.gather(*(s.comments.get() for s in hot)), timeout=60)
+            latencies += [t - sent for t in arrivals]
+            fanout.append(max(arrivals) - sent)
+
+    server_cpu = cpu_seconds(pid) - server_cpu
+    for stream in streams:
+        stream.task.cancel()
+    await asyncio.gather(*(s.task for s in streams), return_exceptions=True)
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "subscribers": count,
+        "connect_s": round(connect_s, 2),
+        "rss_mb": round(rss, 1) if rss else None,
+        "kb_per_subscriber": round((rss - baseline_rss) * 1024 / count, 1) if rss and baseline_rss else None,
+        "deliver_p50_ms": round(cuts[49] * 1000, 2),
+        "deliver_p99_ms": round(cuts[98] * 1000, 2),
+        "fanout_max_ms": round(max(fanout) * 1000, 2),
+        "server_us_per_delivery": round(server_cpu * 1e6 / len(latencies), 1),
+    }
+
+
+async def wait_until_up(port: int, process):
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}") as http:
+        for _ in range(200):
+            if process.poll() is not None:
+                raise RuntimeError("server exited")
+            try:
+                await http.get("/analytics/events")
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.05)
+    raise RuntimeError("server did not start")
+
+
+async def bench(args, port: int, process) -> list:
+    await wait_until_up(port, process)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}") as http:
+        article_ids = []
+        for i in range(args.articles):
+            response = await http.post("/articles/", data={"title": f"Live {i}", "content": "live " * 50})
+            response.raise_for_status()
+            article_ids.append(response.json()["id"])
+    baseline = rss_mb(process.pid)
+    rows = []
+    for count in args.subscribers:
+        rows.append(await measure(port, process.pid, article_ids, count, args.comments, baseline))
+        # Listeners of the now idle articles are kept for reconnects; the RSS baseline still holds
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.events")
+    parser.add_argument("--subscribers", type=sizes, default=[100, 1000, 5000])
+    parser.add_argument("--articles", type=int, default=1, help="Articles the subscribers are spread over")
+    parser.add_argument("--comments", type=int, default=20, help="Comments posted per level")
+    parser.add_argument("--poll-interval", type=float, default=10.0, help="For the polling comparison, in seconds")
+    args = parser.parse_args(argv)
+
+    port = free_port()
+    env = {**os.environ, "STORAGE_BACKEND": "memory", "WARMUP_ON_STARTUP": "false", "RATE_LIMIT_ENABLED": "false",
+           "EVENTS_MAX_SUBSCRIBERS": str(max(args.subscribers) * 2)}
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    try:
+        rows = asyncio.run(bench(args, port, process))
+    finally:
+        process.terminate()
+        process.wait()
+
+    columns = list(rows[0])
+    widths = {c: max(len(c), *(len(str(r[c])) for r in rows)) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    for r in rows:
+        print("  ".join(str(r[c]).ljust(widths[c]) for c in columns))
+    top = max(args.subscribers)
+    print(f"\npolling instead: {top} tabs every {args.poll_interval:g}s would read "
+          f"{top * POLL_READS * 60 / args.poll_interval:,.0f} documents/minute; streams read one per change")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""Shared benchmark setup: the in-memory backend, seeded data and an ASGI load driver.
+
+Importing this module selects STORAGE_BACKEND=memory before the app is imported, so no
+credentials or network are needed. Requests go through the full middleware stack via
+httpx's ASGI transport; backend operations are read from the fake client's counters. The
+transport doesn't run startup events, so the job workers are started here; their backend
+operations count towards the requests that queued them. Every request comes from one client
+address, so rate limiting is off unless a benchmark turns it on.
+"""
+import asyncio
+import os
+import random
+import statistics
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+
+os.environ["STORAGE_BACKEND"] = "memory"
+
+import httpx
+
+from app.main import app
+from app.firebase import _memory_db, _memory_bucket, ARTICLES_COLLECTION
+from app.models import new_article_data
+from app.counters import init_article_counters, flush_counters
+from app.article_cache import article_cache
+from app.sitemaps import invalidate_sitemap
+from app.response_cache import invalidate_analytics
+from app.search import search_index_changes, df_writes
+from app.stats import increment_stats
+from app.routers.comments import COMMENTS_SUBCOL
+from app.jobs import job_queue
+from app.rate_limit import rate_limiter
+
+rate_limiter.enabled = False
+
+BATCH_SIZE = 500
+# Indexing every article at 100k would dominate seeding; searches only need a large corpus
+SEARCH_INDEX_LIMIT = 5000
+WORDS = (
+    "election market football climate energy health court police school weather transport music "
+    "budget minister river storm vaccine festival harvest bank fuel price strike trade airport "
+    "coast mining cocoa gold youth women village city council parliament ministry hospital"
+).split()
+TAGS = ["politics", "business", "sports", "health", "tech", "culture", "world", "local"]
+
+
+def article_text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def seed(n: int, comments: int = 2, words: int = 120, index_limit: int = SEARCH_INDEX_LIMIT, seed: int = 0) -> list:
+    """Write n articles (and their counter shards and comments) straight into the fake store.
+
+    Returns the article ids, newest first.
+    """
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    ids = []
+    batch = _memory_db.batch()
+    df = Counter()
+    for i in range(n):
+        slug = f"article-{i:06d}"
+        data = new_article_data(
+            slug, f"{article_text(rng, 6).title()} {i}", article_text(rng, words), "ViKay",
+            now - timedelta(minutes=n - i), tags=rng.sample(TAGS, 2),
+        )
+        data.update(views=rng.randrange(1000), likes_count=rng.randrange(100), shares_count=rng.randrange(20))
+        data["trending_score"] = float(data["likes_count"] + data["shares_count"])
+        article_ref = _memory_db.collection(ARTICLES_COLLECTION).document(slug)
+        batch.set(article_ref, data)
+        init_article_counters(batch, slug, data)
+        for c in range(comments):
+            batch.set(article_ref.collection(COMMENTS_SUBCOL).document(f"c{c}"),
+                      {"user_id": "ViKay", "text": article_text(rng, 12), "created_at": now - timedelta(seconds=c)})
+        if i < index_limit:
+            writes, deltas = search_index_changes(slug, None, data)
+            for _, ref, posting in writes:
+                batch.set(ref, posting)
+            df.update(deltas)
+        ids.append(slug)
+        if len(batch) >= BATCH_SIZE:
+            batch.commit()
+            batch = _memory_db.batch()
+    for _, ref, update in df_writes(df):
+        batch.set(ref, update, merge=True)
+    increment_stats(batch, articles=n)
+    batch.commit()
+    _memory_db.reset_ops()
+    return ids[::-1]
+
+
+def reset():
+    """Empty the fake store and every in-process cache"""
+    job_queue.run_pending()
+    flush_counters()
+    _memory_db.clear()
+    _memory_bucket.clear()
+    article_cache.clear()
+    invalidate_sitemap()
+    invalidate_analytics()
+
+
+@dataclass
+class Result:
+    name: str
+    latencies: list = field(default_factory=list)
+    elapsed: float = 0.0
+    errors: Counter = field(default_factory=Counter)
+    ops: Counter = field(default_factory=Counter)
+
+    def percentile(self, p: int) -> float:
+        if len(self.latencies) < 2:
+            return self.latencies[0] if self.latencies else 0.0
+        return statistics.quantiles(self.latencies, n=100, method="inclusive")[p - 1]
+
+    def row(self) -> dict:
+        count = len(self.latencies) or 1
+        return {
+            "name": self.name,
+            "requests": len(self.latencies),
+            "p50_ms": round(self.percentile(50) * 1000, 2),
+            "p95_ms": round(self.percentile(95) * 1000, 2),
+            "p99_ms": round(self.percentile(99) * 1000, 2),
+            "req_per_s": round(len(self.latencies) / self.elapsed, 1) if self.elapsed else 0.0,
+            "rpcs_per_req": round(self.ops["rpcs"] / count, 2),
+            "reads_per_req": round(self.ops["reads"] / count, 2),
+            "writes_per_req": round(self.ops["writes"] / count, 2),
+            "errors": dict(self.errors),
+        }
+
+
+async def run(client: httpx.AsyncClient, name: str, make_request, count: int, concurrency: int = 1, warmup: int = 3) -> Result:
+    """Send count requests, concurrency at a time; make_request(i) returns (method, url, kwargs).
+
+    The first warmup requests (numbered after the measured ones) fill caches and the fake's
+    sorted indexes and aren't counted.
+    """
+    for i in range(count, count + warmup):
+        method, url, kwargs = make_request(i)
+        await client.request(method, url, **kwargs)
+    flush_counters()
+    result = Result(name)
+    queue = iter(range(count))
+    before = Counter(_memory_db.ops)
+
+    async def worker():
+        for i in queue:
+            method, url, kwargs = make_request(i)
+            start = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            result.latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                result.errors[response.status_code] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    result.elapsed = time.perf_counter() - start
+    result.ops = Counter(_memory_db.ops)
+    result.ops.subtract(before)
+    return result
+
+
+def client() -> httpx.AsyncClient:
+    job_queue.start()
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+
+
+def print_table(rows: list):
+    columns = ["name", "requests", "p50_ms", "p95_ms", "p99_ms", "req_per_s", "rpcs_per_req", "reads_per_req", "writes_per_req", "errors"]
+    widths = {c: max(len(c), *(len(str(r[c])) for r in rows)) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    for r in rows:
+        print("  ".join(str(r[c]).ljust(widths[c]) for c in columns))
+
+
+def sizes(value: str) -> list:
+    return [int(s) for s in value.split(",") if s]
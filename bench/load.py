@@ -0,0 +1,52 @@
+"""Load: throughput and tail latency as concurrency grows, with simulated RPC latency.
+
+    python -m bench.load --articles 10000 --rpc-latency-ms 5 --concurrency 1,8,32,64
+
+Every fake Firestore call sleeps for the given latency, so blocking calls hold a worker
+thread the way they would against the real service.
+"""
+import argparse
+import asyncio
+import random
+
+from .harness import seed, reset, run, client, print_table, sizes
+from app.firebase import _memory_db
+from app.counters import flush_counters
+
+
+async def sweep(ids: list, levels: list, requests: int) -> list:
+    rng = random.Random(0)
+    mix = [
+        lambda i: ("GET", f"/articles/{rng.choice(ids)}", {}),
+        lambda i: ("GET", "/articles/?page_size=20&view=summary", {}),
+        lambda i: ("GET", f"/articles/{rng.choice(ids)}/comments", {}),
+        lambda i: ("POST", f"/articles/{rng.choice(ids)}/share", {}),
+    ]
+    rows = []
+    async with client() as http:
+        for level in levels:
+            result = await run(http, f"mixed@c{level}", lambda i: mix[i % len(mix)](i), requests, level)
+            rows.append(result.row())
+            flush_counters()
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.load")
+    parser.add_argument("--articles", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=sizes, default=[1, 8, 32, 64])
+    parser.add_argument("--rpc-latency-ms", type=float, default=5.0)
+    args = parser.parse_args(argv)
+
+    reset()
+    ids = seed(args.articles, comments=2, words=60, index_limit=0)
+    _memory_db.rpc_latency = args.rpc_latency_ms / 1000
+    try:
+        print_table(asyncio.run(sweep(ids, args.concurrency, args.requests)))
+    finally:
+        _memory_db.rpc_latency = 0.0
+
+
+if __name__ == "__main__":
+    main()
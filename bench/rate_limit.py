@@ -0,0 +1,106 @@
+"""Rate limiting: what the limiter adds to a request, and what a rejected request costs.
+
+    python -m bench.rate_limit --calls 50000 --requests 300
+
+The middleware is first timed around an empty ASGI app, so only its own work is measured;
+then likes and shares go through the whole app with the limiter off and on (with limits
+high enough that nothing is rejected), and with a limit every request is over.
+"""
+import argparse
+import asyncio
+import time
+
+from .harness import seed, reset, run, client, print_table
+from app.rate_limit import RateLimiter, RateLimitMiddleware, MemoryBuckets, rate_limiter
+
+UNLIMITED = {rule: (10 ** 9, 10 ** 9) for rule in ("like", "share", "comments")}
+EXHAUSTED = {rule: (1, 1e-9) for rule in ("like", "share", "comments")}
+
+
+async def _empty_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def _receive():
+    return {"type": "http.request", "body": b""}
+
+
+async def _send(message):
+    pass
+
+
+def _scope(method: str, path: str, ip: str = "10.0.0.1", token: str = None) -> dict:
+    headers = [(b"authorization", f"Bearer {token}".encode())] if token else []
+    return {"type": "http", "method": method, "path": path, "headers": headers, "client": (ip, 50000)}
+
+
+async def overhead(calls: int) -> list:
+    """Microseconds per call through the middleware, minus the empty app alone"""
+    limiter = RateLimiter(MemoryBuckets(), dict(UNLIMITED))
+    middleware = RateLimitMiddleware(_empty_app, limiter)
+    # As if this token had been verified already
+    limiter._tokens["Bearer cached-token"] = ("user-1", time.monotonic() + 3600)
+
+    async def timed(app, make_scope) -> float:
+        scopes = [make_scope(i) for i in range(calls)]
+        started = time.perf_counter()
+        for scope in scopes:
+            await app(scope, _receive, _send)
+        return (time.perf_counter() - started) / calls * 1e6
+
+    like = "/articles/a/like"
+    cases = [
+        ("GET, not limited", lambda i: _scope("GET", "/articles/a")),
+        ("like, one client", lambda i: _scope("POST", like)),
+        ("like, cached token", lambda i: _scope("POST", like, token="cached-token")),
+        ("like, 100k clients", lambda i: _scope("POST", like, ip=f"10.{i % 100000 // 65536}.{i % 65536 // 256}.{i % 256}")),
+    ]
+    baseline = await timed(_empty_app, cases[0][1])
+    rows = [{"case": name, "us_per_request": round(await timed(middleware, make_scope) - baseline, 2)}
+            for name, make_scope in cases]
+
+    limiter.rules = dict(EXHAUSTED)
+    rows.append({"case": "like, rejected (429)", "us_per_request": round(await timed(middleware, cases[1][1]) - baseline, 2)})
+    return rows
+
+
+async def through_app(ids: list, requests: int) -> list:
+    rows = []
+    async with client() as http:
+        cases = (("off", False, UNLIMITED), ("on", True, UNLIMITED), ("over_limit", True, EXHAUSTED))
+        for k, (name, enabled, rules) in enumerate(cases):
+            rate_limiter.enabled, rate_limiter.rules = enabled, dict(rules)
+            # Articles no earlier case touched, so a like is never an unlike
+            offset = k * (requests + 3)
+            for action in ("like", "share"):
+                result = await run(http, f"{action}/{name}", lambda i: ("POST", f"/articles/{ids[(offset + i) % len(ids)]}/{action}", {}), requests)
+                rows.append(result.row())
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.rate_limit")
+    parser.add_argument("--calls", type=int, default=50000, help="Calls per middleware case")
+    parser.add_argument("--requests", type=int, default=300, help="Requests per case through the app")
+    parser.add_argument("--articles", type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    rows = asyncio.run(overhead(args.calls))
+    width = max(len(r["case"]) for r in rows)
+    print(f"{'middleware overhead'.ljust(width)}  us_per_request")
+    for r in rows:
+        print(f"{r['case'].ljust(width)}  {r['us_per_request']}")
+    print()
+
+    reset()
+    ids = seed(args.articles, comments=0, words=40, index_limit=0)
+    enabled, rules = rate_limiter.enabled, rate_limiter.rules
+    try:
+        print_table(asyncio.run(through_app(ids, args.requests)))
+    finally:
+        rate_limiter.enabled, rate_limiter.rules = enabled, rules
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Related articles: index build time, lookup latency and incremental updates.
+
+    python -m bench.related --articles 100000 --queries 500
+"""
+import argparse
+import random
+import statistics
+import time
+
+from itertools import accumulate
+
+from .harness import TAGS
+from app.related import RelatedIndex
+
+
+def vocabulary(size: int):
+    """Synthetic words with Zipf-like frequencies, as in real text"""
+    return [f"w{rank}" for rank in range(size)], list(accumulate(1 / (rank + 1) for rank in range(size)))
+
+
+def articles(n: int, words: int, rng: random.Random, vocab):
+    terms, cum_weights = vocab
+    text = lambda k: " ".join(rng.choices(terms, cum_weights=cum_weights, k=k))
+    for i in range(n):
+        yield f"article-{i:06d}", {
+            "title": text(6),
+            "content": text(words),
+            "tags": rng.sample(TAGS, 2),
+            "keywords": text(3).split(),
+        }
+
+
+def percentiles(latencies: list) -> str:
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return f"p50={cuts[49] * 1000:.2f} ms  p95={cuts[94] * 1000:.2f} ms  p99={cuts[98] * 1000:.2f} ms"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.related")
+    parser.add_argument("--articles", type=int, default=100000)
+    parser.add_argument("--words", type=int, default=200, help="Body words per article")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--updates", type=int, default=1000)
+    parser.add_argument("--vocabulary", type=int, default=20000, help="Distinct words in the corpus")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(0)
+    vocab = vocabulary(args.vocabulary)
+    items = list(articles(args.articles, args.words, rng, vocab))
+    index = RelatedIndex()
+    start = time.perf_counter()
+    index.load(items)
+    print(f"build: {args.articles} articles in {time.perf_counter() - start:.2f}s  {index.stats()}")
+
+    slugs = [slug for slug, _ in items]
+    latencies = []
+    for _ in range(args.queries):
+        start = time.perf_counter()
+        index.related(rng.choice(slugs), 10)
+        latencies.append(time.perf_counter() - start)
+    print(f"lookup: {percentiles(latencies)}")
+
+    latencies = []
+    for i, (slug, data) in enumerate(articles(args.updates, args.words, rng, vocab)):
+        start = time.perf_counter()
+        index.upsert(f"new-{slug}" if i % 2 else slug, data)
+        latencies.append(time.perf_counter() - start)
+    print(f"upsert (compacts every {index.compact_after}): {percentiles(latencies)}  max={max(latencies) * 1000:.0f} ms")
+
+    latencies = []
+    for _ in range(args.queries):
+        start = time.perf_counter()
+        index.related(rng.choice(slugs), 10)
+        latencies.append(time.perf_counter() - start)
+    print(f"lookup with {index.stats()['pending']} pending: {percentiles(latencies)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Drive every router through the ASGI app at several dataset sizes.
+
+    python -m bench.routers --sizes 1000,10000,100000 --requests 200 --concurrency 8
+
+Prints latency percentiles, throughput and Firestore operations per request for each
+endpoint. Run before and after a change to catch regressions without touching the network.
+"""
+import argparse
+import asyncio
+import json
+import random
+
+from .harness import seed, reset, run, client, print_table, sizes, WORDS
+from app.counters import flush_counters
+from app.pagination import NEXT_PAGE_HEADER
+
+
+def scenarios(ids: list, first_page_token: str, rng: random.Random) -> list:
+    """(name, make_request) pairs, in the order they run; writes come last"""
+    pick = lambda: rng.choice(ids)
+    return [
+        ("get_article", lambda i: ("GET", f"/articles/{pick()}", {})),
+        ("list_full", lambda i: ("GET", "/articles/?page_size=20", {})),
+        ("list_summary", lambda i: ("GET", "/articles/?page_size=20&view=summary", {})),
+        ("list_page_2", lambda i: ("GET", "/articles/", {"params": {"page_size": 20, "page_token": first_page_token}})),
+        ("search", lambda i: ("GET", "/articles/", {"params": {"q": " ".join(rng.sample(WORDS, 2))}})),
+        ("batch_10", lambda i: ("GET", "/articles/batch", {"params": {"ids": ",".join(rng.sample(ids, min(10, len(ids))))}})),
+        ("get_comments", lambda i: ("GET", f"/articles/{pick()}/comments", {})),
+        ("analytics_summary", lambda i: ("GET", "/analytics/summary", {})),
+        ("analytics_trending", lambda i: ("GET", "/analytics/trending?limit=10", {})),
+        ("analytics_activity", lambda i: ("GET", "/analytics/activity?period=week", {})),
+        ("analytics_detail", lambda i: ("GET", f"/analytics/{pick()}/detail", {})),
+        ("sitemap", lambda i: ("GET", "/sitemap.xml", {})),
+        ("metrics", lambda i: ("GET", "/metrics", {})),
+        ("like", lambda i: ("POST", f"/articles/{pick()}/like", {})),
+        ("share", lambda i: ("POST", f"/articles/{pick()}/share", {})),
+        ("post_comment", lambda i: ("POST", f"/articles/{pick()}/comments", {"json": {"text": "Benchmark comment"}})),
+        ("create", lambda i: ("POST", "/articles/", {"data": {"title": f"Bench new {i}", "content": " ".join(WORDS), "tags": "bench"}})),
+        ("update", lambda i: ("PUT", f"/articles/bench-new-{i}", {"data": {"title": f"Bench new {i} updated"}})),
+        ("delete", lambda i: ("DELETE", f"/articles/bench-new-{i}", {})),
+    ]
+
+
+async def bench_size(n: int, requests: int, concurrency: int, only: set) -> list:
+    reset()
+    ids = seed(n)
+    rng = random.Random(n)
+    rows = []
+    async with client() as http:
+        first_page = await http.get("/articles/?page_size=20")
+        token = first_page.headers.get(NEXT_PAGE_HEADER)
+        for name, make_request in scenarios(ids, token, rng):
+            if only and name not in only:
+                continue
+            result = await run(http, f"{name}@{n}", make_request, requests, concurrency)
+            rows.append(result.row())
+            # Buffered counter writes belong to the scenario that made them, not the next one
+            flush_counters()
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.routers", description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=sizes, default=[1000, 10000], help="Comma-separated article counts")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--only", default="", help="Comma-separated scenario names")
+    parser.add_argument("--json", action="store_true", help="Print one JSON object per row")
+    args = parser.parse_args(argv)
+
+    only = {s for s in args.only.split(",") if s}
+    for n in args.sizes:
+        rows = asyncio.run(bench_size(n, args.requests, args.concurrency, only))
+        if args.json:
+            for row in rows:
+                print(json.dumps(row))
+        else:
+            print(f"\n{n} articles")
+            print_table(rows)
+
+
+if __name__ == "__main__":
+    main()
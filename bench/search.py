@@ -0,0 +1,40 @@
+"""Search: query latency and reads against the inverted index over a large corpus.
+
+    python -m bench.search --articles 50000 --queries 200
+"""
+import argparse
+import random
+import statistics
+import time
+
+from .harness import seed, reset, WORDS
+from app.firebase import _memory_db
+from app.search import search_article_ids
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.search")
+    parser.add_argument("--articles", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--terms", type=int, default=2, help="Words per query")
+    args = parser.parse_args(argv)
+
+    reset()
+    start = time.perf_counter()
+    seed(args.articles, comments=0, words=60, index_limit=args.articles)
+    print(f"indexed {args.articles} articles in {time.perf_counter() - start:.1f}s")
+
+    rng = random.Random(0)
+    latencies = []
+    for _ in range(args.queries):
+        q = " ".join(rng.sample(WORDS, args.terms))
+        start = time.perf_counter()
+        search_article_ids(q, limit=20)
+        latencies.append(time.perf_counter() - start)
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    print(f"p50={cuts[49] * 1000:.2f} ms  p95={cuts[94] * 1000:.2f} ms  p99={cuts[98] * 1000:.2f} ms  "
+          f"reads/query={_memory_db.ops['reads'] / args.queries:.0f}  rpcs/query={_memory_db.ops['rpcs'] / args.queries:.1f}")
+
+
+if __name__ == "__main__":
+    main()
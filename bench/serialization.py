@@ -0,0 +1,47 @@
+"""Serialization: per-article ArticleOut + jsonable_encoder versus one TypeAdapter pass.
+
+    python -m bench.serialization --articles 100
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timezone
+
+from .harness import article_text
+from fastapi.encoders import jsonable_encoder
+from app.models import ArticleOut, new_article_data
+from app.serialization import ARTICLE_DEFAULTS, article_list_adapter
+
+
+def rows(n: int) -> list:
+    rng = random.Random(0)
+    now = datetime.now(timezone.utc)
+    return [{**ARTICLE_DEFAULTS, **new_article_data(f"a-{i}", f"Title {i}", article_text(rng, 400), "ViKay", now)}
+            for i in range(n)]
+
+
+def per_model(data: list) -> bytes:
+    return json.dumps(jsonable_encoder([ArticleOut(**row) for row in data])).encode()
+
+
+def adapter(data: list) -> bytes:
+    return article_list_adapter.dump_json(article_list_adapter.validate_python(data))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.serialization")
+    parser.add_argument("--articles", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args(argv)
+    data = rows(args.articles)
+    for name, fn in (("model+jsonable_encoder", per_model), ("TypeAdapter.dump_json", adapter)):
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            fn(data)
+        per_call = (time.perf_counter() - start) / args.repeat
+        print(f"{name:<24} {per_call * 1000:8.2f} ms per {args.articles} articles")
+
+
+if __name__ == "__main__":
+    main()
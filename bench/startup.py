@@ -0,0 +1,92 @@
+"""Cold start: import time of the app, where it goes, and time to the first response.
+
+    python -m bench.startup --runs 5 [--check] [--budget-ms 1500]
+
+Each measurement runs in a fresh interpreter, like a new uvicorn worker. The import is
+measured with the configured backend (the Firebase clients are lazy, so no network is used);
+time to first response uses the memory backend. --check fails if importing the app pulls in
+modules that should only load on first use, or if the import exceeds the budget.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Should only be imported once an upload, token check or related-articles lookup needs them
+LAZY_MODULES = ("google.cloud.storage", "firebase_admin", "scipy")
+
+IMPORT_SNIPPET = """
+import json, sys, time
+started = time.perf_counter()
+import app.main
+print(json.dumps({"import_ms": (time.perf_counter() - started) * 1000,
+                  "loaded": [m for m in %r if m in sys.modules]}))
+""" % (LAZY_MODULES,)
+
+FIRST_RESPONSE_SNIPPET = """
+import json, time
+started = time.perf_counter()
+from fastapi.testclient import TestClient
+import app.main
+with TestClient(app.main.app) as client:
+    ready = time.perf_counter()
+    client.get("/articles/?page_size=10")
+    first = time.perf_counter()
+print(json.dumps({"startup_ms": (ready - started) * 1000, "first_response_ms": (first - started) * 1000}))
+"""
+
+
+def _run(snippet: str, env: dict, *flags) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, *flags, "-c", snippet], env=env, capture_output=True, text=True, check=True)
+
+
+def import_profile(env: dict, top: int) -> list:
+    """(cumulative ms, module) for the slowest top-level imports under app.main"""
+    stderr = _run("import app.main", env, "-X", "importtime").stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            rows.append((int(cumulative) / 1000, name.rstrip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.startup")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="Slowest imports to list")
+    parser.add_argument("--check", action="store_true")
+    parser.add_argument("--budget-ms", type=float, default=None, help="Fail --check above this median import time")
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ)
+    if not env.get("FIREBASE_SERVICE_ACCOUNT"):
+        env.setdefault("STORAGE_BACKEND", "memory")
+    memory_env = {**env, "STORAGE_BACKEND": "memory"}
+
+    imports = [json.loads(_run(IMPORT_SNIPPET, env).stdout) for _ in range(args.runs)]
+    starts = [json.loads(_run(FIRST_RESPONSE_SNIPPET, memory_env).stdout) for _ in range(args.runs)]
+    import_ms = statistics.median(r["import_ms"] for r in imports)
+    print(f"backend={env.get('STORAGE_BACKEND', 'firebase')}  import app.main: median {import_ms:.0f} ms over {args.runs} runs")
+    print(f"memory backend: startup complete {statistics.median(r['startup_ms'] for r in starts):.0f} ms, "
+          f"first response {statistics.median(r['first_response_ms'] for r in starts):.0f} ms")
+    print("\nslowest imports (cumulative ms):")
+    for ms, name in import_profile(env, args.top):
+        print(f"{ms:9.1f}  {name}")
+
+    if args.check:
+        failures = sorted({m for r in imports for m in r["loaded"]})
+        if failures:
+            print(f"\nFAIL: imported at startup: {', '.join(failures)}")
+        if args.budget_ms is not None and import_ms > args.budget_ms:
+            print(f"\nFAIL: import took {import_ms:.0f} ms, budget {args.budget_ms:.0f} ms")
+            failures.append("budget")
+        sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
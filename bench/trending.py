@@ -0,0 +1,45 @@
+"""Trending: a full collection scan scored in Python versus the indexed top-N query.
+
+    python -m bench.trending --sizes 10000,100000
+"""
+import argparse
+import time
+
+from .harness import seed, reset, sizes
+from app.firebase import db, ARTICLES_COLLECTION
+from app.trending import top_trending, decayed_score
+
+
+def full_scan(limit: int) -> list:
+    """What the endpoint did before trending_score was stored: read and sort every article"""
+    docs = db.collection(ARTICLES_COLLECTION).stream()
+    scored = sorted(docs, key=lambda d: decayed_score(d.get("trending_score") or 0), reverse=True)
+    return scored[:limit]
+
+
+def measure(fn, *args, repeat: int = 5):
+    from app.firebase import _memory_db
+    _memory_db.reset_ops()
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        list(fn(*args))
+        best = min(best, time.perf_counter() - start)
+    return best, _memory_db.ops["reads"] // repeat
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.trending")
+    parser.add_argument("--sizes", type=sizes, default=[10000, 100000])
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args(argv)
+    for n in args.sizes:
+        reset()
+        seed(n, comments=0, words=20, index_limit=0)
+        for name, fn in (("full_scan", full_scan), ("top_trending", top_trending)):
+            seconds, reads = measure(fn, args.limit)
+            print(f"{name:<13} n={n:<7} best={seconds * 1000:9.2f} ms  reads={reads}")
+
+
+if __name__ == "__main__":
+    main()
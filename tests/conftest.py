@@ -0,0 +1,60 @@
+"""Tests run against the in-memory backend: no credentials or network needed.
+
+The test client doesn't run startup events, so no background threads are started: tests
+run queued jobs with job_queue.run_pending() and write buffered counters with flush_counters().
+"""
+import os
+
+os.environ["STORAGE_BACKEND"] = "memory"
+os.environ["WARMUP_ON_STARTUP"] = "false"
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.firebase import _memory_db, _memory_bucket
+from app.counters import flush_counters
+from app.article_cache import article_cache
+from app.sitemaps import invalidate_sitemap
+from app.response_cache import invalidate_analytics
+from app.jobs import job_queue
+from app.rate_limit import rate_limiter
+from app import related
+
+
+def _settle():
+    job_queue.run_pending()
+    flush_counters()
+
+
+@pytest.fixture(autouse=True)
+def clean_store(monkeypatch):
+    _settle()
+    monkeypatch.setattr(related, "related_index", related.RelatedIndex())
+    _memory_db.clear()
+    _memory_bucket.clear()
+    article_cache.clear()
+    invalidate_sitemap()
+    invalidate_analytics()
+    rate_limiter.enabled = False
+    yield
+
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+
+@pytest.fixture
+def settle():
+    """Run queued jobs and write buffered counters, as the background workers would"""
+    return _settle
+
+
+@pytest.fixture
+def create(client):
+    def create(title: str, content: str = "body text", **fields):
+        response = client.post("/articles/", data={"title": title, "content": content, **fields})
+        assert response.status_code == 200, response.text
+        return response.json()["id"]
+    return create
@@ -0,0 +1,121 @@
+from app.firebase import _memory_db, ARTICLES_COLLECTION
+from app.pagination import NEXT_PAGE_HEADER
+
+
+def test_duplicate_title_is_rejected(client, create, settle):
+    create("Same title")
+    response = client.post("/articles/", data={"title": "Same title", "content": "again"})
+    assert response.status_code == 409
+    settle()
+    assert client.get("/analytics/summary").json()["total_articles"] == 1
+
+
+def test_list_pages_follow_the_cursor(client, create):
+    created = [create(f"Paged article {i}") for i in range(25)]
+    seen, token = [], None
+    while True:
+        params = {"page_size": 10, "view": "summary"}
+        if token:
+            params["page_token"] = token
+        response = client.get("/articles/", params=params)
+        assert response.status_code == 200
+        seen += [a["id"] for a in response.json()]
+        token = response.headers.get(NEXT_PAGE_HEADER)
+        if not token:
+            break
+    assert seen == created[::-1]
+
+
+def test_invalid_page_token(client):
+    assert client.get("/articles/", params={"page_token": "not-a-cursor"}).status_code == 400
+    assert client.get("/articles/", params={"q": "news", "page_token": "not-a-cursor"}).status_code == 400
+
+
+def test_article_etag_revalidates(client, create):
+    slug = create("Cached article")
+    etag = client.get(f"/articles/{slug}").headers["etag"]
+    assert client.get(f"/articles/{slug}", headers={"If-None-Match": etag}).status_code == 304
+
+    client.put(f"/articles/{slug}", data={"content": "edited"})
+    response = client.get(f"/articles/{slug}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["content"] == "edited"
+
+
+def test_projected_list_etag_changes_on_edit(client, create):
+    slug = create("Projected article")
+    for params in ({"fields": "title"}, {"view": "summary"}, {}):
+        etag = client.get("/articles/", params=params).headers["etag"]
+        assert client.get("/articles/", params=params, headers={"If-None-Match": etag}).status_code == 304
+
+        client.put(f"/articles/{slug}", data={"content": f"edited for {params}"})
+        response = client.get("/articles/", params=params, headers={"If-None-Match": etag})
+        assert response.status_code == 200, params
+
+
+def test_fields_are_projected(client, create):
+    create("Projected fields")
+    rows = client.get("/articles/", params={"fields": "title"}).json()
+    assert rows == [{"id": "projected-fields", "title": "Projected fields"}]
+    assert client.get("/articles/", params={"fields": "nope"}).status_code == 400
+
+
+def test_recreated_slug_starts_with_zero_counters(client, create, settle):
+    slug = create("Recreated article")
+    client.post(f"/articles/{slug}/like")
+    client.post(f"/articles/{slug}/share")
+    settle()
+    assert client.get(f"/analytics/{slug}/detail").json()["likes"] == 1
+
+    assert client.delete(f"/articles/{slug}").status_code == 200
+    settle()
+    shards = _memory_db.collection(ARTICLES_COLLECTION).document(slug).collection("counter_shards")
+    assert list(shards.stream()) == []
+
+    assert create("Recreated article") == slug
+    settle()
+    detail = client.get(f"/analytics/{slug}/detail").json()
+    assert (detail["likes"], detail["shares"]) == (0, 0)
+    assert client.get(f"/articles/{slug}").json()["likes_count"] == 0
+
+
+def test_sitemap_follows_writes_without_rereading(client, create):
+    create("Sitemap first")
+    assert "sitemap-first" in client.get("/sitemap.xml").text
+
+    slug = create("Sitemap second")
+    client.put(f"/articles/{slug}", data={"content": "edited"})
+    reads = _memory_db.ops["reads"]
+    body = client.get("/sitemap.xml").text
+    assert _memory_db.ops["reads"] == reads
+    assert body.count("<url>") == 2 and slug in body
+
+    client.delete(f"/articles/{slug}")
+    reads = _memory_db.ops["reads"]
+    body = client.get("/sitemap.xml").text
+    assert _memory_db.ops["reads"] == reads
+    assert slug not in body
+
+
+def test_delete_takes_unflushed_engagement_off_the_stats(client, create, settle):
+    slug = create("Engaged article")
+    client.get(f"/articles/{slug}")
+    client.post(f"/articles/{slug}/like")
+    client.post(f"/articles/{slug}/share")
+    client.post(f"/articles/{slug}/comments", json={"text": "first"})
+    # Deleted before any of it is rolled up onto the article document
+    assert client.delete(f"/articles/{slug}").status_code == 200
+    settle()
+    summary = client.get("/analytics/summary").json()
+    assert {k: v for k, v in summary.items() if k.startswith("total_")} == {
+        "total_articles": 0, "total_views": 0, "total_likes": 0, "total_comments": 0, "total_shares": 0,
+    }
+
+
+def test_cross_origin_clients_can_read_the_cursor_and_etag(client, create):
+    for i in range(3):
+        create(f"Cors article {i}")
+    response = client.get("/articles/", params={"page_size": 2}, headers={"Origin": "https://app.example"})
+    exposed = {h.strip().lower() for h in response.headers["access-control-expose-headers"].split(",")}
+    assert {NEXT_PAGE_HEADER.lower(), "etag"} <= exposed
+    assert response.headers[NEXT_PAGE_HEADER]
@@ -0,0 +1,80 @@
+import io
+import json
+
+import pytest
+
+from app import bulk
+from app.counters import read_article_counters
+from app.firebase import _memory_db, ARTICLES_COLLECTION
+from app.stats import read_stats
+
+
+class Interrupted(Exception):
+    pass
+
+
+def _write_ndjson(path, records):
+    with open(path, "w") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+
+def _records(out):
+    return sorted((json.loads(line) for line in out.getvalue().splitlines()), key=lambda r: (r["kind"], r["id"]))
+
+
+def test_interrupted_import_counts_each_chunk_once(tmp_path, monkeypatch):
+    path = tmp_path / "articles.ndjson"
+    _write_ndjson(path, [
+        {"kind": "article", "id": f"bulk-{i}", "title": f"Bulk {i}", "content": "imported", "views": 3, "likes_count": 1}
+        for i in range(25)
+    ])
+
+    # The second chunk's documents are written, then the process dies before its checkpoint
+    write_chunk, chunks = bulk._write_chunk, []
+
+    def write_then_die(writer, plan):
+        write_chunk(writer, plan)
+        chunks.append(plan)
+        if len(chunks) == 2:
+            raise Interrupted
+
+    monkeypatch.setattr(bulk, "_write_chunk", write_then_die)
+    with pytest.raises(Interrupted):
+        bulk.import_ndjson(str(path), chunk_size=10)
+    monkeypatch.setattr(bulk, "_write_chunk", write_chunk)
+
+    assert bulk.import_ndjson(str(path), chunk_size=10) == {"articles": 25, "comments": 0}
+    assert not (tmp_path / "articles.ndjson.checkpoint").exists()
+    assert len(list(_memory_db.collection(ARTICLES_COLLECTION).stream())) == 25
+    for i in range(25):
+        counters = read_article_counters(f"bulk-{i}")
+        assert (counters["views"], counters["likes_count"]) == (3, 1)
+    stats = read_stats()
+    assert (stats["total_articles"], stats["total_views"], stats["total_likes"]) == (25, 75, 25)
+
+
+def test_export_then_import_round_trips(client, create, settle, tmp_path):
+    slugs = [create(f"Round trip {i}", tags="news") for i in range(3)]
+    client.get(f"/articles/{slugs[0]}")
+    client.post(f"/articles/{slugs[0]}/like")
+    client.post(f"/articles/{slugs[1]}/share")
+    client.post(f"/articles/{slugs[1]}/comments", json={"text": "first"})
+    client.post(f"/articles/{slugs[1]}/comments", json={"text": "second"})
+    settle()
+
+    exported = io.StringIO()
+    assert bulk.export_ndjson(exported, page_size=2) == {"articles": 3, "comments": 2}
+    stats = read_stats()
+    counters = {slug: read_article_counters(slug) for slug in slugs}
+
+    _memory_db.clear()
+    path = tmp_path / "export.ndjson"
+    path.write_text(exported.getvalue())
+    assert bulk.import_ndjson(str(path)) == {"articles": 3, "comments": 2}
+
+    again = io.StringIO()
+    bulk.export_ndjson(again)
+    assert _records(again) == _records(exported)
+    assert read_stats() == stats
+    assert {slug: read_article_counters(slug) for slug in slugs} == counters
@@ -0,0 +1,54 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from app.firebase import _memory_db, ARTICLES_COLLECTION
+from app.rate_limit import MemoryBuckets, RateLimiter, rate_limiter
+
+
+def test_like_toggles(client, create, settle):
+    slug = create("Liked article")
+    assert client.post(f"/articles/{slug}/like").json() == {"liked": True}
+    assert client.post(f"/articles/{slug}/like").json() == {"liked": False}
+    assert client.post(f"/articles/{slug}/like").json() == {"liked": True}
+    settle()
+    assert client.get(f"/analytics/{slug}/detail").json()["likes"] == 1
+    assert client.get(f"/articles/{slug}").json()["likes_count"] == 1
+
+
+def test_concurrent_likes_match_the_like_document(client, create, settle):
+    slug = create("Contended article")
+    with ThreadPoolExecutor(8) as pool:
+        statuses = list(pool.map(lambda _: client.post(f"/articles/{slug}/like").status_code, range(41)))
+    assert set(statuses) <= {200, 409}
+    settle()
+    liked = _memory_db.collection(ARTICLES_COLLECTION).document(slug).collection("likes").document("ViKay").get().exists
+    assert client.get(f"/analytics/{slug}/detail").json()["likes"] == int(liked)
+
+
+def test_like_on_missing_article(client):
+    assert client.post("/articles/missing/like").status_code == 404
+
+
+def test_rate_limit_rejects_over_limit_clients(client, create, monkeypatch):
+    slug = create("Limited article")
+    monkeypatch.setattr(rate_limiter, "enabled", True)
+    monkeypatch.setattr(rate_limiter, "store", MemoryBuckets())
+    monkeypatch.setattr(rate_limiter, "rules", {**rate_limiter.rules, "share": (2, 1e-6)})
+
+    assert [client.post(f"/articles/{slug}/share").status_code for _ in range(3)] == [200, 200, 429]
+    response = client.post(f"/articles/{slug}/share")
+    assert int(response.headers["Retry-After"]) >= 1
+    # Other endpoints and reads aren't limited
+    assert client.post(f"/articles/{slug}/like").status_code == 200
+    assert client.get(f"/articles/{slug}").status_code == 200
+    assert rate_limiter.stats()["rejected"]["share"] == 2
+
+
+def test_rate_limit_buckets_are_per_client():
+    limiter = RateLimiter(MemoryBuckets(), {"like": (1, 1e-6)})
+
+    def allowed(ip):
+        scope = {"type": "http", "method": "POST", "path": "/articles/a/like", "headers": [], "client": (ip, 1)}
+        return asyncio.run(limiter.check("like", scope))[0]
+
+    assert [allowed("10.0.0.1"), allowed("10.0.0.1"), allowed("10.0.0.2")] == [True, False, True]
@@ -0,0 +1,103 @@
+import asyncio
+import json
+
+from app.config import EVENTS_QUEUE_SIZE
+from app.events import EventHub, Subscriber, format_event, event_hub
+
+RESYNC = format_event("resync", "{}")
+
+
+def _events(frames):
+    """(event, data) pairs from encoded frames"""
+    pairs = []
+    for frame in frames:
+        event, data = frame.decode().strip().split("\n")
+        pairs.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return pairs
+
+
+def test_counter_changes_fan_out(client, create, settle):
+    slug = create("Streamed article")
+
+    async def scenario():
+        hub = EventHub(max_subscribers=10)
+        subscribers = [Subscriber(slug, asyncio.get_running_loop()) for _ in range(3)]
+        for subscriber in subscribers:
+            assert hub.subscribe(subscriber)
+        # Each starts from the current values
+        for subscriber in subscribers:
+            assert _events(await subscriber.next(1)) == [
+                ("counters", {"likes_count": 0, "comments_count": 0, "shares_count": 0, "views": 0}),
+            ]
+
+        client.post(f"/articles/{slug}/like")
+        settle()
+        for subscriber in subscribers:
+            assert _events(await subscriber.next(1)) == [("counters", {"likes_count": 1})]
+        assert hub.stats()["topics"] == 1 and hub.stats()["subscribers"] == 3
+        hub.close()
+
+    asyncio.run(scenario())
+
+
+def test_slow_subscriber_collapses_then_resyncs(client, create, settle):
+    slug = create("Slow reader")
+
+    async def scenario():
+        hub = EventHub(max_subscribers=10)
+        subscriber = Subscriber(slug, asyncio.get_running_loop())
+        assert hub.subscribe(subscriber)
+        await subscriber.next(1)
+
+        # Counter changes are merged into one pending update with the latest values
+        for _ in range(3):
+            client.post(f"/articles/{slug}/share")
+            settle()
+        await asyncio.sleep(0)
+        assert _events(await subscriber.next(1)) == [("counters", {"shares_count": 3})]
+
+        # Falling more than EVENTS_QUEUE_SIZE comments behind drops the queue for one resync
+        for i in range(EVENTS_QUEUE_SIZE + 1):
+            client.post(f"/articles/{slug}/comments", json={"text": f"comment {i}"})
+        await asyncio.sleep(0)
+        frames = await subscriber.next(1)
+        assert frames == [RESYNC]
+        assert await subscriber.next(0.01) == []
+
+        hub.unsubscribe(subscriber)
+        assert hub.stats()["resyncs"] == 1
+        hub.close()
+
+    asyncio.run(scenario())
+
+
+def test_deleting_the_article_ends_the_stream(client, create):
+    slug = create("Deleted while streamed")
+
+    async def scenario():
+        hub = EventHub(max_subscribers=10)
+        subscriber = Subscriber(slug, asyncio.get_running_loop())
+        assert hub.subscribe(subscriber)
+        await subscriber.next(1)
+
+        client.delete(f"/articles/{slug}")
+        assert ("deleted", {}) in _events(await subscriber.next(1))
+        assert subscriber.closed
+        hub.close()
+
+    asyncio.run(scenario())
+
+
+def test_route_rejects_streams_above_the_limit(client, create, monkeypatch):
+    slug = create("Popular article")
+    monkeypatch.setattr(event_hub, "max_subscribers", 1)
+    loop = asyncio.new_event_loop()
+    try:
+        assert event_hub.subscribe(Subscriber(slug, loop))
+        response = client.get(f"/articles/{slug}/events")
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == "30"
+        assert client.get("/articles/missing/events").status_code == 404
+    finally:
+        event_hub.close()
+        loop.close()
@@ -0,0 +1,77 @@
+import pytest
+
+from app import jobs
+from app.jobs import JobQueue, register
+
+
+@pytest.fixture
+def queue():
+    queue = JobQueue(":memory:", workers=0)
+    yield queue
+    queue.stop()
+
+
+def _due_now(queue):
+    queue._conn.execute("UPDATE jobs SET run_at = 0 WHERE status = 'queued'")
+
+
+def test_failed_job_is_retried_then_succeeds(queue):
+    attempts = []
+
+    def flaky(n):
+        attempts.append(n)
+        if len(attempts) == 1:
+            raise RuntimeError("transient")
+
+    register("test_flaky", flaky)
+    queue.enqueue("test_flaky", {"n": 1})
+    assert queue.run_pending() == 1
+    assert queue.stats()["depth"]["queued"] == 1  # waiting out the retry delay
+
+    _due_now(queue)
+    assert queue.run_pending() == 1
+    assert attempts == [1, 1]
+    assert queue.stats()["depth"]["done"] == 1
+
+
+def test_job_fails_after_max_attempts(queue, monkeypatch):
+    monkeypatch.setattr(jobs, "RETRY_DELAY", 0)
+
+    def broken():
+        raise RuntimeError("permanent")
+
+    register("test_broken", broken)
+    queue.enqueue("test_broken", {}, max_attempts=3)
+    assert queue.run_pending() == 3
+    assert queue.stats()["depth"]["failed"] == 1
+
+
+def test_group_runs_in_order_behind_a_retry(queue):
+    ran = []
+
+    def step(name, fail=False):
+        if fail and name not in ran:
+            ran.append(name)
+            raise RuntimeError("retry me")
+        ran.append(name)
+
+    register("test_step", step)
+    queue.enqueue("test_step", {"name": "a1", "fail": True}, group="a")
+    queue.enqueue("test_step", {"name": "a2"}, group="a")
+    queue.enqueue("test_step", {"name": "b1"}, group="b")
+    queue.run_pending()
+    # a2 waits for a1's retry; other groups carry on
+    assert ran == ["a1", "b1"]
+
+    _due_now(queue)
+    queue.run_pending()
+    assert ran == ["a1", "b1", "a1", "a2"]
+
+
+def test_idempotency_key_deduplicates(queue):
+    register("test_noop", lambda: None)
+    assert queue.enqueue("test_noop", {}, key="once")
+    assert not queue.enqueue("test_noop", {}, key="once")
+    queue.run_pending()
+    assert not queue.enqueue("test_noop", {}, key="once")
+    assert queue.stats()["depth"]["done"] == 1
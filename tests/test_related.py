@@ -0,0 +1,40 @@
+import threading
+
+from app import related
+from app.related import RelatedIndex
+
+
+def test_related_articles_share_terms(client, create, settle):
+    create("Cocoa harvest grows", "cocoa farmers harvest beans")
+    create("Cocoa prices rise", "cocoa beans price")
+    create("Football final", "goal striker match")
+    settle()
+    related_ids = [a["id"] for a in client.get("/articles/cocoa-harvest-grows/related").json()]
+    assert related_ids[0] == "cocoa-prices-rise"
+    assert "football-final" not in related_ids
+
+
+def test_updates_do_not_wait_for_the_first_build(create, monkeypatch):
+    create("Cocoa harvest grows", "cocoa farmers harvest beans")
+    building, release = threading.Event(), threading.Event()
+    build = related._build
+
+    def slow_build(items):
+        building.set()
+        release.wait(5)
+        return build(items)
+
+    monkeypatch.setattr(related, "_build", slow_build)
+    index = RelatedIndex()
+    thread = threading.Thread(target=index.ensure_ready)
+    thread.start()
+    assert building.wait(5)
+
+    # Returns while the build is still running; journalled and replayed after the swap
+    index.upsert("cocoa-exports", {"title": "Cocoa exports", "content": "cocoa beans shipped"})
+    assert thread.is_alive()
+    release.set()
+    thread.join(5)
+
+    assert index.ready
+    assert [slug for slug, _ in index.related("cocoa-exports")] == ["cocoa-harvest-grows"]
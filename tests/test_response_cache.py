@@ -0,0 +1,100 @@
+import threading
+
+import pytest
+
+from app.response_cache import MemoryBackend, ResponseCache, response_cache
+
+
+def _generation(namespace):
+    return int(response_cache.backend.get(f"gen:{namespace}") or 0)
+
+
+def test_concurrent_identical_requests_compute_once():
+    cache = ResponseCache(MemoryBackend(), ttl=60)
+    calls, release = [], threading.Event()
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return {"total": 1}
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get_or_compute("summary", {}, compute)))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert results == [b'{"total": 1}'] * 8
+    assert cache.misses == 1 and cache.hits + cache.coalesced == 7
+
+
+def test_failed_computation_is_not_cached():
+    cache = ResponseCache(MemoryBackend(), ttl=60)
+
+    def fail():
+        raise RuntimeError("backend down")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_compute("summary", {}, fail)
+    assert cache.get_or_compute("summary", {}, lambda: {"ok": True}) == b'{"ok": true}'
+    assert cache.stats()["in_flight"] == 0
+
+
+def test_article_writes_bump_the_generation(client, create):
+    slug = create("Cached trending")
+    assert client.get("/analytics/trending").json()[0]["title"] == "Cached trending"
+    misses = response_cache.misses
+    client.get("/analytics/trending")
+    assert response_cache.misses == misses
+
+    generation = _generation("trending")
+    client.put(f"/articles/{slug}", data={"title": "Renamed trending"})
+    assert _generation("trending") == generation + 1
+    assert client.get("/analytics/trending").json()[0]["title"] == "Renamed trending"
+    assert response_cache.misses == misses + 1
+
+
+def test_counter_flush_bumps_the_generation(client, create, settle):
+    slug = create("Cached summary")
+    settle()
+    assert client.get("/analytics/summary").json()["total_likes"] == 0
+
+    # Buffered increments don't change the stored stats, so the cached summary stays valid
+    client.post(f"/articles/{slug}/like")
+    generation = _generation("summary")
+    assert client.get("/analytics/summary").json()["total_likes"] == 0
+
+    settle()
+    assert _generation("summary") == generation + 1
+    assert client.get("/analytics/summary").json()["total_likes"] == 1
+
+    # A flush with nothing buffered leaves cached entries alone
+    settle()
+    assert _generation("summary") == generation + 1
+
+
+def test_redis_backend(client, create, settle, monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    redis = fakeredis.FakeRedis()
+    monkeypatch.setattr(response_cache, "backend", redis)
+
+    create("Redis summary")
+    settle()
+    assert client.get("/analytics/summary").json()["total_articles"] == 1
+    keys = redis.keys("resp:summary:*")
+    assert len(keys) == 1 and 0 < redis.ttl(keys[0]) <= response_cache.ttl
+
+    hits = response_cache.hits
+    client.get("/analytics/summary")
+    assert response_cache.hits == hits + 1
+
+    create("Redis summary two")
+    settle()
+    assert int(redis.get("gen:summary")) >= 1
+    assert client.get("/analytics/summary").json()["total_articles"] == 2
@@ -0,0 +1,76 @@
+from app import search
+from app.pagination import NEXT_PAGE_HEADER
+
+
+def _all_pages(client, q, page_size):
+    seen, token = [], None
+    while True:
+        params = {"q": q, "page_size": page_size, "view": "summary"}
+        if token:
+            params["page_token"] = token
+        response = client.get("/articles/", params=params)
+        assert response.status_code == 200
+        seen += [a["id"] for a in response.json()]
+        token = response.headers.get(NEXT_PAGE_HEADER)
+        if not token:
+            return seen
+
+
+def test_search_pages_reach_every_match(client, create, settle):
+    for i in range(23):
+        create(f"Harbour report {i}", "harbour " * (i + 1))
+    create("Unrelated", "weather")
+    settle()
+    seen = _all_pages(client, "harbour", 5)
+    assert len(seen) == len(set(seen)) == 23
+    # More occurrences rank higher
+    assert seen[0] == "harbour-report-22"
+
+
+def test_multi_term_search_pages_without_repeats(client, create, settle, monkeypatch):
+    monkeypatch.setattr(search, "MAX_CANDIDATES_PER_TERM", 4)
+    for i in range(12):
+        create(f"Market {i}", "market " * (i + 1) + "harvest " * (12 - i))
+    settle()
+    seen = _all_pages(client, "market harvest", 3)
+    assert sorted(seen) == sorted(f"market-{i}" for i in range(12))
+
+
+def test_multi_term_search_reaches_past_the_first_candidates(client, create, settle):
+    # Matches beyond the first MAX_CANDIDATES_PER_TERM postings of either term
+    for i in range(130):
+        create(f"Port {i}", "port " * (1 + i % 7) + "strike " * (1 + i % 5) + "news")
+    for i in range(20):
+        create(f"Only port {i}", "port " * 3)
+    settle()
+    seen = _all_pages(client, "port strike", 25)
+    assert len(seen) == len(set(seen)) == 150
+
+    # In the same order as scoring every match at once
+    scores = {}
+    for term in ("port", "strike"):
+        ranked, _ = search.search_article_ids(term, limit=1000)
+        df = len(ranked)
+        total = client.get("/analytics/summary").json()["total_articles"]
+        for slug, score in ranked:
+            scores[slug] = scores.get(slug, 0) + score * search.math.log(1 + total / df)
+    assert seen == [slug for slug, _ in sorted(scores.items(), key=lambda item: (item[1], item[0]), reverse=True)]
+
+
+def test_postings_per_article_are_bounded():
+    content = " ".join(f"word{i}" for i in range(1000))
+    assert len(search.term_scores({"title": "a long title", "content": content})) == search.MAX_TERMS_PER_ARTICLE
+
+
+def test_search_follows_edits_and_deletes(client, create, settle):
+    slug = create("Volcano news", "volcano eruption")
+    settle()
+    assert _all_pages(client, "volcano", 10) == [slug]
+
+    client.put(f"/articles/{slug}", data={"title": "Volcano news", "content": "quiet mountain"})
+    settle()
+    assert _all_pages(client, "eruption", 10) == []
+
+    client.delete(f"/articles/{slug}")
+    settle()
+    assert _all_pages(client, "volcano", 10) == []